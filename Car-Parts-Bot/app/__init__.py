@@ -3,6 +3,7 @@ from dotenv import load_dotenv
 from .config import AppConfig
 from .extensions import db, migrate, cors
 from .routes import register_routes
+from .commands import register_commands
 
 def create_app(config: type[AppConfig] | None = None) -> Flask:
     # Load variables from a local .env if present
@@ -34,6 +35,9 @@ def create_app(config: type[AppConfig] | None = None) -> Flask:
     # Routes
     register_routes(app)
 
+    # CLI
+    register_commands(app)
+
     return app
 
 
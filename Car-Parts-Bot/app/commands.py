@@ -0,0 +1,52 @@
+"""
+Flask CLI commands (run with `flask --app run <command>`).
+"""
+
+import click
+from flask import Flask
+from flask.cli import with_appcontext
+
+from .services.stock_import import BATCH_SIZE, StockImportError, import_stock_file
+from .services.supersessions import import_supersession_file
+
+
+@click.command("import-stock")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--sheet", default=None, help="Worksheet name for .xlsx files (default: first sheet).")
+@click.option("--batch-size", default=BATCH_SIZE, show_default=True, help="Rows per upsert statement.")
+@click.option("--delta", is_flag=True, help="Write only rows whose content changed and publish them on the change feed.")
+@click.option("--prune", is_flag=True, help="Treat the file as the full stock list: delete rows whose unique_value is not in it.")
+@with_appcontext
+def import_stock_command(path, sheet, batch_size, delta, prune):
+    """Stream a CSV/XLSX ERP export into the stock table (upsert on unique_value)."""
+    try:
+        report = import_stock_file(path, sheet=sheet, batch_size=batch_size, delta=delta, prune=prune)
+    except StockImportError as e:
+        raise click.ClickException(str(e))
+
+    click.echo(
+        f"{report['rows_written']} rows upserted, {report['rows_unchanged']} unchanged, "
+        f"{report['rows_skipped']} skipped, {report['rows_deleted']} deleted "
+        f"in {report['seconds']}s — {report['rows_per_second']} rows/s, "
+        f"peak memory {report['peak_memory_mb']} MB "
+        f"(+{report['import_memory_mb']} MB for the import)"
+    )
+
+
+@click.command("import-supersessions")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--sheet", default=None, help="Worksheet name for .xlsx files (default: first sheet).")
+@click.option("--source", default=None, help="Source label stored on each edge (default: file name).")
+@with_appcontext
+def import_supersessions_command(path, sheet, source):
+    """Load OEM supersession / cross-reference pairs (part_number, equivalent[, relation])."""
+    try:
+        report = import_supersession_file(path, sheet=sheet, source=source)
+    except StockImportError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"{report['edges_written']} edges from {report['rows_read']} rows")
+
+
+def register_commands(app: Flask) -> None:
+    app.cli.add_command(import_stock_command)
+    app.cli.add_command(import_supersessions_command)
@@ -29,6 +29,71 @@ class AppConfig:
 
     # --- Redis ---
     REDIS_URL: str | None = _env("REDIS_URL")
+
+    # --- Stock search ---
+    # In-memory part-number index, built once in the RQ worker parent
+    STOCK_INDEX_ENABLED: bool = (_env("STOCK_INDEX_ENABLED", "true") or "").lower() in ("1", "true", "yes")
+    STOCK_INDEX_REFRESH_SECONDS: int = int(_env("STOCK_INDEX_REFRESH_SECONDS", "60"))
+    # Max tag siblings returned per matched tag (in-stock first, then cheapest)
+    STOCK_SIBLING_LIMIT: int = int(_env("STOCK_SIBLING_LIMIT", "10"))
+    # OCR/typo-tolerant fallback when a part number has no exact match
+    FUZZY_MATCH_MIN_LENGTH: int = int(_env("FUZZY_MATCH_MIN_LENGTH", "6"))
+    # One edit allowed per FUZZY_MATCH_CHARS_PER_EDIT characters (at least one), never more than the max
+    FUZZY_MATCH_CHARS_PER_EDIT: int = int(_env("FUZZY_MATCH_CHARS_PER_EDIT", "10"))
+    FUZZY_MATCH_MAX_DISTANCE: int = int(_env("FUZZY_MATCH_MAX_DISTANCE", "2"))
+    # Local part-name search; the catalog scraper runs only below this confidence
+    STOCK_TEXT_TOP_K: int = int(_env("STOCK_TEXT_TOP_K", "5"))
+    STOCK_TEXT_MIN_CONFIDENCE: float = float(_env("STOCK_TEXT_MIN_CONFIDENCE", "0.8"))
+    # Bulk stock import (CLI: flask import-stock, API: POST /api/admin/stock/import)
+    STOCK_IMPORT_BATCH_SIZE: int = int(_env("STOCK_IMPORT_BATCH_SIZE", "2000"))
+    STOCK_IMPORT_JOB_TIMEOUT: int = int(_env("STOCK_IMPORT_JOB_TIMEOUT", "3600"))
+    # Redis stream of stock changes published by imports (see stock_changes.py)
+    STOCK_CHANGE_STREAM: str = _env("STOCK_CHANGE_STREAM", "stock:changes")
+    STOCK_CHANGE_STREAM_MAXLEN: int = int(_env("STOCK_CHANGE_STREAM_MAXLEN", "10000"))
+    # Supersession / cross-reference expansion of requested part numbers
+    SUPERSESSION_MAX_DEPTH: int = int(_env("SUPERSESSION_MAX_DEPTH", "3"))
+    # Bulk part-number lookup (POST /api/search/parts/bulk)
+    SEARCH_BULK_MAX_ITEMS: int = int(_env("SEARCH_BULK_MAX_ITEMS", "5000"))
+    SEARCH_BULK_CHUNK_SIZE: int = int(_env("SEARCH_BULK_CHUNK_SIZE", "500"))
+    # X-API-Key for partner systems; without it only admin sessions get in
+    SEARCH_API_KEY: str | None = _env("SEARCH_API_KEY")
+    # Explicit opt-out: serve the search API with no key at all (local/dev only)
+    SEARCH_API_OPEN: bool = (_env("SEARCH_API_OPEN", "false") or "").lower() in ("1", "true", "yes")
+    # Regex/checksum VIN + part-number extraction before the gpt-4o extraction call
+    LOCAL_EXTRACTOR_ENABLED: bool = (_env("LOCAL_EXTRACTOR_ENABLED", "true") or "").lower() in ("1", "true", "yes")
+    # Threads for running the gpt-4o extraction alongside the part-name calls
+    EXTRACTION_POOL_WORKERS: int = int(_env("EXTRACTION_POOL_WORKERS", "8"))
+    # Reply styling: "local" (no LLM), "hybrid" (LLM only for free-form answers), "llm"
+    REPLY_FORMATTER: str = _env("REPLY_FORMATTER", "local")
+    REPLY_CURRENCY: str = _env("REPLY_CURRENCY", "AED")
+    # Super-intent model tiers: turns scoring <= MODEL_ROUTER_THRESHOLD go to the
+    # mini model, escalating to the full one if its answer fails validation
+    SUPER_INTENT_MODEL: str = _env("SUPER_INTENT_MODEL", "gpt-4o")
+    SUPER_INTENT_MINI_MODEL: str = _env("SUPER_INTENT_MINI_MODEL", "gpt-4o-mini")
+    MODEL_ROUTER_ENABLED: bool = (_env("MODEL_ROUTER_ENABLED", "true") or "").lower() in ("1", "true", "yes")
+    MODEL_ROUTER_THRESHOLD: int = int(_env("MODEL_ROUTER_THRESHOLD", "2"))
+    # Send the super-intent reply paragraph by paragraph while gpt-4o streams it
+    # (local formatter only; see reply_stream.py)
+    SUPER_INTENT_STREAMING: bool = (_env("SUPER_INTENT_STREAMING", "true") or "").lower() in ("1", "true", "yes")
+    # Redis cache for chat completions (see llm_cache.py)
+    LLM_CACHE_ENABLED: bool = (_env("LLM_CACHE_ENABLED", "true") or "").lower() in ("1", "true", "yes")
+    LLM_CACHE_DEFAULT_TTL: int = int(_env("LLM_CACHE_DEFAULT_TTL", "3600"))
+    LLM_CACHE_TTLS: str = _env("LLM_CACHE_TTLS", "")  # e.g. "super_intent=600,format=86400"
+    LLM_CACHE_LOCK_SECONDS: int = int(_env("LLM_CACHE_LOCK_SECONDS", "60"))
+    LLM_CACHE_WAIT_SECONDS: int = int(_env("LLM_CACHE_WAIT_SECONDS", "30"))
+    # Prompt token budgets per call type (see token_budget.py), e.g. "super_intent=8000"
+    TOKEN_BUDGET_ENABLED: bool = (_env("TOKEN_BUDGET_ENABLED", "true") or "").lower() in ("1", "true", "yes")
+    TOKEN_BUDGETS: str = _env("TOKEN_BUDGETS", "")
+    # Matched parts in the super-intent prompt: "table" (parts_context.py) or "json"
+    PARTS_CONTEXT_FORMAT: str = (_env("PARTS_CONTEXT_FORMAT", "table") or "table").lower()
+    # In-process IntentPrompt cache (pub/sub invalidated; version re-checked on this interval)
+    PROMPT_CACHE_CHECK_SECONDS: int = int(_env("PROMPT_CACHE_CHECK_SECONDS", "30"))
+    PROMPT_CACHE_MAX_AGE_SECONDS: int = int(_env("PROMPT_CACHE_MAX_AGE_SECONDS", "900"))
+    # Reference material: chunked at upload, top chunks injected per message
+    REFERENCE_RETRIEVAL_ENABLED: bool = (_env("REFERENCE_RETRIEVAL_ENABLED", "true") or "").lower() in ("1", "true", "yes")
+    REFERENCE_CHUNK_CHARS: int = int(_env("REFERENCE_CHUNK_CHARS", "1600"))
+    REFERENCE_TOP_K: int = int(_env("REFERENCE_TOP_K", "4"))
+    REFERENCE_TOKEN_BUDGET: int = int(_env("REFERENCE_TOKEN_BUDGET", "1500"))
     # config.py
     UPLOAD_ROOT = os.getenv(
         "UPLOAD_ROOT"# local
@@ -39,6 +104,36 @@ class AppConfig:
     # --- External APIs ---
     OPENAI_API_KEY: str | None = _env("OPENAI_API_KEY")
     OPENAI_MODEL: str = _env("OPENAI_MODEL", "gpt-4o-mini")
+    # OpenAI-compatible endpoint for every LLM call, e.g. the local stand-in
+    # (scripts/llm_standin.py) for benchmarks; unset = api.openai.com
+    LLM_BASE_URL: str | None = _env("LLM_BASE_URL") or None
+    # Shared OpenAI connection pool (see openai_clients.py)
+    OPENAI_MAX_CONNECTIONS: int = int(_env("OPENAI_MAX_CONNECTIONS", "20"))
+    OPENAI_KEEPALIVE_CONNECTIONS: int = int(_env("OPENAI_KEEPALIVE_CONNECTIONS", "10"))
+    OPENAI_KEEPALIVE_SECONDS: int = int(_env("OPENAI_KEEPALIVE_SECONDS", "120"))
+    OPENAI_TIMEOUT_SECONDS: int = int(_env("OPENAI_TIMEOUT_SECONDS", "180"))
+    OPENAI_CONNECT_TIMEOUT_SECONDS: int = int(_env("OPENAI_CONNECT_TIMEOUT_SECONDS", "5"))
+    OPENAI_MAX_RETRIES: int = int(_env("OPENAI_MAX_RETRIES", "2"))
+    # Connections opened at the start of each chat job (0 = off)
+    OPENAI_PREWARM_CONNECTIONS: int = int(_env("OPENAI_PREWARM_CONNECTIONS", "2"))
+    # Per-message deadline, per-call timeouts, retries and hedging (see llm_deadlines.py)
+    MESSAGE_DEADLINE_SECONDS: int = int(_env("MESSAGE_DEADLINE_SECONDS", "60"))
+    # Seconds of the message deadline reserved for the final super_intent reply;
+    # earlier calls must finish before this
+    LLM_DEADLINE_RESERVE_SECONDS: int = int(_env("LLM_DEADLINE_RESERVE_SECONDS", "15"))
+    LLM_MIN_CALL_SECONDS: float = float(_env("LLM_MIN_CALL_SECONDS", "1.0"))
+    # Per call type timeout caps, e.g. "super_intent=30,extract_codes=8"
+    LLM_CALL_TIMEOUTS: str = _env("LLM_CALL_TIMEOUTS", "")
+    LLM_RETRY_ATTEMPTS: int = int(_env("LLM_RETRY_ATTEMPTS", "2"))
+    LLM_RETRY_BASE_MS: int = int(_env("LLM_RETRY_BASE_MS", "250"))
+    LLM_RETRY_MAX_MS: int = int(_env("LLM_RETRY_MAX_MS", "4000"))
+    # Call types that get a duplicate request after their recent p95 latency
+    LLM_HEDGE_CALLS: str = _env("LLM_HEDGE_CALLS", "extract_codes")
+    LLM_HEDGE_PERCENTILE: int = int(_env("LLM_HEDGE_PERCENTILE", "95"))
+    LLM_HEDGE_MIN_DELAY_MS: int = int(_env("LLM_HEDGE_MIN_DELAY_MS", "250"))
+    # Until 20 latencies have been seen for a call type
+    LLM_HEDGE_DEFAULT_DELAY_MS: int = int(_env("LLM_HEDGE_DEFAULT_DELAY_MS", "3000"))
+    LLM_HEDGE_POOL_WORKERS: int = int(_env("LLM_HEDGE_POOL_WORKERS", "8"))
 
     META_VERIFY_TOKEN: str | None = _env("META_VERIFY_TOKEN")
     META_ACCESS_TOKEN: str | None = _env("META_ACCESS_TOKEN")
@@ -1,5 +1,9 @@
+import hashlib
 from datetime import datetime,timezone
+from sqlalchemy import event
+from sqlalchemy.dialects.mysql import MEDIUMTEXT
 from .extensions import db
+from .services.part_numbers import normalize_part_number
 # from app import db 
 class TimestampMixin:
     created_at = db.Column(
@@ -27,6 +31,12 @@ class Lead(db.Model, TimestampMixin):
 
 class Stock(db.Model):
     __tablename__ = 'stock'
+    __table_args__ = (
+        # Serves ranked sibling expansion: WHERE tag IN (...) ORDER BY qty, price
+        db.Index("ix_stock_tag_qty_price", "tag", "qty", "price"),
+        # Upsert key for bulk imports: the whole TEXT value, hashed to a fixed width
+        db.Index("uq_stock_unique_value_hash", "unique_value_hash", unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     tag = db.Column(db.String(500))
@@ -37,6 +47,71 @@ class Stock(db.Model):
     part_number = db.Column(db.String(255))
     brand = db.Column(db.String(255))
     unique_value = db.Column(db.Text)
+    # stock_unique_value_hash(unique_value); the indexed import key
+    unique_value_hash = db.Column(db.CHAR(64))
+    # normalize_part_number(part_number), stored so lookups can use an index
+    part_number_norm = db.Column(db.String(255), index=True)
+    # stock_lookup_key() of brand_part_no / unique_value: the other numbers a part is found by
+    brand_part_no_norm = db.Column(db.String(255), index=True)
+    unique_value_norm = db.Column(db.String(255), index=True)
+    # Hash of the imported content columns; delta syncs skip unchanged rows
+    content_hash = db.Column(db.String(32))
+    # Version stamp for in-process indexes (ON UPDATE CURRENT_TIMESTAMP in MySQL)
+    updated_at = db.Column(
+        db.DateTime,
+        server_default=db.func.now(),
+        onupdate=db.func.now(),
+        nullable=False,
+        index=True,
+    )
+
+
+def stock_lookup_key(value):
+    """Normalized lookup key, None if empty or too long for the indexed column."""
+    norm = normalize_part_number(value)
+    return norm if norm and len(norm) <= 255 else None
+
+
+def stock_unique_value_hash(value):
+    """sha256 hex of the full unique_value (None stays None)."""
+    if value is None:
+        return None
+    return hashlib.sha256(str(value).encode("utf-8")).hexdigest()
+
+
+@event.listens_for(Stock.unique_value, "set")
+def _sync_unique_value_hash(target, value, oldvalue, initiator):
+    target.unique_value_hash = stock_unique_value_hash(value)
+    target.unique_value_norm = stock_lookup_key(value)
+
+
+@event.listens_for(Stock.brand_part_no, "set")
+def _sync_brand_part_no_norm(target, value, oldvalue, initiator):
+    target.brand_part_no_norm = stock_lookup_key(value)
+
+
+@event.listens_for(Stock.part_number, "set")
+def _sync_part_number_norm(target, value, oldvalue, initiator):
+    # Keep the stored lookup key in step with every ORM write
+    target.part_number_norm = normalize_part_number(value) or None
+
+
+class PartSupersession(db.Model):
+    """
+    OEM number equivalence, stored normalized. "supersession" edges point
+    from the old number to its replacement; "cross_reference" edges are
+    used in both directions.
+    """
+    __tablename__ = "part_supersessions"
+    __table_args__ = (
+        db.UniqueConstraint("part_number_norm", "equivalent_norm", name="uq_part_supersession_pair"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    part_number_norm = db.Column(db.String(255), nullable=False)
+    equivalent_norm = db.Column(db.String(255), nullable=False, index=True)
+    relation = db.Column(db.String(20), nullable=False, server_default="supersession")
+    source = db.Column(db.String(100), nullable=True)  # e.g. catalog or file it came from
 
 
  # or wherever your SQLAlchemy instance is
@@ -58,6 +133,8 @@ class IntentPrompt(db.Model):
     reference_file = db.Column(db.String(255), nullable=True)
     # extracted text from file (cached)
     reference_text = db.Column(db.Text, nullable=True)
+    # reference_text split at page/section boundaries (JSON list), chunked at upload
+    reference_chunks = db.Column(db.Text().with_variant(MEDIUMTEXT(), "mysql"), nullable=True)
     # Normalization rules for entity extraction
     parts_alias_text = db.Column(db.Text, nullable=True)
     is_active = db.Column(db.Boolean, default=True)
@@ -5,12 +5,15 @@ from flask import Blueprint, current_app, jsonify, request
 from functools import wraps
 from ..extensions import db
 from ..models import IntentPrompt
+import json
 import jwt
 import datetime
 import os
 from flask import make_response
 from datetime import datetime, timedelta, timezone
-from app.services.reference_extractor import extract_text_from_file
+from app.services.part_aliases import publish_active_alias_rules
+from app.services.prompt_cache import invalidate_prompts
+from app.services.reference_extractor import chunk_reference_text, extract_text_from_file
 from app.services.upload_validator import validate_reference_file
 from werkzeug.utils import secure_filename
 admin_bp = Blueprint("admin", __name__)
@@ -35,6 +38,18 @@ def admin_required(f):
     return wrapper
 
 
+def has_admin_session() -> bool:
+    """True if the request carries a valid admin_session cookie."""
+    token = request.cookies.get("admin_session")
+    if not token:
+        return False
+    try:
+        jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
+    except jwt.InvalidTokenError:
+        return False
+    return True
+
+
 
 @admin_bp.post("/login")
 def admin_login():
@@ -118,6 +133,12 @@ def get_stats():
 def get_metrics():
     """Get GPT performance metrics (in-memory tracking)."""
     from ..services.gpt_service import GPTService
+    from ..services.llm_cache import LLM_CACHE_METRICS_KEY, LLM_USAGE_METRICS_KEY
+    from ..services.reply_stream import REPLY_STREAM_KEY
+    from ..services.openai_clients import OPENAI_HTTP_KEY
+    from ..services.model_router import MODEL_ROUTER_KEY
+    from ..services.llm_deadlines import LLM_CALLS_KEY
+    from ..services.metrics import EXTRACTION_KEY, STOCK_SEARCH_KEY, read as read_metrics
 
     avg_latency = (
         sum(GPTService.response_times) / len(GPTService.response_times)
@@ -138,8 +159,176 @@ def get_metrics():
         "correct_intents": GPTService.correct_intent_predictions,
         "total_intent_checks": GPTService.total_intent_checks,
         "incorrect_intents": GPTService.incorrect_intent_predictions,
+        "extraction": _extraction_metrics(read_metrics(EXTRACTION_KEY)),
+        "llm_cache": _llm_cache_metrics(read_metrics(LLM_CACHE_METRICS_KEY)),
+        "llm_usage": _llm_usage_metrics(read_metrics(LLM_USAGE_METRICS_KEY)),
+        "reply_stream": _reply_stream_metrics(read_metrics(REPLY_STREAM_KEY)),
+        "openai_http": _openai_http_metrics(read_metrics(OPENAI_HTTP_KEY)),
+        "model_router": _model_router_metrics(read_metrics(MODEL_ROUTER_KEY)),
+        "llm_calls": _llm_calls_metrics(read_metrics(LLM_CALLS_KEY)),
+        "stock_search": _stock_search_metrics(read_metrics(STOCK_SEARCH_KEY)),
     })
 
+
+def _extraction_metrics(raw: dict) -> dict:
+    """Local pre-extractor skip rate and the gpt-4o latency it saved (estimated)."""
+    messages = raw.get("messages", 0)
+    skipped = raw.get("llm_skipped", 0)
+    llm_calls = raw.get("llm_calls", 0)
+    avg_llm_ms = raw.get("llm_ms_total", 0) / llm_calls if llm_calls else 0
+    return {
+        "messages": messages,
+        "llm_calls": llm_calls,
+        "llm_skipped": skipped,
+        "names_skipped": raw.get("names_skipped", 0),
+        "skip_rate_percent": round(skipped / messages * 100, 2) if messages else 0,
+        "avg_llm_extraction_ms": round(avg_llm_ms, 1),
+        # Averaged over all messages, skipped or not
+        "est_saved_ms_per_message": round(skipped * avg_llm_ms / messages, 1) if messages else 0,
+        "est_saved_seconds_total": round(skipped * avg_llm_ms / 1000, 1),
+        # Per-stage averages; the gpt-4o call overlaps names + normalize
+        "avg_stage_ms": {
+            "names": _avg(raw.get("names_ms_total", 0), messages - raw.get("names_skipped", 0)),
+            "normalize": _avg(raw.get("normalize_ms_total", 0), raw.get("normalize_calls", 0)),
+            "wall": _avg(raw.get("wall_ms_total", 0), messages),
+        },
+    }
+
+
+def _llm_cache_metrics(raw: dict) -> dict:
+    """Hit / miss rates of the chat-completion cache, overall and per call type."""
+    hits, coalesced, misses = raw.get("hits", 0), raw.get("coalesced", 0), raw.get("misses", 0)
+    lookups = hits + coalesced + misses
+    by_type = {}
+    for field, value in raw.items():
+        kind, _, call_type = field.partition(":")
+        if call_type:
+            by_type.setdefault(call_type, {"hits": 0, "coalesced": 0, "misses": 0})[kind] = value
+    for counts in by_type.values():
+        total = sum(counts.values())
+        counts["hit_rate_percent"] = round((counts["hits"] + counts["coalesced"]) / total * 100, 2) if total else 0
+    return {
+        "lookups": lookups,
+        "hits": hits,
+        "coalesced": coalesced,
+        "misses": misses,
+        "errors": raw.get("errors", 0),
+        "hit_rate_percent": round((hits + coalesced) / lookups * 100, 2) if lookups else 0,
+        "miss_rate_percent": round(misses / lookups * 100, 2) if lookups else 0,
+        "avg_call_ms": _avg(raw.get("call_ms_total", 0), misses + raw.get("errors", 0)),
+        "saved_seconds_total": round(raw.get("saved_ms_total", 0) / 1000, 1),
+        "by_call_type": by_type,
+    }
+
+
+def _llm_usage_metrics(raw: dict) -> dict:
+    """Tokens sent to OpenAI and the share served from its prompt (prefix) cache."""
+    def summary(prefix: str = "") -> dict:
+        prompt = raw.get(f"prompt_tokens{prefix}", 0)
+        cached = raw.get(f"cached_tokens{prefix}", 0)
+        calls = raw.get(f"calls{prefix}", 0)
+        return {
+            "calls": calls,
+            "prompt_tokens": prompt,
+            "cached_tokens": cached,
+            "completion_tokens": raw.get(f"completion_tokens{prefix}", 0),
+            "truncated": raw.get(f"truncated{prefix}", 0),
+            "cached_percent": round(cached / prompt * 100, 2) if prompt else 0,
+            "avg_prompt_tokens": _avg(prompt, calls),
+        }
+
+    call_types = sorted({f.partition(":")[2] for f in raw if ":" in f})
+    return {**summary(), "by_call_type": {t: summary(f":{t}") for t in call_types}}
+
+
+def _reply_stream_metrics(raw: dict) -> dict:
+    """Streamed super-intent replies: time to the first and the last WhatsApp block."""
+    replies = raw.get("replies", 0)
+    return {
+        "replies": replies,
+        "avg_blocks": _avg(raw.get("blocks", 0), replies),
+        "avg_first_block_ms": _avg(raw.get("first_block_ms_total", 0), replies),
+        "avg_last_block_ms": _avg(raw.get("last_block_ms_total", 0), replies),
+    }
+
+
+def _openai_http_metrics(raw: dict) -> dict:
+    """Per OpenAI endpoint: requests, errors, latency and OpenAI's own processing time."""
+    endpoints = {}
+    for field, value in raw.items():
+        kind, _, endpoint = field.partition(":")
+        endpoints.setdefault(endpoint, {})[kind] = value
+    out = {}
+    for endpoint, counts in sorted(endpoints.items()):
+        calls = counts.get("calls", 0)
+        avg_ms = _avg(counts.get("ms_total", 0), calls)
+        avg_processing = _avg(counts.get("processing_ms_total", 0), calls)
+        out[endpoint] = {
+            "calls": calls,
+            "errors": counts.get("errors", 0),
+            "avg_ms": avg_ms,
+            "avg_processing_ms": avg_processing,
+            # Network, TLS and queueing on top of OpenAI's processing
+            "avg_overhead_ms": round(avg_ms - avg_processing, 1) if avg_processing else None,
+        }
+    return out
+
+
+def _model_router_metrics(raw: dict) -> dict:
+    """Super-intent turns per model tier (mini / full / escalated): latency and cost."""
+    tiers = {}
+    for tier in ("mini", "full", "escalated"):
+        turns = raw.get(f"turns:{tier}", 0)
+        cost = raw.get(f"cost_usd_total:{tier}", 0)
+        tiers[tier] = {
+            "turns": turns,
+            "avg_ms": _avg(raw.get(f"ms_total:{tier}", 0), turns),
+            "avg_cost_usd": round(cost / turns, 6) if turns else 0,
+            # vs. the same tokens on the full model
+            "saved_usd_total": round(raw.get(f"full_cost_usd_total:{tier}", 0) - cost, 4) if tier != "full" else 0,
+        }
+    routed_cheap = tiers["mini"]["turns"] + tiers["escalated"]["turns"]
+    return {
+        **tiers,
+        "escalation_rate_percent": round(tiers["escalated"]["turns"] / routed_cheap * 100, 2) if routed_cheap else 0,
+    }
+
+
+def _llm_calls_metrics(raw: dict) -> dict:
+    """Retries, hedges, timeouts and deadline misses of OpenAI calls, per call type."""
+    by_type = {}
+    for field, value in raw.items():
+        kind, _, call_type = field.partition(":")
+        if call_type:
+            by_type.setdefault(call_type, {})[kind] = value
+    hedges = raw.get("hedges", 0)
+    return {
+        "retries": raw.get("retries", 0),
+        "hedges": hedges,
+        "hedge_wins": raw.get("hedge_wins", 0),
+        # How often the duplicate beat the original
+        "hedge_win_rate_percent": round(raw.get("hedge_wins", 0) / hedges * 100, 2) if hedges else 0,
+        "by_call_type": {
+            call_type: {kind: counts.get(kind, 0) for kind in
+                        ("retries", "timeouts", "failures", "deadline_exceeded", "hedges", "hedge_wins")}
+            for call_type, counts in sorted(by_type.items())
+        },
+    }
+
+
+def _stock_search_metrics(raw: dict) -> dict:
+    """Items the fuzzy / name searches skipped because the process had no stock index."""
+    skipped = {}
+    for field, value in raw.items():
+        kind, _, feature = field.partition(":")
+        if kind == "skipped_no_index" and feature:
+            skipped[feature] = value
+    return {"skipped_no_index": skipped}
+
+
+def _avg(total, count) -> float:
+    return round(total / count, 1) if count > 0 else 0
+
 # @admin_bp.post("/prompts")
 # @admin_required
 # def create_prompt():
@@ -241,9 +430,11 @@ def create_prompt():
 
         reference_file = f"intents/{intent_key}/{filename}"
         reference_text = extract_text_from_file(path)
+        reference_chunks = _reference_chunks_json(reference_text)
     else:
         reference_file = None
         reference_text = None
+        reference_chunks = None
 
     prompt = IntentPrompt(
         intent_key=intent_key,
@@ -252,14 +443,29 @@ def create_prompt():
         intent_type=intent_type,
         reference_file=reference_file,
         reference_text=reference_text,
+        reference_chunks=reference_chunks,
         parts_alias_text=parts_alias_text,
         is_active=True,
     )
 
     db.session.add(prompt)
     db.session.commit()
+    invalidate_prompts()
+
+    response = {"message": "Prompt created", "id": prompt.id}
+    if intent_key == "super_intent":
+        response["alias_rules"] = _alias_rules_summary(publish_active_alias_rules())
+    return jsonify(response), 201
+
+
+def _reference_chunks_json(reference_text: str) -> str:
+    """Chunk reference material once, at upload, for per-message retrieval."""
+    max_chars = current_app.config.get("REFERENCE_CHUNK_CHARS", 1600)
+    return json.dumps(chunk_reference_text(reference_text, max_chars=max_chars))
 
-    return jsonify({"message": "Prompt created", "id": prompt.id}), 201
+
+def _alias_rules_summary(compiled: dict) -> dict:
+    return {"rules": len(compiled["pairs"]), "ignored_lines": compiled["rejected"]}
 
 @admin_bp.put("/prompts/<int:prompt_id>")
 @admin_required
@@ -274,6 +480,7 @@ def update_prompt(prompt_id):
     if data.get("remove_reference_file") == "true":
         prompt.reference_file = None
         prompt.reference_text = None
+        prompt.reference_chunks = None
 
     prompt.display_name = data.get("display_name", prompt.display_name).strip()
     prompt.prompt_text = data.get("prompt_text", prompt.prompt_text).strip()
@@ -303,11 +510,18 @@ def update_prompt(prompt_id):
 
         prompt.reference_file = f"intents/{prompt.intent_key}/{filename}"
         prompt.reference_text = extract_text_from_file(path)
+        prompt.reference_chunks = _reference_chunks_json(prompt.reference_text)
 
 
 
     db.session.commit()
-    return jsonify({"message": "Prompt updated"})
+    invalidate_prompts()
+
+    response = {"message": "Prompt updated"}
+    # Compile alias rules now so workers never parse them per message
+    if prompt.intent_key == "super_intent":
+        response["alias_rules"] = _alias_rules_summary(publish_active_alias_rules())
+    return jsonify(response)
 
 
 @admin_bp.patch("/prompts/<int:prompt_id>/toggle")
@@ -319,8 +533,13 @@ def toggle_prompt(prompt_id):
 
     prompt.is_active = not prompt.is_active
     db.session.commit()
+    invalidate_prompts()
 
-    return jsonify({"message": "Status updated", "is_active": prompt.is_active})
+    response = {"message": "Status updated", "is_active": prompt.is_active}
+    # Switching super_intent off (or back on) withdraws (or restores) its alias rules
+    if prompt.intent_key == "super_intent":
+        response["alias_rules"] = _alias_rules_summary(publish_active_alias_rules())
+    return jsonify(response)
 
 
 @admin_bp.delete("/prompts/<int:prompt_id>")
@@ -330,7 +549,75 @@ def delete_prompt(prompt_id):
     if not prompt:
         return jsonify({"error": "Prompt not found"}), 404
 
+    intent_key = prompt.intent_key
     db.session.delete(prompt)
     db.session.commit()
+    invalidate_prompts()
+
+    response = {"message": "Prompt deleted"}
+    if intent_key == "super_intent":
+        response["alias_rules"] = _alias_rules_summary(publish_active_alias_rules())
+    return jsonify(response)
+
+
+# ===== STOCK IMPORT =====
 
-    return jsonify({"message": "Prompt deleted"})
+@admin_bp.post("/stock/import")
+@admin_required
+def import_stock():
+    """
+    Save an ERP stock export (.csv/.xlsx) and enqueue the streaming import.
+    Form field mode=delta writes only changed rows (price/qty syncs);
+    prune=true deletes rows whose unique_value is not in the file.
+    """
+    from ..tasks import import_queue, import_stock_job
+
+    file = request.files.get("file")
+    if not file or not file.filename:
+        return jsonify({"error": "No file uploaded"}), 400
+
+    filename = secure_filename(file.filename)
+    ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if ext not in ("csv", "xlsx", "xlsm"):
+        return jsonify({"error": "Unsupported file type. Allowed: csv, xlsx"}), 400
+
+    import_dir = os.path.join(current_app.config["UPLOAD_ROOT"], "stock_imports")
+    os.makedirs(import_dir, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
+    path = os.path.join(import_dir, f"{stamp}_{filename}")
+    file.save(path)
+
+    job = import_queue.enqueue(
+        import_stock_job,
+        path,
+        request.form.get("sheet") or None,
+        request.form.get("mode", "full").lower() == "delta",
+        request.form.get("prune", "").lower() in ("1", "true", "yes"),
+        job_timeout=current_app.config["STOCK_IMPORT_JOB_TIMEOUT"],
+        result_ttl=7 * 24 * 3600,
+    )
+    return jsonify({"message": "Import queued", "job_id": job.id}), 202
+
+
+@admin_bp.get("/stock/import/<job_id>")
+@admin_required
+def import_stock_status(job_id):
+    """Status of a queued stock import; includes the report once finished."""
+    from rq.exceptions import NoSuchJobError
+    from rq.job import Job
+    from ..redis_client import redis_client
+
+    try:
+        job = Job.fetch(job_id, connection=redis_client)
+    except NoSuchJobError:
+        return jsonify({"error": "Import job not found"}), 404
+
+    status = job.get_status()
+    payload = {"job_id": job.id, "status": str(getattr(status, "value", status))}
+    if job.is_finished:
+        payload["report"] = job.return_value()
+    elif job.is_failed:
+        result = job.latest_result()
+        lines = (result.exc_string or "").strip().splitlines() if result else []
+        payload["error"] = lines[-1] if lines else "Import failed"
+    return jsonify(payload)
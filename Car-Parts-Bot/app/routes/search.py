@@ -1,7 +1,72 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
 from sqlalchemy import or_, and_
 from ..extensions import db
+from ..services.bulk_lookup import bulk_lookup_etag, iter_bulk_lookup
+from .admin import has_admin_session
+import hmac
+import json
 
 
 search_bp = Blueprint("search", __name__)
 
+
+def _api_key_ok() -> bool:
+    """
+    Partner systems send SEARCH_API_KEY as X-API-Key; the admin panel uses
+    its session. Closed when no key is configured, unless SEARCH_API_OPEN.
+    """
+    if current_app.config.get("SEARCH_API_OPEN"):
+        return True
+    expected = current_app.config.get("SEARCH_API_KEY")
+    given = request.headers.get("X-API-Key", "")
+    if expected and given and hmac.compare_digest(given.encode(), expected.encode()):
+        return True
+    return has_admin_session()
+
+
+def _requested_part_numbers() -> list | None:
+    """JSON {"part_numbers": [...]} or a plain-text list, one per line."""
+    if request.is_json:
+        data = request.get_json(silent=True) or {}
+        pns = data.get("part_numbers")
+        return pns if isinstance(pns, list) else None
+    text = request.get_data(as_text=True) or ""
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+@search_bp.post("/parts/bulk")
+def bulk_part_lookup():
+    """
+    Availability for an RFQ list of part numbers, streamed as NDJSON
+    (one result line per requested number, in request order).
+    Repeat requests can send If-None-Match to get a 304 while neither the
+    list nor stock has changed.
+    """
+    if not _api_key_ok():
+        return jsonify({"error": "Unauthorized"}), 401
+
+    part_numbers = _requested_part_numbers()
+    if not part_numbers:
+        return jsonify({"error": "part_numbers list required"}), 400
+
+    max_items = current_app.config["SEARCH_BULK_MAX_ITEMS"]
+    if len(part_numbers) > max_items:
+        return jsonify({"error": f"Too many part numbers (max {max_items})"}), 413
+
+    etag = bulk_lookup_etag(part_numbers)
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+        resp.set_etag(etag)
+        return resp
+
+    chunk_size = current_app.config["SEARCH_BULK_CHUNK_SIZE"]
+
+    def generate():
+        for result in iter_bulk_lookup(part_numbers, chunk_size):
+            yield json.dumps(result, separators=(",", ":")) + "\n"
+
+    resp = Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"  # let nginx pass chunks through
+    return resp
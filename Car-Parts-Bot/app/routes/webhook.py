@@ -5,7 +5,7 @@ from typing import Any
 from flask import Blueprint, current_app, jsonify, request
 import requests
 from ..extensions import db
-from ..models import Lead,Stock
+from ..models import Lead
 from ..services.gpt_service import GPTService
 from ..services.lead_service import LeadService
 from sqlalchemy import or_, and_
@@ -0,0 +1,147 @@
+"""
+Small incremental BM25 inverted index.
+
+Documents are token lists; queries are lists of *positions*, each a set
+of interchangeable tokens (e.g. {"bonnet", "hood"} after alias rules).
+A position scores by its best-matching alternative, and `coverage`
+reports the idf-weighted share of positions a document matched, which
+callers use as a confidence signal.
+"""
+
+import math
+import re
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOP_WORDS = frozenset({
+    "a", "an", "and", "the", "for", "of", "to", "in", "on", "with", "my", "me",
+    "i", "need", "want", "please", "is", "it", "this", "that", "car",
+})
+
+
+def words(text: str) -> list:
+    """Lowercase alphanumeric words, as written (no stemming, stop words kept)."""
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+def stem(token: str) -> str:
+    # Plural folding only; anything smarter mangles part vocabulary
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        if token.endswith("ies") and len(token) > 4:
+            return token[:-3] + "y"
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str, drop_stop_words: bool = True) -> list:
+    """Lowercase alphanumeric tokens, plural-folded."""
+    if not text:
+        return []
+    tokens = (stem(t) for t in words(text))
+    if drop_stop_words:
+        return [t for t in tokens if t not in STOP_WORDS]
+    return list(tokens)
+
+
+class BM25Index:
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}   # token -> {doc_id: term frequency}
+        self.doc_len = {}    # doc_id -> token count
+        self._total_len = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_len)
+
+    # ================= MAINTENANCE =================
+
+    def add(self, doc_id, tokens) -> None:
+        if doc_id in self.doc_len:
+            self.remove(doc_id)
+        for token in tokens:
+            docs = self.postings.setdefault(token, {})
+            docs[doc_id] = docs.get(doc_id, 0) + 1
+        self.doc_len[doc_id] = len(tokens)
+        self._total_len += len(tokens)
+
+    def remove(self, doc_id, tokens=None) -> None:
+        """Drop a document. Pass its tokens if known; otherwise postings are scanned."""
+        length = self.doc_len.pop(doc_id, None)
+        if length is None:
+            return
+        self._total_len -= length
+        terms = set(tokens) if tokens is not None else list(self.postings)
+        for token in terms:
+            docs = self.postings.get(token)
+            if docs and docs.pop(doc_id, None) is not None and not docs:
+                del self.postings[token]
+
+    # ================= SCORING =================
+
+    def idf(self, token: str) -> float:
+        n = len(self.doc_len)
+        df = len(self.postings.get(token, ()))
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, positions, k: int = 10, max_candidates: int = 20000) -> list:
+        """
+        Rank documents for a query given as a list of token sets.
+        Returns [(doc_id, score, coverage), ...] best first.
+        """
+        positions = [set(p) for p in positions if p]
+        if not positions or not self.doc_len:
+            return []
+
+        weights = [max(self.idf(t) for t in p) for p in positions]
+        total_weight = sum(weights) or 1.0
+
+        # Candidates: documents matching EVERY position (set intersection runs
+        # in C). Only when nothing covers the whole query do partial matches
+        # get scored, from the rarest positions, so common terms never force
+        # a scan of the whole collection.
+        doc_sets = []
+        for p in positions:
+            if len(p) == 1:
+                doc_sets.append(self.postings.get(next(iter(p)), {}).keys())
+            else:
+                docs = set()
+                for t in p:
+                    docs.update(self.postings.get(t, ()))
+                doc_sets.append(docs)
+        by_size = sorted(doc_sets, key=len)
+
+        candidates = set(by_size[0])
+        for docs in by_size[1:]:
+            if not candidates:
+                break
+            candidates &= docs
+        if not candidates:
+            for docs in by_size:
+                if docs and len(candidates) + len(docs) > max_candidates:
+                    break
+                candidates.update(docs)
+
+        avg_len = self._total_len / len(self.doc_len) or 1.0
+        k1, b = self.k1, self.b
+        idf = {t: self.idf(t) for p in positions for t in p}
+
+        scored = []
+        for doc_id in candidates:
+            norm = k1 * (1 - b + b * self.doc_len[doc_id] / avg_len)
+            score = 0.0
+            matched_weight = 0.0
+            for p, weight in zip(positions, weights):
+                best = 0.0
+                for t in p:
+                    tf = self.postings.get(t, {}).get(doc_id)
+                    if tf:
+                        best = max(best, idf[t] * tf * (k1 + 1) / (tf + norm))
+                if best:
+                    score += best
+                    matched_weight += weight
+            if score:
+                scored.append((doc_id, score, matched_weight / total_weight))
+
+        scored.sort(key=lambda s: (-s[1], s[0]))
+        return scored[:k]
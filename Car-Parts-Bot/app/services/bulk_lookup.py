@@ -0,0 +1,104 @@
+"""
+Bulk part-number availability lookups (RFQ lists of thousands of numbers).
+
+Numbers are normalized with normalize_part_number and resolved a chunk at
+a time with one query per chunk over the stock lookup keys (normalized
+part_number, brand_part_no and unique_value; or the in-process stock
+index, which files rows under the same keys, when this process has one),
+so results can be streamed out as each chunk resolves.
+"""
+
+import hashlib
+
+from sqlalchemy import func, select
+
+from ..extensions import db
+from ..models import Stock
+from .part_numbers import normalize_part_number
+from .stock_changes import latest_stock_change_id
+from .stock_index import LOOKUP_KEY_COLUMNS, get_stock_index, lookup_key_filter, stock_version
+
+_COLUMNS = (Stock.part_number, Stock.brand, Stock.item_desc, Stock.price, Stock.qty, Stock.tag)
+
+
+def _match_to_dict(row) -> dict:
+    return {
+        "part_number": row.part_number,
+        "brand": row.brand,
+        "name": row.item_desc,
+        "price": float(row.price) if row.price else None,
+        "qty": row.qty,
+        "tag": row.tag or "General",
+    }
+
+
+def _resolve_chunk(norms: set) -> dict:
+    """{normalized part number: [match dict, ...]} for one chunk."""
+    found = {}
+    index = get_stock_index()
+    if index is not None:
+        for norm in norms:
+            rows = index.lookup([norm])
+            if rows:
+                found[norm] = [_match_to_dict(r) for r in rows]
+        return found
+
+    stmt = select(*_COLUMNS, *LOOKUP_KEY_COLUMNS).where(lookup_key_filter(norms))
+    for row in db.session.execute(stmt):
+        match = _match_to_dict(row)
+        # A row is a match for every requested number it is filed under
+        for key in {row.part_number_norm, row.brand_part_no_norm, row.unique_value_norm} & norms:
+            found.setdefault(key, []).append(match)
+    return found
+
+
+def iter_bulk_lookup(part_numbers: list, chunk_size: int = 500):
+    """
+    Yield one result dict per requested number, in request order:
+    {"part_number", "normalized", "found", "in_stock", "matches"}.
+    """
+    for start in range(0, len(part_numbers), chunk_size):
+        chunk = part_numbers[start:start + chunk_size]
+        norms = [normalize_part_number(str(pn)) if pn is not None else '' for pn in chunk]
+        found = _resolve_chunk({n for n in norms if n})
+
+        for pn, norm in zip(chunk, norms):
+            matches = found.get(norm, []) if norm else []
+            yield {
+                "part_number": pn,
+                "normalized": norm,
+                "found": bool(matches),
+                "in_stock": any((m["qty"] or 0) > 0 for m in matches),
+                "matches": matches,
+            }
+
+        db.session.rollback()  # don't hold a read transaction open between chunks
+
+
+def _etag_stamp() -> tuple:
+    """
+    What the stock answer depends on. updated_at has one-second precision,
+    so a write in the same second as the previous latest one would leave
+    MAX(updated_at) unchanged; stock imports also publish every write and
+    delete on the change feed, and its newest entry id catches those.
+    Without Redis, falls back to stock_version() (COUNT(*) for deletes).
+    """
+    try:
+        feed_id = latest_stock_change_id()
+    except Exception:
+        return stock_version()
+    row = db.session.execute(select(func.max(Stock.updated_at), func.max(Stock.id))).one()
+    return tuple(row) + (feed_id,)
+
+
+def bulk_lookup_etag(part_numbers: list) -> str:
+    """
+    Strong validator for a bulk response: the requested list plus the stock
+    stamp, so it changes whenever the answer could.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for pn in part_numbers:
+        h.update(str(pn).encode())
+        h.update(b"\x1f")
+    h.update(repr(_etag_stamp()).encode())
+    return h.hexdigest()
@@ -0,0 +1,158 @@
+"""
+Deterministic first-pass extraction of VINs and OEM part numbers.
+
+Runs before GPTService.extract_entities. When every code-like token in the
+message is accounted for (a valid VIN or a part number in a known brand
+grammar), the gpt-4o VIN/part-number call is skipped; when the message has
+no free text left either, the part-name call is skipped too.
+
+VINs: 17 characters, no I/O/Q (ISO 3779). The position-9 check digit
+(ISO 3779 / FMVSS 115) is validated; European and Japanese makers do not
+always set it, so outside North America a VIN from a known WMI of a
+supported brand is accepted without it.
+
+Part-number grammars (separators " ", "-", "." allowed where shown):
+    BMW / Mini / Rolls-Royce  11 digits        11 42 7 566 327, 11427566327
+                              (7-digit short)  7566327 only after "PN"/"part"
+    Mercedes-Benz             A + 10 digits    A 000 180 26 09 (a trailing 4-digit
+                                               colour code is consumed, not kept)
+    Honda                     5-3-3(4)         15400-PLM-A02
+"""
+
+import re
+from dataclasses import dataclass, field
+
+_VIN_CHARS = "0123456789ABCDEFGHJKLMNPRSTUVWXYZ"
+_VIN_TRANSLIT = {
+    **{str(d): d for d in range(10)},
+    "A": 1, "B": 2, "C": 3, "D": 4, "E": 5, "F": 6, "G": 7, "H": 8,
+    "J": 1, "K": 2, "L": 3, "M": 4, "N": 5, "P": 7, "R": 9,
+    "S": 2, "T": 3, "U": 4, "V": 5, "W": 6, "X": 7, "Y": 8, "Z": 9,
+}
+_VIN_WEIGHTS = (8, 7, 6, 5, 4, 3, 2, 10, 0, 9, 8, 7, 6, 5, 4, 3, 2)
+
+# World manufacturer identifiers of the brands we sell
+SUPPORTED_WMIS = {
+    # BMW (incl. M, US/ZA/MX plants)
+    "WBA", "WBS", "WBX", "WBY", "WB1", "4US", "5UX", "5UJ", "5YM", "5UM", "3AV",
+    # Mini
+    "WMW", "WMZ",
+    # Mercedes-Benz
+    "WDB", "WDC", "WDD", "WDF", "WMX", "W1K", "W1N", "W1V", "W1W", "4JG", "55S",
+    # Rolls-Royce
+    "SCA",
+    # Honda / Acura
+    "JHM", "JHL", "JH4", "SHH", "SHS", "1HG", "2HG", "5FN", "5J6", "19X", "19U",
+}
+
+_VIN_RE = re.compile(r"\b[A-Z0-9]{17}\b")
+
+_PART_GRAMMARS = (
+    ("BMW", re.compile(r"(?<![A-Z0-9])(\d{2})[ .-]?(\d{2})[ .-]?(\d)[ .-]?(\d{3})[ .-]?(\d{3})(?![A-Z0-9])")),
+    ("Mercedes-Benz", re.compile(
+        r"(?<![A-Z0-9])([ABNQ])[ .-]?(\d{3})[ .-]?(\d{3})[ .-]?(\d{2})[ .-]?(\d{2})(?:[ .-]?(\d{4}))?(?![A-Z0-9])")),
+    ("Honda", re.compile(r"(?<![A-Z0-9])(\d{5})[ -]([A-Z0-9]{3})[ -]([A-Z0-9]{3,4})(?![A-Z0-9])")),
+)
+# BMW short (last 7 digits) form, only where the text says it is a part number
+_BMW_SHORT_RE = re.compile(r"\b(?:PN|P/N|PART(?:\s*(?:NO|NUMBER|#))?)[\s.:#-]*(\d)[ .-]?(\d{3})[ .-]?(\d{3})\b")
+
+_TOKEN_RE = re.compile(r"[A-Z0-9][A-Z0-9/.\-]*")
+_YEAR_RE = re.compile(r"^(19[89]\d|20[0-3]\d)$")
+# Words that carry no part name; a message of only codes and these needs no LLM
+_FILLER_WORDS = frozenset("""
+    HI HELLO HEY DEAR SIR PLEASE PLS PLZ THANKS THANK YOU OK OKAY
+    VIN CHASSIS NO NUMBER NUMBERS NUM PN P/N PART PARTS OEM REF CODE FRAME
+    PRICE PRICES COST RATE AVAILABLE AVAILABILITY STOCK QTY CHECK NEED WANT
+    FOR AND THE A AN OF IS MY THIS THESE IT IN ME GIVE SEND WHAT HOW MUCH
+    BMW MINI MERCEDES BENZ MB ROLLS ROYCE HONDA ACURA CAR
+""".split())
+
+
+def vin_check_digit(vin: str) -> str:
+    total = sum(_VIN_TRANSLIT[c] * w for c, w in zip(vin, _VIN_WEIGHTS))
+    remainder = total % 11
+    return "X" if remainder == 10 else str(remainder)
+
+
+def is_valid_vin(vin: str) -> bool:
+    """17 chars from the VIN alphabet, and a correct check digit or a supported WMI."""
+    if len(vin) != 17 or any(c not in _VIN_CHARS for c in vin):
+        return False
+    if vin[8] == vin_check_digit(vin):
+        return True
+    # The check digit is mandatory for North American VINs (WMI 1-5)
+    return vin[0] not in "12345" and vin[:3] in SUPPORTED_WMIS
+
+
+@dataclass
+class LocalExtraction:
+    vin_list: list = field(default_factory=list)
+    part_numbers: list = field(default_factory=list)
+    brands: dict = field(default_factory=dict)   # part number -> grammar that matched
+    unexplained: list = field(default_factory=list)  # code-like tokens we could not place
+    has_free_text: bool = False                   # words that may be part names
+
+    @property
+    def confident(self) -> bool:
+        """Every code-like token is a valid VIN or a grammar part number."""
+        return not self.unexplained
+
+    @property
+    def codes_only(self) -> bool:
+        return self.confident and not self.has_free_text
+
+
+def extract_entities_locally(text: str) -> LocalExtraction:
+    result = LocalExtraction()
+    upper = (text or "").upper()
+    spans = []
+
+    for m in _VIN_RE.finditer(upper):
+        if is_valid_vin(m.group(0)):
+            if m.group(0) not in result.vin_list:
+                result.vin_list.append(m.group(0))
+            spans.append(m.span())
+
+    def taken(span):
+        return any(s < span[1] and span[0] < e for s, e in spans)
+
+    for brand, pattern in _PART_GRAMMARS:
+        for m in pattern.finditer(upper):
+            if taken(m.span()):
+                continue
+            groups = m.groups()
+            if brand == "Honda":
+                pn = "-".join(g for g in groups if g)
+            elif brand == "Mercedes-Benz":
+                pn = "".join(groups[:5])  # without the colour code
+            else:
+                pn = "".join(groups)
+            if pn not in result.part_numbers:
+                result.part_numbers.append(pn)
+                result.brands[pn] = brand
+            spans.append(m.span())
+
+    for m in _BMW_SHORT_RE.finditer(upper):
+        span = m.span(1)[0], m.end()
+        if taken(span):
+            continue
+        pn = "".join(m.groups())
+        if pn not in result.part_numbers:
+            result.part_numbers.append(pn)
+            result.brands[pn] = "BMW"
+        spans.append(m.span())
+
+    # Whatever is left decides whether the LLM still has work to do
+    residue = list(upper)
+    for s, e in spans:
+        residue[s:e] = " " * (e - s)
+    for token in _TOKEN_RE.findall("".join(residue)):
+        token = token.strip("./-")
+        if not token:
+            continue
+        if any(c.isdigit() for c in token):
+            if len(token) >= 3 and not _YEAR_RE.match(token):
+                result.unexplained.append(token)
+        elif token not in _FILLER_WORDS and len(token) > 1:
+            result.has_free_text = True
+    return result
@@ -0,0 +1,111 @@
+"""
+Typo- and OCR-tolerant part-number matching.
+
+Every stock part number is filed under a confusion-class canonical key
+(O/Q -> 0, I/L -> 1, S -> 5, B -> 8, Z -> 2), so look-alike glyph swaps
+from OCR cost nothing. One further edit (a dropped, extra or wrong
+character) is handled at query time by probing the canonical key's
+single-edit neighbourhood: a few hundred dict lookups instead of a scan,
+and only one dict entry per part in memory.
+
+Candidates are ranked by edit distance between canonical keys (0 or 1),
+then by Levenshtein distance between the literal normalized strings
+(rapidfuzz), so the closest literal spelling wins ties.
+"""
+
+from rapidfuzz.distance import Levenshtein
+
+from .part_numbers import normalize_part_number
+
+_CONFUSION = str.maketrans("OQILSBZ", "0011582")
+# Alphabet left after folding the confusable letters
+_CANONICAL_ALPHABET = "0123456789ACDEFGHJKMNPRTUVWXY"
+
+
+def canonical_key(norm: str) -> str:
+    """Fold OCR look-alikes of an already normalized part number."""
+    return norm.translate(_CONFUSION)
+
+
+def _single_edits(key: str):
+    """The key itself plus every string one insert/delete/substitute away."""
+    yield key
+    n = len(key)
+    for i in range(n):
+        yield key[:i] + key[i + 1:]
+    for i in range(n):
+        head, tail = key[:i], key[i + 1:]
+        for ch in _CANONICAL_ALPHABET:
+            if ch != key[i]:
+                yield head + ch + tail
+    for i in range(n + 1):
+        head, tail = key[:i], key[i:]
+        for ch in _CANONICAL_ALPHABET:
+            yield head + ch + tail
+
+
+class PartNumberMatcher:
+    """Near-match index over normalized stock part numbers."""
+
+    def __init__(self, min_length: int = 6):
+        self.min_length = min_length
+        # canonical key -> normalized part number (str) or several (tuple)
+        self._by_canonical = {}
+
+    def __len__(self) -> int:
+        return len(self._by_canonical)
+
+    def add(self, norm: str) -> None:
+        if not norm or len(norm) < self.min_length:
+            return
+        key = canonical_key(norm)
+        current = self._by_canonical.get(key)
+        if current is None:
+            self._by_canonical[key] = norm
+        elif isinstance(current, str):
+            if current != norm:
+                self._by_canonical[key] = (current, norm)
+        elif norm not in current:
+            self._by_canonical[key] = current + (norm,)
+
+    def remove(self, norm: str) -> None:
+        key = canonical_key(norm or "")
+        current = self._by_canonical.get(key)
+        if current is None:
+            return
+        if isinstance(current, str):
+            if current == norm:
+                del self._by_canonical[key]
+            return
+        remaining = tuple(n for n in current if n != norm)
+        self._by_canonical[key] = remaining[0] if len(remaining) == 1 else remaining
+
+    def match(self, part_number: str, limit: int = 3, max_distance: int = 4) -> list:
+        """
+        Ranked near matches for one raw part number.
+        Returns [(normalized_part_number, edit_distance), ...], best first,
+        where edit_distance counts literal edits (capped at max_distance).
+        """
+        norm = normalize_part_number(part_number)
+        if len(norm) < self.min_length:
+            return []
+
+        key = canonical_key(norm)
+        seen = set()
+        for probe in _single_edits(key):
+            found = self._by_canonical.get(probe)
+            if found is None:
+                continue
+            if isinstance(found, str):
+                seen.add(found)
+            else:
+                seen.update(found)
+
+        ranked = []
+        for candidate in seen:
+            distance = Levenshtein.distance(norm, candidate, score_cutoff=max_distance)
+            if distance <= max_distance:
+                canonical_distance = 0 if canonical_key(candidate) == key else 1
+                ranked.append((canonical_distance, distance, candidate))
+        ranked.sort()
+        return [(candidate, distance) for _, distance, candidate in ranked[:limit]]
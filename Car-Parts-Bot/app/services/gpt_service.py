@@ -4,13 +4,63 @@ Handles multilingual queries and generates conversational responses via Super In
 """
 
 from typing import Any, Dict, List, Optional
-from openai import OpenAI
 from flask import current_app
 from .translation_service import TranslationService
+import contextvars
 import json
+import os
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .prompt_cache import get_intent_prompt
+from .prompt_builder import FALLBACK_BASE_PROMPT, build_super_intent_messages
+from .reference_index import estimate_tokens
+from .stock_index import get_stock_index
+from .entity_extractor import extract_entities_locally
+from .metrics import EXTRACTION_KEY, record as record_metrics
+from .llm_cache import cached_chat_completion
+from .openai_clients import get_openai_client
+from .model_router import full_route, record_turn, route_super_intent, validate_super_intent
+from .token_budget import count_tokens, fit_text, max_reply_tokens, prompt_budget, retry_reply_tokens
+from .part_aliases import get_alias_normalizer
+from .reply_formatter import StreamingReplyFormatter, format_whatsapp_reply, is_free_form
+from .reply_stream import ReplyStream
+from .whatsapp_sender import FOLLOW_UP_NOTICE
+
+# ================= EXTRACTION POOL =================
+# Shared, bounded pool for the independent extraction calls. Created lazily
+# per process so a forked RQ work horse never inherits the parent's threads.
+_pool = None
+_pool_pid = None
+
+
+def _extraction_pool() -> ThreadPoolExecutor:
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        workers = current_app.config.get("EXTRACTION_POOL_WORKERS", 8)
+        _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="extract")
+        _pool_pid = os.getpid()
+    return _pool
+
+
+def _submit_in_app_context(fn, *args):
+    app = current_app._get_current_object()
+    # Carries the message deadline (llm_deadlines) into the pool thread
+    context = contextvars.copy_context()
+
+    def run():
+        with app.app_context():
+            return fn(*args)
+
+    return _extraction_pool().submit(context.run, run)
+
+
+def _timed(fn, *args):
+    """(fn(*args), elapsed ms)"""
+    t0 = time.perf_counter()
+    value = fn(*args)
+    return value, round((time.perf_counter() - t0) * 1000, 1)
 
-from ..models import IntentPrompt
 
 class GPTService:
     # Metrics for Admin API compatibility
@@ -25,25 +75,29 @@ class GPTService:
 
     @property
     def client(self):
-        if not self._client:
-            # Lazy init within app context
-            try:
-                api_key = current_app.config.get("OPENAI_API_KEY")
-                if api_key:
-                    self._client = OpenAI(api_key=api_key)
-            except RuntimeError:
-                # Still outside context? Return None or handle
-                return None
-        return self._client
+        if self._client:
+            return self._client
+        # Process-wide pooled client (openai_clients.py); needs an app context
+        try:
+            return get_openai_client()
+        except RuntimeError:
+            # Still outside context? Return None or handle
+            return None
 
     def run_super_intent(
         self,
         user_text: str,
         context_data: dict,
+        on_partial=None,
     ) -> dict:
         """
         SINGLE Universal Entry Point for GPT.
         Fetches 'super_intent' prompt from DB and injects context.
+
+        on_partial(text): if given (and SUPER_INTENT_STREAMING), the reply is
+        streamed and each finished paragraph / part block is passed to it as
+        soon as it is generated; the result then has "streamed": True and
+        whatsapp_text is what was already delivered.
         """
         if not self.client:
             return {
@@ -51,60 +105,35 @@ class GPTService:
                 "machine_payload": {"action": "escalate", "error": "no_client"}
             }
 
-        # 1. Fetch Dynamic Prompt from DB
+        # 1. Fetch Dynamic Prompt (process cache, assembled with its reference material)
         # We assume the user created an intent with key="super_intent" in the dashboard.
-        prompt_row = IntentPrompt.query.filter_by(intent_key="super_intent", is_active=True).first()
-        
-        base_system_prompt = ""
-        
-        if prompt_row and prompt_row.prompt_text:
-            base_system_prompt = prompt_row.prompt_text
-            if prompt_row.reference_text:
-                # DEBUG: Print first 500 chars to verify content
-                print(f"📄 [SuperIntent DEBUG] Reference File is adding ....")
+        prompt_row = get_intent_prompt("super_intent")
 
-                base_system_prompt += f"\n\n=== REFERENCE MATERIAL ===\n{prompt_row.reference_text}\n"
-                
-                # STRICT INSTRUCTION TO USE REFERENCE
-                base_system_prompt += "\n\nCRITICAL: You are provided with 'REFERENCE MATERIAL' above. YOU MUST ANSWER ONLY USING THIS MATERIAL for any questions about warning lights or symbols. DO NOT use your internal training data. If the answer is not in the material, say 'Information not found in reference'."
-                print(f"📚 [SuperIntent] Reference material appended (length: {len(prompt_row.reference_text)} chars).")
+        # Static prefix first (byte-identical across turns, so OpenAI's prompt
+        # cache can reuse it); retrieved chunks and per-turn context after it.
+        base_system_prompt = FALLBACK_BASE_PROMPT
+        has_reference = False
+        reference_text = ""
+
+        if prompt_row and prompt_row.prompt_text:
+            base_system_prompt = prompt_row.system_prompt
+            has_reference = prompt_row.has_reference
+            if has_reference and prompt_row.reference is not None \
+                    and current_app.config.get("REFERENCE_RETRIEVAL_ENABLED", True):
+                # Only the chunks relevant to this message, not the whole document
+                base_system_prompt = prompt_row.prompt_text
+                reference_text = self._retrieved_reference(prompt_row, user_text, context_data)
+                if not reference_text:
+                    # Keep the REFERENCE rule: with nothing retrieved the model must
+                    # say the answer is not in the reference, not fall back on its own knowledge
+                    print("📚 [SuperIntent] No reference chunks matched this message.")
+            elif has_reference:
+                print(f"📚 [SuperIntent] Reference material appended (length: {prompt_row.reference_length} chars).")
             else:
                 print(f"ℹ️ [SuperIntent] No reference material found/attached for this intent.")
         else:
             print("⚠️ [SuperIntent] Database lookup for 'super_intent' failed. Using HARDCODED fallback. No logs/reference available.")
-            # FALLBACK if DB entry missing (Safety)
-            base_system_prompt = """
-                ROLE:
-                You are an advanced AI assistant for a WhatsApp-based Car Parts bot.
-                Your goal is to help users find car parts accurately and professionally.
-                BEHAVIOR:
-                - Act like a human sales agent.
-                - Use provided "Hard Business Data". DO NOT GUESS.
-                - Professional, concise tone.
-                """
-
-        # 2. Construct Context Block
-        context_block = f"""
-            INPUT CONTEXT:
-            User Text: "{user_text}"
-
-            Knowledge/State:
-            - Decoded VIN: {context_data.get('vin_info') or 'None'}
-            - Matched Parts (DB): {json.dumps(context_data.get('parts_found') or [], default=str)}
-            - Session Context: {context_data.get('session_summary', 'None')}
-
-            OUTPUT FORMULA (JSON ONLY):
-            {{
-            "whatsapp_text": "...",
-            "machine_payload": {{
-                "intent": "super_intent",
-                "action": "quote" | "ask_clarify" | "info_only" | "escalate",
-                "vin": "{(context_data.get('vin_info') or {}).get('vin') or ''}",
-                "confidence": 1.0
-            }}
-            }}
-            """
-        
+
         # 0. Detect Language
         detected_lang = "en"
         try:
@@ -112,129 +141,86 @@ class GPTService:
         except Exception:
             pass
 
-        # 3. Combine
-        final_system_message = base_system_prompt + "\n\n" + context_block
-
-        # --- RE-INJECT STRICT INSTRUCTION AT THE VERY END (RECENCY BIAS) ---
-        if "=== REFERENCE MATERIAL ===" in base_system_prompt:
-             final_system_message += """
-             
-             CRITICAL INSTRUCTION (OVERRIDE ALL PRIOR KNOWLEDGE):
-             1. You contain a section called 'REFERENCE MATERIAL' above.
-             2. You MUST IGNORE your internal training data about car parts or warning lights.
-             3. COMPARE the User's Input (visual description or text) with the descriptions in the 'REFERENCE MATERIAL'.
-             4. If the User's description is about a warning light, use the reference material to determine the meaning.
-             5. Do NOT say "it looks like X but usually means Y". Say EXACTLY what the Reference says it is.
-             6. EXCEPTION: If the user is asking for a CAR PART (e.g. Brake Pads, Filter) AND there are item(s) in the 'Matched Parts (DB)' list provided in the Context, you MUST IGNORE the Reference Material and output the parts found.
-             7. Only say "Not found in reference" if the user is asking a specific question that should be in the reference but isn't there, and NO parts were found in the DB.
-             """
-
-        # --- DEBUG / STRICT MODE OVERRIDES ---
-        # Analyze parts_found for strict status flags
         parts = context_data.get('parts_found') or []
-        strict_instructions = []
+        if (context_data.get("extracted_entities") or {}).get("part_numbers"):
+            print(f"   🔢 [SuperIntent] User provided Part Numbers. Enforcing EXTENDED FORMAT. "
+                  f"Found: {len(parts)}, Missing: {len(context_data.get('missing_pns') or [])}")
+
+        messages = build_super_intent_messages(
+            base_system_prompt, user_text, context_data, detected_lang, has_reference, reference_text,
+            token_budget=prompt_budget("super_intent"),
+        )
 
-        has_out_of_stock = any(p.get("status") == "out_of_stock" for p in parts)
-        has_error = any(p.get("status") == "error" for p in parts)
-        has_empty = any(p.get("status") == "empty" for p in parts)
-        
-        # Priority: Error > Out of Stock > Empty
-        if has_error:
-             strict_instructions.append("CRITICAL: The catalog search FAILED. You MUST reply exactly: 'Failed to search catalog due to technical error.' (plus any helpful context). Do not say 'I couldn't find it', say 'Failed to Catalog'.")
-        elif has_out_of_stock:
-             strict_instructions.append("CRITICAL: Parts were found in the catalog but are NOT in the local database. You MUST reply: 'Found in Catalog but Not in Stock'. List the part numbers found but clearly state they are out of stock.")
-        elif has_empty and not any(p.get("price") for p in parts): # Only empty/missing
-             strict_instructions.append("CRITICAL: The catalog search returned NO results. You MUST reply: 'Not in Catalog'. Do not offer to search again.")
-
-        if len(parts) >= 1:
-            strict_instructions.append(f"CRITICAL: {len(parts)} parts have been found in the database matching the user's request. You MUST present these parts (Product Name, Brand, Price, Availability). You SHOULD briefly acknowledge the user's specific issue (e.g. 'I see the door handle is broken') derived from the input before listing the parts.")
-            # strict_instructions.append(f"CRITICAL: {len(parts)} parts have been found in the database matching the user's request. You MUST present these parts (Product Name, Brand, Price, Availability). Do NOT ask the user what they are looking for, because the search was successful!")
-
-        # --- MULTIPLE parts enforcement ---
-        if len(parts) > 1:
-            strict_instructions.append(f"""CRITICAL: {len(parts)} parts were found in the database. 
-            The user might have asked for a specific part number, BUT you MUST also show the other {len(parts)-1} related parts (Siblings/Alternatives) found in the database.
-            DO NOT FILTER the list. You are a salesman offering OPTIONS.
-            You MUST output the details for ALL {len(parts)} parts found. List them all.""")
-
-        # --- MULTILINGUAL ENFORCEMENT ---
-        if detected_lang != "en":
-            strict_instructions.append(f"CRITICAL: The user is speaking language code '{detected_lang}'. You MUST reply ENTIRELY in that language, except for Technical Terms (Part Names/Numbers) which can remain in English. Do NOT mix languages unnecessarily.")
-        
-        if strict_instructions:
-            # print(f"   🚨 [SuperIntent] Strict Instructions Triggered: {len(strict_instructions)} rules.")
-            # print(f"   🚨 Rules: {strict_instructions}")
-            final_system_message += "\n\n" + "\n".join(strict_instructions)
-
-        # --- PART NUMBER SPECIFIC FORMATTING ---
-        # User Rule: if user provide part number then in reply it also include part number as per item in reply
-        # means: brand, price, part number, availability. Only if user only provide part number.
-        extracted = context_data.get("extracted_entities", {})
-        user_pns = extracted.get("part_numbers", [])
-        user_descs = extracted.get("item_descriptions", [])
-        
-        # Condition: Has Part Numbers AND (No Descriptions OR Very few descriptions compared to PNs)
-        # We'll use a simple heuristic: If PNs exist, we want this strict table format for clarity.
-        if user_pns:
-            missing_pns = context_data.get("missing_pns", [])
-            print(f"   🔢 [SuperIntent] User provided Part Numbers. Enforcing EXTENDED FORMAT. Found: {len(parts)}, Missing: {len(missing_pns)}")
-            
-            # CASE A: Some parts found
-            if len(parts) > 0:
-                 format_instruction = f"""
-                 CRITICAL: The user searched by PART NUMBER. 
-                 1. You MUST start the response with: "Thank you for providing the part number . Here are the available options for this part:"
-                 2. You MUST format the output for found parts EXACTLY as follows for each item (Use a Numbered List):
-                 
-                 [Number]. *[Part Name]*
-                    - Brand: [Insert Actual Brand Name]
-                    - Price: [Insert Actual Price]
-                    - Part Number: [Insert Actual Part Number]
-                    - Availability: [Insert In Stock / Out of Stock]
-                 
-                 IMPORTANT: Replace the terms in brackets [] with the REAL data from the found parts context. Do NOT use the text "Brand Name" or "Price" literally.
-                 MANDATORY: You MUST include the 'Part Number' line for EVERY item.
-                 Do not summarize. Show this block for EVERY matching part found.
-                 """
-                 
-                 if missing_pns:
-                     format_instruction += f"\n\n3. FOR MISSING PARTS: The following part numbers were NOT found in the database: {', '.join(missing_pns)}.\n   You MUST add this exact line for each missing part:\n   'For part number [Missing Part Number], our team will contact you soon.'"
-
-                 final_system_message += "\n\n" + format_instruction
-            
-            # CASE B: NO parts found at all
-            elif len(parts) == 0:
-                 format_instruction = f"""
-                 CRITICAL: The user searched by PART NUMBER, but NO MATCHING PARTS were found in the database.
-                 
-                 You MUST output the following message explicitly:
-                 "Thank you for providing the part number .
-                 
-                 For part number {', '.join(missing_pns)}, our team will contact you soon."
-                 
-                 Do NOT add any other table or placeholders. Just the above acknowledgement.
-                 """
-                 final_system_message += "\n\n" + format_instruction
-        
         print(f"   📦 [SuperIntent] Parts Context: {len(parts)} items passed to GPT.")
 
-        try:
-            start_time = time.time()
-            response = self.client.chat.completions.create(
-                # CRITICAL UPGRADE: Use gpt-4o for better reasoning and strict instruction following
-                model="gpt-4o", 
-                messages=[
-                    {"role": "system", "content": final_system_message},
-                    {"role": "user", "content": user_text},
-                ],
+        route = route_super_intent(user_text, context_data, detected_lang, has_reference)
+
+        def make_stream():
+            # Only the full model streams: a cheap answer may still fail
+            # validation, and what was sent can't be taken back
+            if on_partial is None or not current_app.config.get("SUPER_INTENT_STREAMING", True) \
+                    or current_app.config.get("REPLY_FORMATTER", "local") != "local":
+                return None
+            return ReplyStream(on_partial, StreamingReplyFormatter(
+                parts, detected_lang, currency=current_app.config.get("REPLY_CURRENCY", "AED")
+            ))
+
+        max_tokens = max_reply_tokens("super_intent", items=len(parts))
+
+        def call(model, stream, max_tokens=max_tokens):
+            return cached_chat_completion(
+                self.client, "super_intent",
+                on_delta=stream.feed if stream is not None else None,
+                model=model,
+                messages=messages,
                 temperature=0.1, # Reduced temperature for stricter adherence
-                max_tokens=10000,
+                max_tokens=max_tokens,
                 response_format={"type": "json_object"}
             )
-            
-            raw_content = response.choices[0].message.content
-            # print(f"🤖 [GPT-4o Raw Response]: {raw_content[:500]}...") # DEBUG LOG
-            result = json.loads(raw_content)
+
+        def cut_off(response):
+            return bool(response.choices) and response.choices[0].finish_reason == "length"
+
+        stream = None
+        try:
+            start_time = time.perf_counter()
+            stream = make_stream() if route.tier == "full" else None
+            response = call(route.model, stream)
+            calls = [(route.model, response.usage)]
+            result, problem = validate_super_intent(response.choices[0].message.content, context_data)
+            if cut_off(response):
+                problem = f"cut off at max_tokens={max_tokens}"
+
+            if problem and route.tier == "mini":
+                # Cheap answer unusable: redo the turn on the full model
+                # (with room to finish, if the cheap one ran out of it)
+                print(f"   ⤴️ [SuperIntent] {route.model} answer rejected ({problem}), escalating.")
+                full = full_route(route.score, route.reasons)
+                if cut_off(response):
+                    max_tokens = retry_reply_tokens("super_intent", max_tokens) or max_tokens
+                stream = make_stream()
+                response = call(full.model, stream, max_tokens)
+                calls.append((full.model, response.usage))
+                result, _ = validate_super_intent(response.choices[0].message.content, context_data)
+
+            retry_tokens = retry_reply_tokens("super_intent", max_tokens) if cut_off(response) else None
+            if retry_tokens and (stream is None or not stream.sent):
+                # Ran out of max_tokens before anything reached the user: once more with room to finish
+                print(f"   ✂️ [SuperIntent] Reply cut off at {max_tokens} tokens, retrying with {retry_tokens}.")
+                model = calls[-1][0]
+                stream = make_stream() if stream is not None else None
+                response = call(model, stream, retry_tokens)
+                calls.append((model, response.usage))
+                result, _ = validate_super_intent(response.choices[0].message.content, context_data)
+            record_turn(route, calls, (time.perf_counter() - start_time) * 1000, problem)
+
+            if cut_off(response) and stream is not None and stream.sent:
+                # Part of it is already with the user and can't be taken back: hand over to the team
+                print(f"   ✂️ [SuperIntent] Streamed reply cut off at max_tokens, escalating.")
+                return self._streamed_escalation(stream, "reply_cut_off")
+
+            if result is None:
+                raise ValueError(f"invalid super-intent response ({problem})")
             
             # Simple validation
             if "whatsapp_text" not in result:
@@ -243,20 +229,54 @@ class GPTService:
                 # auto-repair payload
                 result["machine_payload"] = {"action": "info_only", "intent": "super_intent"}
             print(result['whatsapp_text'])
+            if stream is not None and stream.started:
+                # Already on its way to the user, block by block
+                result["whatsapp_text"] = stream.finish(result["machine_payload"].get("action")) or result["whatsapp_text"]
+                result["streamed"] = bool(stream.sent)
             # Chain: Format Response (Sales Agent Persona)
-            if "whatsapp_text" in result:
-                formatted_text = self._format_as_sales_agent(result["whatsapp_text"])
-                result["whatsapp_text"] = formatted_text
+            elif "whatsapp_text" in result:
+                result["whatsapp_text"] = self._format_reply(
+                    result["whatsapp_text"], result["machine_payload"], parts, detected_lang
+                )
                 
             return result
 
         except Exception as e:
             current_app.logger.error(f"GPT execution failed: {e}")
+            if stream is not None and stream.sent:
+                # Part of the reply is already with the user: hand over, don't apologise for all of it
+                return self._streamed_escalation(stream, str(e))
             return {
                 "whatsapp_text": "Thank you for your message. I am unable to fetch your details accurately at the moment. Our team will contact you soon to assist you further.",
                 "machine_payload": {"action": "escalate", "error": str(e)}
             }
 
+    @staticmethod
+    def _streamed_escalation(stream, error: str) -> dict:
+        """What was streamed, plus a follow-up notice in place of the rest."""
+        text = stream.finish(complete=False)
+        stream.deliver(FOLLOW_UP_NOTICE)
+        return {
+            "whatsapp_text": "\n\n".join(t for t in (text, FOLLOW_UP_NOTICE) if t),
+            "machine_payload": {"action": "escalate", "error": error},
+            "streamed": True,
+        }
+
+    def _retrieved_reference(self, prompt_row, user_text: str, context_data: dict) -> str:
+        """The top reference chunks for this message, rendered ("" if none match)."""
+        extracted = context_data.get("extracted_entities") or {}
+        query = " ".join([user_text or ""] + list(extracted.get("item_descriptions") or []))
+        index = prompt_row.reference
+        chunks = index.select(
+            query,
+            top_k=current_app.config.get("REFERENCE_TOP_K", 4),
+            token_budget=current_app.config.get("REFERENCE_TOKEN_BUDGET", 1500),
+        )
+        used = estimate_tokens(index.render(chunks))
+        print(f"📚 [SuperIntent] Reference: {len(chunks)}/{len(index)} chunks, "
+              f"~{used} of ~{index.total_tokens} tokens.")
+        return index.render(chunks)
+
     def extract_text_from_image(self, base64_image: str) -> str:
         """
         Uses GPT-4o Vision to extract text from a base64 encoded image.
@@ -280,7 +300,8 @@ class GPTService:
         """
         
         try:
-            response = self.client.chat.completions.create(
+            response = cached_chat_completion(
+                self.client, "vision_ocr",
                 model="gpt-4o",
                 messages=[
                     {
@@ -297,7 +318,7 @@ class GPTService:
                         ]
                     }
                 ],
-                max_tokens=1500
+                max_tokens=max_reply_tokens("vision_ocr")
             )
             return response.choices[0].message.content.strip()
         except Exception as e:
@@ -309,21 +330,36 @@ class GPTService:
         """
         Takes a list of raw part names (e.g. "boot", "fly wheel") and normalizes them
         according to the 'parts_alias_text' defined in the Super Intent.
+
+        The compiled alias rules (part_aliases.AliasNormalizer) handle known
+        words locally; only names with words they cannot place go to GPT.
         """
         if not raw_parts:
             return []
 
-        # 1. Fetch Normalization Rules
-        normalization_rules = ""
+        # 1. Local pass with the compiled rules
         try:
-            prompt_row = IntentPrompt.query.filter_by(intent_key="super_intent").first()
-            if prompt_row and prompt_row.parts_alias_text:
-                normalization_rules = prompt_row.parts_alias_text
-        except Exception:
-            return raw_parts # Fallback to raw if DB fails
-
-        if not normalization_rules:
+            normalizer = get_alias_normalizer()
+        except Exception as e:
+            current_app.logger.error(f"Alias rules unavailable: {e}")
             return raw_parts
+        index = get_stock_index()
+        stock_vocabulary = index.text.bm25.postings if index is not None else frozenset()
+        local, unresolved = normalizer.normalize_all(raw_parts, stock_vocabulary)
+        record_metrics(EXTRACTION_KEY, normalize_terms=len(raw_parts), normalize_llm_terms=len(unresolved))
+
+        if unresolved and normalizer.pairs:
+            from_llm = self._normalize_part_names_llm(unresolved, normalizer.pairs)
+            if len(from_llm) == len(unresolved):
+                fixed = iter(from_llm)
+                local = [next(fixed) if n is None else n for n in local]
+        merged = [n if n is not None else raw for n, raw in zip(local, raw_parts)]
+
+        seen = set()
+        return [n for n in merged if n and not (n in seen or seen.add(n))]
+
+    def _normalize_part_names_llm(self, raw_parts: List[str], pairs) -> List[str]:
+        normalization_rules = "\n".join(f"{alias} -> {replacement}" for alias, replacement in pairs)
 
         # 2. Run FAST GPT Check
         system_prompt = f"""
@@ -346,13 +382,15 @@ class GPTService:
         """
 
         try:
-            response = self.client.chat.completions.create(
+            response = cached_chat_completion(
+                self.client, "normalize",
                 model="gpt-4o-mini", # Fast model is fine here
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": json.dumps(raw_parts)},
                 ],
                 temperature=0.0,
+                max_tokens=max_reply_tokens("normalize", items=len(raw_parts)),
                 response_format={"type": "json_object"}
             )
             data = json.loads(response.choices[0].message.content)
@@ -388,13 +426,16 @@ class GPTService:
         Output: {"parts": ["boot", "side mirror"]}
         """
         try:
-            response = self.client.chat.completions.create(
+            text = fit_text("part_names", text, fixed_tokens=count_tokens(system_prompt))
+            response = cached_chat_completion(
+                self.client, "part_names",
                 model="gpt-4o-mini",
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": text},
                 ],
                 temperature=0.0,
+                max_tokens=max_reply_tokens("part_names", count_tokens(text)),
                 response_format={"type": "json_object"}
             )
             data = json.loads(response.choices[0].message.content)
@@ -410,11 +451,62 @@ class GPTService:
         - VINs (17 chars)
         - Part Numbers (alphanumeric codes)
         - Part Names (via dedicated sub-agent)
+
+        A deterministic pre-pass (entity_extractor) runs first: when it can
+        place every code-like token, the gpt-4o VIN/number call is skipped,
+        and when nothing but codes is left, the part-name calls are too.
         """
+        local = None
+        if current_app.config.get("LOCAL_EXTRACTOR_ENABLED", True):
+            local = extract_entities_locally(text)
+
         if not self.client:
-            return {"vin_list": [], "part_numbers": [], "item_descriptions": []}
+            if local is None:
+                return {"vin_list": [], "part_numbers": [], "item_descriptions": []}
+            return {"vin_list": local.vin_list, "part_numbers": local.part_numbers, "item_descriptions": []}
+
+        counters = {"messages": 1}
+        started = time.perf_counter()
+        try:
+            # 1. Main Extraction (VINs + Numbers), on the pool while the
+            #    part-name stages run here
+            codes_future = None
+            if local is not None and local.confident:
+                result = {"vin_list": local.vin_list, "part_numbers": local.part_numbers}
+                counters["llm_skipped"] = 1
+            else:
+                codes_future = _submit_in_app_context(_timed, self._extract_codes_llm, text)
 
-        # 1. Main Extraction (VINs + Numbers)
+            # 2. Dedicated Part Name Extraction (Loose)
+            raw_parts = []
+            if local is not None and local.codes_only:
+                counters["names_skipped"] = 1
+            else:
+                raw_parts, counters["names_ms_total"] = _timed(self._extract_part_names_only, text)
+
+            # 3. Normalize Part Names (Strict) - starts as soon as names arrive
+            normalized_parts = []
+            if raw_parts:
+                normalized_parts, counters["normalize_ms_total"] = _timed(self._normalize_part_names, raw_parts)
+                counters["normalize_calls"] = 1
+
+            if codes_future is not None:
+                result, counters["llm_ms_total"] = codes_future.result()
+                counters["llm_calls"] = 1
+
+            result["item_descriptions"] = normalized_parts
+            return result
+
+        except Exception:
+            return {"vin_list": [], "part_numbers": [], "item_descriptions": []}
+        finally:
+            counters["wall_ms_total"] = round((time.perf_counter() - started) * 1000, 1)
+            record_metrics(EXTRACTION_KEY, **counters)
+            stages = ", ".join(f"{k[:-9]}={v:.0f}ms" for k, v in counters.items() if k.endswith("_ms_total"))
+            print(f"⏱️ [Extraction] {stages}")
+
+    def _extract_codes_llm(self, text: str) -> dict:
+        """gpt-4o VIN + part number extraction (raises on API/JSON errors)."""
         system_prompt = """
         You are an Entity Extractor API. 
         
@@ -433,32 +525,19 @@ class GPTService:
             "part_numbers": []
         }
         """
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o", 
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": text},
-                ],
-                temperature=0.0,
-                response_format={"type": "json_object"}
-            )
-            result = json.loads(response.choices[0].message.content)
-            
-            # 2. Dedicated Part Name Extraction (Loose)
-            raw_parts = self._extract_part_names_only(text)
-            
-            # 3. Normalize Part Names (Strict)
-            if raw_parts:
-                normalized_parts = self._normalize_part_names(raw_parts)
-                result["item_descriptions"] = normalized_parts
-            else:
-                result["item_descriptions"] = []
-                
-            return result
-            
-        except Exception:
-            return {"vin_list": [], "part_numbers": [], "item_descriptions": []}
+        text = fit_text("extract_codes", text, fixed_tokens=count_tokens(system_prompt))
+        response = cached_chat_completion(
+            self.client, "extract_codes",
+            model="gpt-4o", 
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": text},
+            ],
+            temperature=0.0,
+            max_tokens=max_reply_tokens("extract_codes", count_tokens(text)),
+            response_format={"type": "json_object"}
+        )
+        return json.loads(response.choices[0].message.content)
 
     # def execute_specific_intent(
     #     self,
@@ -535,6 +614,20 @@ class GPTService:
     #         }
 
 
+    def _format_reply(self, text: str, payload: dict, parts: list, lang: str) -> str:
+        """
+        House-style formatting. REPLY_FORMATTER:
+        - "local": deterministic formatter only (no LLM call)
+        - "hybrid": LLM formatter for free-form answers, local for the rest
+        - "llm": LLM formatter for everything (previous behaviour)
+        """
+        mode = current_app.config.get("REPLY_FORMATTER", "local")
+        if mode == "llm" or (mode == "hybrid" and is_free_form(payload, parts)):
+            return self._format_as_sales_agent(text)
+        return format_whatsapp_reply(
+            text, payload, parts, lang, currency=current_app.config.get("REPLY_CURRENCY", "AED")
+        )
+
     def _format_as_sales_agent(self, raw_text: str) -> str:
         """
         Post-processing step: Reformats the text to look like a professional WhatsApp Sales Agent.
@@ -570,13 +663,15 @@ class GPTService:
         """
         
         try:
-            response = self.client.chat.completions.create(
+            response = cached_chat_completion(
+                self.client, "format",
                 model="gpt-4o", # UPGRADE to gpt-4o for better long-context handling
                 messages=[
                     {"role": "system", "content": system_prompt.replace("{raw_text}", raw_text)},
                 ],
                 temperature=0.3, 
-                max_tokens=10000 # Standard safe max output for GPT models
+                # Reformatting: about as long as the input
+                max_tokens=max_reply_tokens("format", count_tokens(raw_text))
             )
             return response.choices[0].message.content.strip()
         except Exception as e:
@@ -0,0 +1,261 @@
+"""
+Redis cache for OpenAI chat completions, with single-flight coalescing.
+
+cached_chat_completion() is a drop-in for client.chat.completions.create():
+it returns a ChatCompletion, so callers keep reading
+response.choices[0].message.content.
+
+Key: llm:<call type>:<model>:<prompt hash>:<input hash>
+    prompt hash  system messages + request options, so editing a prompt
+                 (or the super-intent prompt in the dashboard) starts a
+                 fresh set of entries
+    input hash   the remaining messages, with text whitespace-collapsed and
+                 case-folded ("Hi " and "hi" share an entry)
+With LLM_BASE_URL set (a stand-in server) the URL is part of the prompt
+hash, so stand-in answers never mix with real ones in a shared Redis.
+
+Single flight: the first process to miss takes a short Redis lock and
+makes the call; others missing on the same key while it runs wait for
+its result instead of calling OpenAI too. If the owner dies or is slow
+past LLM_CACHE_WAIT_SECONDS (or past what the message deadline leaves,
+see llm_deadlines.wait_timeout), waiters make their own call.
+
+Any Redis failure degrades to a plain uncached call.
+
+Streaming: with on_delta, a real call is made with stream=True and every
+content delta is passed to on_delta as it arrives; a cached or coalesced
+answer is passed in one piece. Either way the caller gets the complete
+ChatCompletion back, and that is what gets cached.
+
+Real calls go through llm_deadlines.call_with_retries: a timeout from the
+message deadline, jittered retries and, for LLM_HEDGE_CALLS, hedging. A
+stream is only retried if it failed before delivering any text.
+
+Every real API call (cache hits excluded) also records its token usage under
+LLM_USAGE_METRICS_KEY, including usage.prompt_tokens_details.cached_tokens:
+the part of the prompt OpenAI served from its own prefix cache
+(see prompt_builder for the super-intent layout that makes this hit).
+"""
+
+import hashlib
+import json
+import time
+
+from flask import current_app
+from openai.types.chat import ChatCompletion
+
+from ..redis_client import redis_client
+from .llm_deadlines import call_with_retries, wait_timeout
+from .metrics import record as record_metrics
+
+LLM_CACHE_METRICS_KEY = "metrics:llm_cache"
+LLM_USAGE_METRICS_KEY = "metrics:llm_usage"
+
+# Seconds an entry lives, per call type
+DEFAULT_TTLS = {
+    "extract_codes": 7 * 86400,
+    "part_names": 7 * 86400,
+    "normalize": 7 * 86400,
+    "format": 7 * 86400,
+    "language": 30 * 86400,
+    "voice_clean": 7 * 86400,
+    "vision_ocr": 7 * 86400,
+    "super_intent": 3600,  # carries stock/prices in its context
+}
+
+_POLL_SECONDS = 0.05
+
+
+def _ttl(call_type: str) -> int:
+    overrides = current_app.config.get("LLM_CACHE_TTLS") or ""
+    for item in overrides.split(","):
+        name, _, value = item.partition("=")
+        if name.strip() == call_type and value.strip().isdigit():
+            return int(value)
+    return DEFAULT_TTLS.get(call_type, current_app.config.get("LLM_CACHE_DEFAULT_TTL", 3600))
+
+
+def _normalize_content(content):
+    if isinstance(content, str):
+        return " ".join(content.split()).casefold()
+    return content  # multi-part (image) content is hashed as-is
+
+
+def cache_key(call_type: str, **kwargs) -> str:
+    messages = kwargs.get("messages") or []
+    options = {k: v for k, v in kwargs.items() if k != "messages"}
+    if current_app.config.get("LLM_BASE_URL"):
+        options["base_url"] = current_app.config["LLM_BASE_URL"]
+    system = [m.get("content") for m in messages if m.get("role") == "system"]
+    rest = [(m.get("role"), _normalize_content(m.get("content"))) for m in messages if m.get("role") != "system"]
+
+    prompt_hash = hashlib.blake2b(
+        json.dumps([system, options], sort_keys=True, default=str).encode(), digest_size=6
+    ).hexdigest()
+    input_hash = hashlib.blake2b(
+        json.dumps(rest, sort_keys=True, default=str).encode(), digest_size=16
+    ).hexdigest()
+    return f"llm:{call_type}:{kwargs.get('model')}:{prompt_hash}:{input_hash}"
+
+
+def _load(raw) -> tuple:
+    entry = json.loads(raw)
+    return ChatCompletion.model_validate(entry["response"]), entry.get("latency_ms", 0)
+
+
+def record_usage(call_type: str, response) -> None:
+    """Prompt / cached / completion tokens of one API response, per call type. Never raises."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) or 0
+    fields = {
+        "prompt_tokens": usage.prompt_tokens or 0,
+        "cached_tokens": cached,
+        "completion_tokens": usage.completion_tokens or 0,
+    }
+    print(f"🧮 [Tokens] {call_type}: prompt {fields['prompt_tokens']} (cached {cached}), "
+          f"completion {fields['completion_tokens']}")
+    if response.choices and response.choices[0].finish_reason == "length":
+        print(f"⚠️ [Tokens] {call_type}: reply hit max_tokens and was cut off")
+        fields["truncated"] = 1
+    record_metrics(
+        LLM_USAGE_METRICS_KEY,
+        calls=1, **fields,
+        **{f"calls:{call_type}": 1}, **{f"{k}:{call_type}": v for k, v in fields.items()},
+    )
+
+
+def _stream(client, kwargs: dict, on_delta):
+    """Streams a completion into on_delta; returns it reassembled as a ChatCompletion."""
+    first, usage, finish_reason, content = None, None, None, []
+    for chunk in client.chat.completions.create(**kwargs, stream=True, stream_options={"include_usage": True}):
+        first = first or chunk
+        usage = chunk.usage or usage
+        for choice in chunk.choices:
+            if choice.delta and choice.delta.content:
+                content.append(choice.delta.content)
+                on_delta(choice.delta.content)
+            finish_reason = choice.finish_reason or finish_reason
+    return ChatCompletion.model_validate({
+        "id": first.id if first else "",
+        "object": "chat.completion",
+        "created": first.created if first else 0,
+        "model": first.model if first else kwargs.get("model"),
+        "choices": [{
+            "index": 0,
+            "finish_reason": finish_reason or "stop",
+            "message": {"role": "assistant", "content": "".join(content)},
+        }],
+        "usage": usage.model_dump() if usage else None,
+    })
+
+
+def _replay(response, on_delta):
+    if on_delta is not None and response.choices:
+        on_delta(response.choices[0].message.content or "")
+    return response
+
+
+def _create(client, call_type: str, kwargs: dict, on_delta):
+    if on_delta is None:
+        return call_with_retries(call_type, lambda timeout: client.with_options(
+            timeout=timeout, max_retries=0).chat.completions.create(**kwargs))
+
+    delivered = False
+
+    def feed(delta):
+        nonlocal delivered
+        delivered = True
+        on_delta(delta)
+
+    return call_with_retries(
+        call_type, lambda timeout: _stream(client.with_options(timeout=timeout, max_retries=0), kwargs, feed),
+        can_retry=lambda: not delivered, hedge=False,
+    )
+
+
+def _call(client, call_type: str, key: str | None, kwargs: dict, counters: dict, on_delta=None):
+    t0 = time.perf_counter()
+    response = _create(client, call_type, kwargs, on_delta)
+    latency_ms = round((time.perf_counter() - t0) * 1000, 1)
+    counters["call_ms_total"] = latency_ms
+    record_usage(call_type, response)
+
+    if key is not None and response.choices and response.choices[0].finish_reason != "length":
+        try:
+            redis_client.set(
+                key,
+                json.dumps({"latency_ms": latency_ms, "response": response.model_dump(mode="json")}),
+                ex=_ttl(call_type),
+            )
+        except Exception as e:
+            print(f"⚠️ LLM cache store failed ({call_type}): {e}")
+    return response
+
+
+def cached_chat_completion(client, call_type: str, on_delta=None, **kwargs):
+    if not current_app.config.get("LLM_CACHE_ENABLED", True):
+        response = _create(client, call_type, kwargs, on_delta)
+        record_usage(call_type, response)
+        return response
+
+    key = cache_key(call_type, **kwargs)
+    counters = {}
+    try:
+        try:
+            raw = redis_client.get(key)
+            if raw:
+                response, saved_ms = _load(raw)
+                counters.update({"hits": 1, f"hits:{call_type}": 1, "saved_ms_total": saved_ms})
+                return _replay(response, on_delta)
+
+            lock = redis_client.lock(
+                f"{key}:lock", timeout=current_app.config.get("LLM_CACHE_LOCK_SECONDS", 60)
+            )
+            owner = lock.acquire(blocking=False)
+        except Exception as e:
+            print(f"⚠️ LLM cache unavailable ({call_type}): {e}")
+            counters["errors"] = 1
+            return _call(client, call_type, None, kwargs, counters, on_delta)
+
+        if owner:
+            counters.update({"misses": 1, f"misses:{call_type}": 1})
+            try:
+                return _call(client, call_type, key, kwargs, counters, on_delta)
+            finally:
+                try:
+                    lock.release()
+                except Exception:
+                    pass
+
+        # Someone else is making this exact call: wait for their answer,
+        # but not into the time this message needs to make the call itself
+        t0 = time.perf_counter()
+        deadline = time.monotonic() + wait_timeout(
+            call_type, current_app.config.get("LLM_CACHE_WAIT_SECONDS", 30)
+        )
+        while time.monotonic() < deadline:
+            time.sleep(_POLL_SECONDS)
+            try:
+                raw = redis_client.get(key)
+                if raw:
+                    response, latency_ms = _load(raw)
+                    waited_ms = (time.perf_counter() - t0) * 1000
+                    counters.update({
+                        "coalesced": 1,
+                        f"coalesced:{call_type}": 1,
+                        "saved_ms_total": round(max(latency_ms - waited_ms, 0), 1),
+                    })
+                    return _replay(response, on_delta)
+                if not lock.locked():
+                    break  # owner gave up without a result
+            except Exception:
+                break
+
+        counters.update({"misses": 1, f"misses:{call_type}": 1})
+        return _call(client, call_type, key, kwargs, counters, on_delta)
+    finally:
+        if counters:
+            record_metrics(LLM_CACHE_METRICS_KEY, **counters)
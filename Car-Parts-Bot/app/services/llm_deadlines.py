@@ -0,0 +1,255 @@
+"""
+Deadlines, timeouts, retries and hedging for OpenAI calls.
+
+A slow OpenAI response (p99 is often 10-20 s) used to hold up the whole RQ
+job: there were no explicit timeouts and the SDK's own retries knew nothing
+about how long the user had already waited.
+
+- message_deadline(): every message gets MESSAGE_DEADLINE_SECONDS. Each
+  call's timeout is its own cap (DEFAULT_TIMEOUTS / LLM_CALL_TIMEOUTS) or
+  what is left of the deadline, whichever is smaller. Calls before the
+  reply keep LLM_DEADLINE_RESERVE_SECONDS back for super_intent; a call
+  that can't get LLM_MIN_CALL_SECONDS raises DeadlineExceeded instead.
+- call_with_retries(): transient errors (timeouts, connection errors, 429,
+  5xx) are retried with full-jitter exponential backoff, honouring
+  retry-after, and never past the deadline. The SDK's own retries are off
+  for these calls.
+- Hedging (LLM_HEDGE_CALLS, e.g. extract_codes): if the call hasn't
+  answered after the recent p95 latency of its call type, a duplicate is
+  fired and whichever finishes first wins. The loser can't be cancelled
+  mid-request; it finishes in the background and is dropped.
+
+Retries, hedges, hedge wins, timeouts and deadline misses are counted per
+call type under LLM_CALLS_KEY.
+"""
+
+import contextvars
+import os
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+import openai
+from flask import current_app
+
+from ..redis_client import redis_client
+from .metrics import record as record_metrics
+
+LLM_CALLS_KEY = "metrics:llm_calls"
+
+# Per-call timeout caps in seconds, per call type
+DEFAULT_TIMEOUTS = {
+    "super_intent": 45,
+    "format": 20,
+    "extract_codes": 12,
+    "part_names": 10,
+    "normalize": 10,
+    "language": 5,
+    "voice_clean": 15,
+    "vision_ocr": 30,
+    "transcribe": 30,
+}
+
+# The reply itself: the only call that may use the reserve
+_FINAL_CALLS = {"super_intent", "format"}
+
+_RETRYABLE = (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)
+
+_LATENCY_SAMPLES = 200
+_MIN_HEDGE_SAMPLES = 20
+
+_deadline = contextvars.ContextVar("llm_deadline", default=None)
+_pool = None
+_pool_pid = None
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+# ================= DEADLINES =================
+
+@contextmanager
+def message_deadline(seconds: float | None = None):
+    """Every OpenAI call inside the block shares one deadline."""
+    if seconds is None:
+        seconds = current_app.config.get("MESSAGE_DEADLINE_SECONDS", 60)
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> float | None:
+    """Seconds left before the message deadline (None outside one)."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def _cap(call_type: str) -> float:
+    for item in (current_app.config.get("LLM_CALL_TIMEOUTS") or "").split(","):
+        name, _, value = item.partition("=")
+        if name.strip() == call_type and value.strip().replace(".", "", 1).isdigit():
+            return float(value)
+    return DEFAULT_TIMEOUTS.get(call_type, current_app.config.get("OPENAI_TIMEOUT_SECONDS", 180))
+
+
+def _time_left(call_type: str) -> float | None:
+    """remaining(), less the final reply's reserve for calls before it."""
+    left = remaining()
+    if left is not None and call_type not in _FINAL_CALLS:
+        left -= current_app.config.get("LLM_DEADLINE_RESERVE_SECONDS", 15)
+    return left
+
+
+def call_timeout(call_type: str) -> float:
+    """This call's timeout in seconds; raises DeadlineExceeded if there's no time left for it."""
+    cap = _cap(call_type)
+    left = _time_left(call_type)
+    if left is None:
+        return cap
+    if left < current_app.config.get("LLM_MIN_CALL_SECONDS", 1.0):
+        record_metrics(LLM_CALLS_KEY, **{f"deadline_exceeded:{call_type}": 1})
+        raise DeadlineExceeded(f"{call_type}: message deadline reached")
+    return min(cap, left)
+
+
+def wait_timeout(call_type: str, cap: float) -> float:
+    """
+    How long to wait on someone else's identical call (at most `cap`) and
+    still leave LLM_MIN_CALL_SECONDS to make it ourselves if they fail.
+    """
+    left = _time_left(call_type)
+    if left is None:
+        return cap
+    return max(0.0, min(cap, left - current_app.config.get("LLM_MIN_CALL_SECONDS", 1.0)))
+
+
+# ================= RETRIES =================
+
+def _retry_after(error) -> float | None:
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    ms = response.headers.get("retry-after-ms")
+    if ms:
+        try:
+            return float(ms) / 1000
+        except ValueError:
+            pass
+    seconds = response.headers.get("retry-after")
+    return float(seconds) if seconds and seconds.replace(".", "", 1).isdigit() else None
+
+
+def backoff_seconds(attempt: int, error=None) -> float:
+    """Full jitter: uniform(0, min(max, base * 2^attempt)), at least any retry-after."""
+    config = current_app.config
+    max_ms = config.get("LLM_RETRY_MAX_MS", 4000)
+    delay = random.uniform(0, min(max_ms, config.get("LLM_RETRY_BASE_MS", 250) * 2 ** attempt) / 1000)
+    retry_after = _retry_after(error) if error is not None else None
+    return max(delay, min(retry_after, max_ms / 1000)) if retry_after else delay
+
+
+def call_with_retries(call_type: str, fn, can_retry=lambda: True, hedge: bool = True):
+    """
+    fn(timeout) -> result. Hedged when call_type is in LLM_HEDGE_CALLS
+    (and `hedge`: fn has no side effects, so it can run twice at once).
+    can_retry(): False once a failed attempt has had side effects (a
+    stream that already delivered text).
+    """
+    attempts = current_app.config.get("LLM_RETRY_ATTEMPTS", 2) + 1
+    hedge_after = hedge_delay(call_type) if hedge else None
+    for attempt in range(attempts):
+        timeout = call_timeout(call_type)
+        t0 = time.perf_counter()
+        try:
+            if hedge_after is None:
+                result = fn(timeout)
+            else:
+                result = _hedged(call_type, fn, timeout, hedge_after)
+        except _RETRYABLE as e:
+            fields = {f"timeouts:{call_type}": 1} if isinstance(e, openai.APITimeoutError) else {}
+            delay = backoff_seconds(attempt, e)
+            left = remaining()
+            if attempt + 1 == attempts or not can_retry() or \
+                    (left is not None and left - delay < current_app.config.get("LLM_MIN_CALL_SECONDS", 1.0)):
+                record_metrics(LLM_CALLS_KEY, **fields, **{f"failures:{call_type}": 1})
+                raise
+            print(f"🔁 [LLM] {call_type}: {type(e).__name__}, retry {attempt + 1} in {delay * 1000:.0f} ms")
+            record_metrics(LLM_CALLS_KEY, **fields, retries=1, **{f"retries:{call_type}": 1})
+            time.sleep(delay)
+            continue
+        if hedge_after is not None:
+            _observe(call_type, (time.perf_counter() - t0) * 1000)
+        return result
+
+
+# ================= HEDGING =================
+
+def _hedge_pool() -> ThreadPoolExecutor:
+    # Per process: a forked RQ work horse never inherits the parent's threads
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        _pool = ThreadPoolExecutor(max_workers=current_app.config.get("LLM_HEDGE_POOL_WORKERS", 8),
+                                   thread_name_prefix="hedge")
+        _pool_pid = os.getpid()
+    return _pool
+
+
+def _latency_key(call_type: str) -> str:
+    return f"llm:latency:{call_type}"
+
+
+def _observe(call_type: str, ms: float) -> None:
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.lpush(_latency_key(call_type), round(ms, 1))
+        pipe.ltrim(_latency_key(call_type), 0, _LATENCY_SAMPLES - 1)
+        pipe.execute()
+    except Exception as e:
+        print(f"⚠️ Latency sample not saved ({call_type}): {e}")
+
+
+def hedge_delay(call_type: str) -> float | None:
+    """Seconds to wait before hedging call_type (None: not hedged)."""
+    config = current_app.config
+    hedged = {name.strip() for name in (config.get("LLM_HEDGE_CALLS") or "").split(",")}
+    if call_type not in hedged:
+        return None
+    delay_ms = config.get("LLM_HEDGE_DEFAULT_DELAY_MS", 3000)
+    try:
+        samples = sorted(float(v) for v in redis_client.lrange(_latency_key(call_type), 0, -1))
+    except Exception:
+        samples = []
+    if len(samples) >= _MIN_HEDGE_SAMPLES:
+        rank = min(int(len(samples) * config.get("LLM_HEDGE_PERCENTILE", 95) / 100), len(samples) - 1)
+        delay_ms = samples[rank]
+    return max(delay_ms, config.get("LLM_HEDGE_MIN_DELAY_MS", 250)) / 1000
+
+
+def _hedged(call_type: str, fn, timeout: float, hedge_after: float):
+    pool = _hedge_pool()
+    primary = pool.submit(fn, timeout)
+    done, _ = wait([primary], timeout=hedge_after)
+    if done:
+        return primary.result()
+
+    # Give the duplicate what's left of this attempt's timeout
+    hedge = pool.submit(fn, max(timeout - hedge_after, 0.5))
+    print(f"🪞 [LLM] {call_type}: no answer after {hedge_after * 1000:.0f} ms, hedging")
+    fields = {"hedges": 1, f"hedges:{call_type}": 1}
+    pending, error = {primary, hedge}, None
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        fields.update({"hedge_wins": 1, f"hedge_wins:{call_type}": 1})
+                    return future.result()
+                error = future.exception()
+        raise error
+    finally:
+        record_metrics(LLM_CALLS_KEY, **fields)
@@ -2,15 +2,67 @@ from app.extensions import db
 from app.models import Stock
 from app.services.gpt_service import GPTService
 from app.services.scraper.partsouq_xpath_scraper import get_scraper
+from app.services.metrics import STOCK_SEARCH_KEY, record as record_metrics
+from app.services.part_aliases import load_alias_rules
+from app.services.part_numbers import normalize_part_number
+from app.services.stock_index import get_stock_index, lookup_key_filter
+from app.services.supersessions import expand_part_numbers
 from app.session_store import get_session, save_session, set_vin
-from sqlalchemy import func
-import re
+from flask import current_app
+from sqlalchemy import case, func, or_, select
 
 gpt = GPTService()
 
-def normalize_part_number(pn: str) -> str:
-    """Standard normalization for part numbers."""
-    return re.sub(r'[^A-Z0-9]', '', pn.upper()) if pn else ''
+def _part_to_dict(p) -> dict:
+    # Works for Stock entities and StockRow records alike
+    return {
+        "part_number": p.part_number,
+        "brand": p.brand,
+        "name": p.item_desc,
+        "price": float(p.price) if p.price else None,
+        "qty": p.qty,
+        "tag": p.tag or "General"
+    }
+
+def _search_stock_sql(cleaned_pns: set, sibling_limit: int) -> list:
+    """
+    Exact matches plus the top-K siblings of each matched tag, ranked in SQL
+    (in stock first, then cheapest). Matches on the same lookup keys as the
+    stock index, each served by its own ix_stock_*_norm index; siblings by
+    ix_stock_tag_qty_price. Returns plain column tuples, not ORM entities.
+    """
+    matched = (
+        select(Stock.id, Stock.tag)
+        .where(lookup_key_filter(cleaned_pns))
+        .cte("matched")
+    )
+    rank = func.row_number().over(
+        partition_by=Stock.tag,
+        order_by=(
+            case((Stock.qty > 0, 0), else_=1),
+            case((Stock.price.is_(None), 1), else_=0),
+            Stock.price,
+        ),
+    ).label("rn")
+    is_requested = case((Stock.id.in_(select(matched.c.id)), 1), else_=0).label("is_requested")
+    ranked = (
+        select(Stock.id, Stock.part_number, Stock.brand, Stock.item_desc,
+               Stock.price, Stock.qty, Stock.tag, rank, is_requested)
+        .where(or_(
+            Stock.tag.in_(select(matched.c.tag)),
+            Stock.id.in_(select(matched.c.id)),
+        ))
+        .subquery()
+    )
+    stmt = (
+        select(ranked.c.id, ranked.c.part_number, ranked.c.brand, ranked.c.item_desc,
+               ranked.c.price, ranked.c.qty, ranked.c.tag)
+        # The matched rows themselves always come back, whatever their rank
+        .where(or_(ranked.c.rn <= sibling_limit, ranked.c.is_requested == 1))
+        # Exact matches first (as the stock index returns them), then siblings by tag
+        .order_by(ranked.c.is_requested.desc(), ranked.c.tag, ranked.c.rn)
+    )
+    return db.session.execute(stmt).all()
 
 def search_parts_in_db(part_numbers: list) -> list:
     """
@@ -22,64 +74,127 @@ def search_parts_in_db(part_numbers: list) -> list:
 
     # clean inputs
     cleaned_pns = {normalize_part_number(p) for p in part_numbers if p}
+    cleaned_pns.discard('')
     if not cleaned_pns:
         return []
 
-    # Prepare DB query
-    normalized_db_column = func.upper(Stock.part_number)
-    # Strip symbols from DB column for matching
-    # Extended list to match Python's alphanumeric normalization more closely
-    for ch in ['-', ' ', '+', '%', '$', '_', '/', '.', ',', ':', ';', '#', '@', '!', '*',
-                        '(', ')', '?', '&', '=', '<', '>', '~', '`', '|', '^', '"', "'",
-                        '~', '´', '“', '”', '‘', '’', '–', '—', '•', '…', '{', '}', '[', ']']:
-        normalized_db_column = func.replace(normalized_db_column, ch, '')
+    sibling_limit = current_app.config.get("STOCK_SIBLING_LIMIT", 10)
 
-    results = []
-    # 1. Exact Match via Normalization
-    matches = db.session.query(Stock).filter(
-        normalized_db_column.in_(cleaned_pns)
-    ).all()
-
-    # --- SIBLING LOGIC ---
-    # Fetch matched tags to find related/alternative parts
-    if matches:
-        found_tags = {p.tag for p in matches if p.tag}
-        print(f"   🔍 [Debug] Initial Matches: {len(matches)}. Found Tags: {found_tags}")
-        
-        if found_tags:
-            # Query all parts that share these tags
-            siblings = db.session.query(Stock).filter(
-                Stock.tag.in_(found_tags)
-            ).all()
-            
-            print(f"   🔍 [Debug] Siblings Found (Raw): {len(siblings)}")
+    # Superseded / cross-referenced numbers we may stock under another number
+    equivalents = expand_part_numbers(cleaned_pns)
+    if equivalents:
+        print(f"   🔗 [Supersession] {len(equivalents)} equivalent numbers for {len(cleaned_pns)} requested")
+    lookup_pns = cleaned_pns | set(equivalents)
 
-            # Merit: If we found siblings, use them. 
-            # We assume siblings include the original matches if they have the tag.
-            # But let's merge safely.
-            
-            # Create a dict by ID to deduplicate
-            # (matches + siblings) -> unique collection
-            all_parts_map = {p.id: p for p in matches}
-            for s in siblings:
-                all_parts_map[s.id] = s
-            
-            matches = list(all_parts_map.values())
-            print(f"   🔍 [Debug] Total Combined Matches: {len(matches)}")
-
-    # 2. Add results to list (deduplicated by ID or PartNumber+Brand)
-    for p in matches:
-        results.append({
-            "part_number": p.part_number,
-            "brand": p.brand,
-            "name": p.item_desc,
-            "price": float(p.price) if p.price else None,
-            "qty": p.qty,
-            "tag": p.tag or "General"
-        })
-    
+    # 0. In-memory index (worker processes): no DB round trips at all
+    index = get_stock_index()
+    if index is not None:
+        rows = index.search(lookup_pns, sibling_limit)
+    else:
+        # 1. Exact matches + ranked tag siblings in ONE indexed query
+        rows = _search_stock_sql(lookup_pns, sibling_limit)
+        print(f"   🔍 [Debug] Stock rows (matches + top {sibling_limit} siblings/tag): {len(rows)}")
+
+    results = [_part_to_dict(p) for p in rows]
+    if equivalents:
+        for part in results:
+            norm = normalize_part_number(part["part_number"])
+            if norm in equivalents and norm not in cleaned_pns:
+                part["equivalent_of"], part["relation"] = equivalents[norm]
     return results
 
+def _skip_without_index(feature: str, count: int) -> None:
+    """Searches that need the in-process stock index: say so instead of matching nothing quietly."""
+    print(f"⚠️ [{feature}] No stock index in this process (STOCK_INDEX_ENABLED off, build failed, "
+          f"or not the worker); skipping {count} item(s).")
+    record_metrics(STOCK_SEARCH_KEY, **{f"skipped_no_index:{feature}": count})
+
+def _fuzzy_max_distance(part_number: str) -> int:
+    """Edits allowed for a near match: grows with the number's length, capped."""
+    config = current_app.config
+    per_edit = max(config.get("FUZZY_MATCH_CHARS_PER_EDIT", 10), 1)
+    allowed = max(len(normalize_part_number(part_number)) // per_edit, 1)
+    return min(allowed, config.get("FUZZY_MATCH_MAX_DISTANCE", 2))
+
+def search_parts_fuzzy(part_numbers: list) -> tuple[list, dict]:
+    """
+    OCR/typo-tolerant fallback for part numbers with no exact match
+    (O/0, I/1, S/5, B/8 swaps, one dropped or extra character).
+    Returns (matched part dictionaries, {requested pn: matched normalized pn}).
+    Only the near-matched rows themselves come back, each carrying the
+    number the user sent as 'requested_part_number' (a "did you mean"
+    suggestion, not a confirmed match), without tag siblings.
+    Needs the in-memory stock index; without it nothing is matched (logged
+    and counted under STOCK_SEARCH_KEY).
+    """
+    if not part_numbers:
+        return [], {}
+    index = get_stock_index()
+    if index is None:
+        _skip_without_index("fuzzy", len(part_numbers))
+        return [], {}
+
+    results = []
+    corrections = {}
+    for pn in part_numbers:
+        candidates = index.fuzzy.match(pn, max_distance=_fuzzy_max_distance(pn))
+        if not candidates:
+            continue
+        # Only the closest spelling(s); a farther one would just add noise
+        best = candidates[0][1]
+        closest = [c for c, d in candidates if d == best]
+        print(f"   🔎 [Fuzzy] {pn} -> {closest} (distance {best})")
+
+        matches = [_part_to_dict(row) for row in index.lookup(closest)]
+        for part in matches:
+            part["requested_part_number"] = pn
+        results.extend(matches)
+        if matches:
+            corrections[pn] = closest[0]
+
+    return results, corrections
+
+def search_stock_by_name(part_names: list, vin_info: dict | None = None) -> tuple[list, list]:
+    """
+    BM25 search of local stock (item_desc, brand, tag) for part names, with
+    the admin alias rules applied. Returns (matched part dictionaries, names
+    not resolved with enough confidence). With a decoded VIN its make and
+    model are part of the query, so a name only resolves locally to rows
+    for that car; anything else goes on to the VIN catalog.
+    Needs the in-memory stock index; without it every name is reported
+    unresolved (logged and counted under STOCK_SEARCH_KEY).
+    """
+    if not part_names:
+        return [], []
+    index = get_stock_index()
+    if index is None:
+        _skip_without_index("name", len(part_names))
+        return [], list(part_names)
+
+    top_k = current_app.config.get("STOCK_TEXT_TOP_K", 5)
+    min_confidence = current_app.config.get("STOCK_TEXT_MIN_CONFIDENCE", 0.8)
+    rules = load_alias_rules()
+    vehicle = " ".join(filter(None, ((vin_info or {}).get("brand"), (vin_info or {}).get("model"))))
+
+    results = []
+    unresolved = []
+    for name in part_names:
+        hits = index.search_text(name, rules, k=top_k, vehicle=vehicle)
+        confident = [(row, score, cov) for row, score, cov in hits if cov >= min_confidence]
+        best = hits[0][2] if hits else 0.0
+        print(f"   📖 [Local] '{name}'{f' for {vehicle}' if vehicle else ''}: "
+              f"{len(confident)}/{len(hits)} hits, confidence {best:.2f}")
+        if not confident:
+            unresolved.append(name)
+            continue
+        for row, score, cov in confident:
+            part = _part_to_dict(row)
+            part["requested_name"] = name
+            part["match_confidence"] = round(cov, 2)
+            results.append(part)
+
+    return results, unresolved
+
 def search_catalog_by_name(vin: str, part_names: list) -> list:
     """
     Search external catalog (Scraper) using VIN and Part Name.
@@ -134,7 +249,9 @@ def search_catalog_by_name(vin: str, part_names: list) -> list:
                 db_matches = search_parts_in_db(found_oem_numbers)
                 # print(db_matches)
                 if db_matches:
-                    print(f"   ✅ Found {len(db_matches)} matches in Local DB (Stock).")
+                    via = sum(1 for p in db_matches if p.get("equivalent_of"))
+                    print(f"   ✅ Found {len(db_matches)} matches in Local DB (Stock)"
+                          f"{f', {via} via supersession/cross-reference' if via else ''}.")
                     results.extend(db_matches)
                 else:
                     print(f"   ⚠️ Found in Catalog but NOT in Local DB. Adding as 'Out of Stock' reference.")
@@ -158,12 +275,15 @@ def search_catalog_by_name(vin: str, part_names: list) -> list:
     return results
 
 
-def process_user_message(user_id: str, unified_text: str) -> str:
+def process_user_message(user_id: str, unified_text: str, on_partial=None) -> str:
     """
     SINGLE PIPELINE:
     1. Extract Entities (VIN, PNs, Names)
     2. Hard Lookups (VIN Decode, DB Search)
     3. GPT Super Intent
+
+    on_partial: see GPTService.run_super_intent. Returns "" when the reply
+    was already delivered through it.
     """
     session = get_session(user_id)
     print(f"Processing message for {user_id}: {unified_text[:100]}...")
@@ -272,15 +392,25 @@ def process_user_message(user_id: str, unified_text: str) -> str:
         
         # Calculate missing PNs
         found_pns_set = {normalize_part_number(p['part_number']) for p in db_results}
+        # Numbers we hold only under their replacement / cross reference are found too
+        found_pns_set.update(p['equivalent_of'] for p in db_results if p.get('equivalent_of'))
         missing_pns = [pn for pn in part_numbers if normalize_part_number(pn) not in found_pns_set]
+
+        # 1b. No exact hit -> suggest OCR/typo-tolerant near matches.
+        # The numbers stay missing: a near match is a "did you mean", not the part asked for.
+        if missing_pns:
+            fuzzy_results, _ = search_parts_fuzzy(missing_pns)
+            parts_found.extend(fuzzy_results)
         
-    # 2. Search by Name (If VIN exists)
-    if current_vin and item_descriptions and not parts_found:
-        # Only search catalog if we didn't match via explicit Part Number? 
-        # Or always? Requirement: "If item_descriptions exist -> search catalog".
-        # We'll search and append.
-        catalog_matches = search_catalog_by_name(current_vin, item_descriptions)
-        parts_found.extend(catalog_matches)
+    # 2. Search by Name: our own stock first (milliseconds; with a VIN, only rows for that car)
+    if item_descriptions and not parts_found:
+        local_matches, unresolved_names = search_stock_by_name(item_descriptions, vin_info)
+        parts_found.extend(local_matches)
+
+        # 3. Catalog scrape (If VIN exists) only for names we are unsure about
+        if current_vin and unresolved_names:
+            catalog_matches = search_catalog_by_name(current_vin, unresolved_names)
+            parts_found.extend(catalog_matches)
 
     # --- STEP 3: CONTEXT PREPARATION ---
     context_data = {
@@ -293,7 +423,7 @@ def process_user_message(user_id: str, unified_text: str) -> str:
 
     # --- STEP 4: INTENT ROUTING ---
     # Standard Super Intent
-    gpt_result = gpt.run_super_intent(unified_text, context_data)
+    gpt_result = gpt.run_super_intent(unified_text, context_data, on_partial=on_partial)
     
     whatsapp_reply = gpt_result.get("whatsapp_text", "...")
     payload = gpt_result.get("machine_payload", {})
@@ -310,5 +440,7 @@ def process_user_message(user_id: str, unified_text: str) -> str:
     # Save Lead (Unified for all)
     # lead_service.create_lead(...) - Skipping for brevity unless required by original file logic
     # The original file had lead creation. We should probably keep it if possible.
-    
+
+    if gpt_result.get("streamed"):
+        return ""  # already sent block by block
     return whatsapp_reply
\ No newline at end of file
@@ -0,0 +1,40 @@
+"""
+Process-independent counters for the admin /metrics endpoint.
+
+GPTService's class-level metrics only see the process they live in, and
+the RQ worker forks a fresh work horse per job, so anything measured in a
+job is kept in Redis hashes instead. Recording never raises.
+"""
+
+from ..redis_client import redis_client
+
+EXTRACTION_KEY = "metrics:extraction"
+STOCK_SEARCH_KEY = "metrics:stock_search"
+
+
+def record(key: str, **fields) -> None:
+    """Increment several fields of one hash in a single round trip."""
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for field, amount in fields.items():
+            if isinstance(amount, float):
+                pipe.hincrbyfloat(key, field, amount)
+            else:
+                pipe.hincrby(key, field, amount)
+        pipe.execute()
+    except Exception as e:
+        print(f"⚠️ Metrics update failed ({key}): {e}")
+
+
+def read(key: str) -> dict:
+    try:
+        raw = redis_client.hgetall(key)
+    except Exception as e:
+        print(f"⚠️ Metrics read failed ({key}): {e}")
+        return {}
+    out = {}
+    for field, value in raw.items():
+        field = field.decode() if isinstance(field, bytes) else field
+        value = value.decode() if isinstance(value, bytes) else value
+        out[field] = float(value) if "." in value else int(value)
+    return out
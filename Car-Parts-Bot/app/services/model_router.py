@@ -0,0 +1,144 @@
+"""
+Complexity-based model choice for the super-intent call.
+
+Greetings and simple one-part quotes don't need gpt-4o. route_super_intent()
+scores the turn from local signals (parts found, reference material,
+language, message length, part numbers we couldn't find) and picks the
+cheap tier at or below MODEL_ROUTER_THRESHOLD. validate_super_intent()
+checks the cheap model's answer (JSON shape, payload, and that it actually
+mentions the numbers it had to); on failure run_super_intent escalates the
+turn to the full model.
+
+Each turn's tier, latency, tokens and list-price cost are recorded under
+MODEL_ROUTER_KEY for tuning the threshold.
+"""
+
+import json
+from dataclasses import dataclass
+
+from flask import current_app
+
+from .metrics import record as record_metrics
+from .part_numbers import normalize_part_number
+from .reply_formatter import listable_parts
+from .token_budget import count_tokens
+
+MODEL_ROUTER_KEY = "metrics:model_router"
+
+ACTIONS = {"quote", "ask_clarify", "info_only", "escalate"}
+
+# USD per 1M tokens: (input, cached input, output)
+PRICES = {
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+}
+
+
+@dataclass(frozen=True)
+class Route:
+    model: str
+    tier: str  # "mini" | "full"
+    score: int
+    reasons: tuple = ()
+
+
+def full_route(score: int = 0, reasons: tuple = ()) -> Route:
+    return Route(current_app.config.get("SUPER_INTENT_MODEL", "gpt-4o"), "full", score, reasons)
+
+
+def route_super_intent(user_text: str, context_data: dict, detected_lang: str, has_reference: bool) -> Route:
+    """Score the turn; cheap model at or below MODEL_ROUTER_THRESHOLD."""
+    parts = listable_parts(context_data.get("parts_found"))
+    signals = []
+
+    if len(parts) > 3:
+        signals.append(("parts>3", 4))
+    elif len(parts) > 1:
+        signals.append(("parts>1", 2))
+    elif parts:
+        signals.append(("parts=1", 1))
+    if has_reference:
+        signals.append(("reference", 3))  # has to follow the manual closely
+    if detected_lang != "en":
+        signals.append((f"lang={detected_lang}", 2))
+    tokens = count_tokens(user_text)
+    if tokens > 200:
+        signals.append(("long", 2))
+    elif tokens > 60:
+        signals.append(("medium", 1))
+    if context_data.get("missing_pns"):
+        signals.append(("missing_pns", 1))
+    if any(p.get("equivalent_of") for p in parts):
+        signals.append(("equivalents", 1))
+    if any(p.get("requested_part_number") for p in parts):
+        signals.append(("near_matches", 1))
+
+    score = sum(weight for _, weight in signals)
+    reasons = tuple(name for name, _ in signals)
+    if not current_app.config.get("MODEL_ROUTER_ENABLED", True) \
+            or score > current_app.config.get("MODEL_ROUTER_THRESHOLD", 2):
+        return full_route(score, reasons)
+    return Route(current_app.config.get("SUPER_INTENT_MINI_MODEL", "gpt-4o-mini"), "mini", score, reasons)
+
+
+# ================= VALIDATION =================
+
+def _mentions(text: str, number: str) -> bool:
+    return normalize_part_number(number) in normalize_part_number(text)
+
+
+def validate_super_intent(raw: str, context_data: dict) -> tuple:
+    """(parsed result or None, problem or None)."""
+    try:
+        result = json.loads(raw or "")
+    except ValueError:
+        return None, "invalid JSON"
+    if not isinstance(result, dict):
+        return None, "not a JSON object"
+
+    text = result.get("whatsapp_text")
+    payload = result.get("machine_payload")
+    if not isinstance(text, str) or not text.strip():
+        return result, "empty whatsapp_text"
+    if not isinstance(payload, dict) or payload.get("action") not in ACTIONS:
+        return result, "bad machine_payload"
+
+    parts = listable_parts(context_data.get("parts_found"))
+    if parts and not any(_mentions(text, p["part_number"]) or
+                         (p.get("name") and p["name"].lower() in text.lower()) for p in parts):
+        return result, "found parts not mentioned"
+    missing = [pn for pn in context_data.get("missing_pns") or [] if not _mentions(text, pn)]
+    if missing:
+        return result, f"missing part numbers not mentioned: {', '.join(missing)}"
+    return result, None
+
+
+# ================= ACCOUNTING =================
+
+def cost_usd(model: str, usage) -> float:
+    if usage is None:
+        return 0.0
+    price_in, price_cached, price_out = PRICES.get(model, PRICES["gpt-4o"])
+    cached = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None) or 0
+    fresh = (usage.prompt_tokens or 0) - cached
+    return (fresh * price_in + cached * price_cached + (usage.completion_tokens or 0) * price_out) / 1e6
+
+
+def record_turn(route: Route, calls: list, elapsed_ms: float, problem: str | None = None) -> None:
+    """
+    One routed turn. calls: [(model, usage), ...] in order; more than one
+    means the cheap answer failed validation and the turn was escalated.
+    """
+    escalated = len(calls) > 1
+    tier = "escalated" if escalated else route.tier
+    cost = sum(cost_usd(model, usage) for model, usage in calls)
+    # What the final answer's tokens would have cost on the full model alone
+    full_cost = cost_usd(current_app.config.get("SUPER_INTENT_MODEL", "gpt-4o"), calls[-1][1])
+    print(f"🧭 [Router] score={route.score} ({', '.join(route.reasons) or 'simple'}) -> {tier}/{calls[-1][0]} "
+          f"{elapsed_ms:.0f} ms, ${cost:.5f}" + (f" [escalated: {problem}]" if escalated else ""))
+    record_metrics(
+        MODEL_ROUTER_KEY,
+        **{f"turns:{tier}": 1, f"ms_total:{tier}": round(elapsed_ms, 1),
+           f"cost_usd_total:{tier}": float(round(cost, 6)),
+           f"full_cost_usd_total:{tier}": float(round(full_cost, 6))},
+    )
@@ -0,0 +1,189 @@
+"""
+One OpenAI client per process, over one tuned, keep-alive httpx pool.
+
+GPTService, whisper_service and vin_ocr used to build their own clients
+(vin_ocr a new one per image), so every service paid its own DNS + TLS
+handshakes and nothing was reused. They all call get_openai_client() now.
+
+- Sync and async clients: get_openai_client() / get_async_openai_client().
+  httpx keeps separate pools for sync and async transports; both use the
+  same limits and timeouts. The async client is per event loop.
+- Fork safety: clients are keyed by pid. A forked RQ work horse never
+  touches the parent's sockets (two processes writing one TLS stream
+  corrupts it); it builds its own pool on first use.
+- prewarm_openai(): opens pool connections ahead of the first call. The
+  RQ worker forks per job, so this runs at the start of each job, in the
+  background, while the batch collector waits for more messages.
+- Every request's latency (to response headers) and OpenAI's own
+  processing time are recorded per endpoint under OPENAI_HTTP_KEY.
+- LLM_BASE_URL points every client at another OpenAI-compatible server,
+  e.g. scripts/llm_standin.py; no real API key is needed then.
+"""
+
+import asyncio
+import os
+import threading
+import time
+import weakref
+
+import httpx
+from flask import current_app
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+
+from .metrics import record as record_metrics
+
+OPENAI_HTTP_KEY = "metrics:openai_http"
+
+_lock = threading.Lock()
+_pid = None
+_client = None
+_async_clients = weakref.WeakKeyDictionary()  # event loop -> AsyncOpenAI
+
+
+def _endpoint(request) -> str:
+    path = request.url.path
+    return path[4:] if path.startswith("/v1/") else path.lstrip("/")
+
+
+def _record(response, elapsed_ms: float) -> None:
+    endpoint = _endpoint(response.request)
+    fields = {f"calls:{endpoint}": 1, f"ms_total:{endpoint}": round(elapsed_ms, 1)}
+    processing = response.headers.get("openai-processing-ms")
+    if processing and processing.isdigit():
+        fields[f"processing_ms_total:{endpoint}"] = int(processing)
+    if response.status_code >= 400:
+        fields[f"errors:{endpoint}"] = 1
+    record_metrics(OPENAI_HTTP_KEY, **fields)
+
+
+def _on_request(request):
+    request.extensions["started"] = time.perf_counter()
+
+
+def _on_response(response):
+    started = response.request.extensions.get("started")
+    if started is not None:
+        _record(response, (time.perf_counter() - started) * 1000)
+
+
+async def _on_request_async(request):
+    _on_request(request)
+
+
+async def _on_response_async(response):
+    _on_response(response)
+
+
+def _pool_options(config) -> dict:
+    return {
+        "limits": httpx.Limits(
+            max_connections=config.get("OPENAI_MAX_CONNECTIONS", 20),
+            max_keepalive_connections=config.get("OPENAI_KEEPALIVE_CONNECTIONS", 10),
+            keepalive_expiry=config.get("OPENAI_KEEPALIVE_SECONDS", 120),
+        ),
+        "timeout": httpx.Timeout(
+            config.get("OPENAI_TIMEOUT_SECONDS", 180), connect=config.get("OPENAI_CONNECT_TIMEOUT_SECONDS", 5)
+        ),
+    }
+
+
+def _client_options(config) -> dict:
+    base_url = config.get("LLM_BASE_URL")
+    return {
+        "api_key": config.get("OPENAI_API_KEY") or ("stand-in" if base_url else None),
+        "base_url": base_url,
+        "max_retries": config.get("OPENAI_MAX_RETRIES", 2),
+    }
+
+
+def _check_pid() -> None:
+    """After a fork, forget (never close) the parent's clients."""
+    global _pid, _client, _async_clients
+    if _pid != os.getpid():
+        _pid = os.getpid()
+        _client = None
+        _async_clients = weakref.WeakKeyDictionary()
+
+
+def get_openai_client() -> OpenAI | None:
+    """The process-wide sync client (None without OPENAI_API_KEY or LLM_BASE_URL)."""
+    global _client
+    with _lock:
+        _check_pid()
+        if _client is None:
+            config = current_app.config
+            options = _client_options(config)
+            if not options["api_key"]:
+                return None
+            _client = OpenAI(
+                **options,
+                http_client=DefaultHttpxClient(
+                    **_pool_options(config),
+                    event_hooks={"request": [_on_request], "response": [_on_response]},
+                ),
+            )
+        return _client
+
+
+def get_async_openai_client() -> AsyncOpenAI | None:
+    """The async client for the running event loop (one pool per loop)."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        _check_pid()
+        client = _async_clients.get(loop)
+        if client is None:
+            config = current_app.config
+            options = _client_options(config)
+            if not options["api_key"]:
+                return None
+            client = AsyncOpenAI(
+                **options,
+                http_client=DefaultAsyncHttpxClient(
+                    **_pool_options(config),
+                    event_hooks={"request": [_on_request_async], "response": [_on_response_async]},
+                ),
+            )
+            _async_clients[loop] = client
+        return client
+
+
+# ================= PRE-WARMING =================
+
+def prewarm_openai(connections: int | None = None, background: bool = True):
+    """
+    Open `connections` pooled connections (DNS + TCP + TLS) with cheap
+    GET /models calls, so the first real call skips the handshakes.
+    Never raises.
+    """
+    app = current_app._get_current_object()
+    if connections is None:
+        connections = app.config.get("OPENAI_PREWARM_CONNECTIONS", 2)
+    if connections <= 0:
+        return None
+
+    def warm():
+        with app.app_context():
+            client = get_openai_client()
+            if client is None:
+                return
+            t0 = time.perf_counter()
+            threads = [threading.Thread(target=_touch, args=(client,)) for _ in range(connections)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            print(f"🔥 OpenAI pool warmed: {connections} connections in {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    if not background:
+        warm()
+        return None
+    thread = threading.Thread(target=warm, name="openai-prewarm", daemon=True)
+    thread.start()
+    return thread
+
+
+def _touch(client) -> None:
+    try:
+        client.with_options(max_retries=0, timeout=10).models.list()
+    except Exception as e:
+        print(f"⚠️ OpenAI pre-warm request failed: {e}")
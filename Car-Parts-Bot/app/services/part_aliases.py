@@ -0,0 +1,311 @@
+"""
+Part-name alias rules authored by admins in IntentPrompt.parts_alias_text.
+
+Accepted rule lines (one per line, blank lines and '#' comments ignored):
+
+    bonnet -> hood
+    boot, dickey => trunk
+    engine lid = hood
+
+The rules of the active super_intent prompt are compiled whenever that
+prompt is saved, toggled or deleted (see publish_active_alias_rules)
+into an AliasNormalizer: a token trie for
+longest-match, multi-word substitution, plus compound splitting/joining
+("waterpump" -> "water pump") and removal of generic words ("price",
+"genuine"). Workers load the compiled rules from Redis by version, so a
+save takes effect everywhere without a restart.
+"""
+
+import hashlib
+import json
+import re
+import time
+
+from ..redis_client import redis_client
+from .bm25 import stem, tokenize, words
+
+ALIAS_RULES_KEY = "part_aliases:compiled"
+_RECHECK_SECONDS = 10
+
+# Words that never name a part; dropped from normalized names
+GENERIC_WORDS = frozenset(stem(w) for w in """
+    price prices cost rate quote genuine original oem new used brand spare spares
+    part parts item please pls plz kindly need want available availability urgent
+    the a an for my of and
+""".split())
+
+# Base part vocabulary; rule words and the live stock-text vocabulary are added
+PART_VOCABULARY = frozenset(stem(w) for w in """
+    water pump oil filter air fuel cabin pollen brake pad disc disk rotor caliper shoe drum
+    clutch flywheel gearbox transmission engine mount mounting radiator hose pipe thermostat
+    fan belt timing chain tensioner pulley idler alternator starter battery spark plug glow
+    coil ignition injector sensor oxygen lambda abs wheel bearing hub shock absorber strut
+    spring control arm bush bushing ball joint tie rod end rack steering power wiper blade
+    motor washer mirror side door handle lock window regulator glass windscreen windshield
+    headlight headlamp tail light lamp fog indicator bulb bumper grille hood bonnet trunk boot
+    tailgate fender wing panel seal gasket head cover valve exhaust muffler silencer
+    catalytic converter manifold turbo turbocharger intake throttle body egr compressor
+    condenser evaporator ac cooling coolant expansion tank cap axle cv driveshaft propeller
+    shaft differential front rear left right upper lower inner outer kit set assembly
+    bolt nut screw clip bracket
+    stabilizer stabiliser anti roll bar link sway housing module unit switch relay fuse
+    cable wire harness key remote horn seat belt airbag dashboard cluster camera parking
+""".split())
+
+_RULE_SPLIT = re.compile(r"\s*(?:->|=>|→|=)\s*")
+
+
+def _iter_rule_lines(text: str):
+    """(alias text, replacement text) for each rule line, one per alias."""
+    for line in (text or "").splitlines():
+        line = line.strip().lstrip("-*•").strip()
+        if not line or line.startswith("#"):
+            continue
+        parts = _RULE_SPLIT.split(line, maxsplit=1)
+        if len(parts) != 2:
+            continue
+        left, right = parts
+        for alias in left.split(","):
+            yield alias.strip(), right.strip()
+
+
+def parse_alias_rules(text: str) -> dict:
+    """
+    Parse alias text into {alias token tuple: replacement token tuple}.
+    Lines that do not look like rules are skipped.
+    """
+    return _rules_from_pairs(_iter_rule_lines(text))
+
+
+def _rules_from_pairs(pairs) -> dict:
+    rules = {}
+    for alias, replacement in pairs:
+        target = tuple(tokenize(replacement))
+        source = tuple(tokenize(alias))
+        if target and source and source != target:
+            rules[source] = target
+    return rules
+
+
+# ================= COMPILED NORMALIZER =================
+
+class _Vocabulary:
+    """Membership over the base vocabulary plus rule and stock words, without copying them."""
+
+    def __init__(self, *extra):
+        self.sets = (PART_VOCABULARY,) + extra
+
+    def __contains__(self, token) -> bool:
+        return any(token in s for s in self.sets)
+
+
+class AliasNormalizer:
+    """
+    Local replacement for the gpt-4o-mini normalization call. Built from
+    (alias, replacement) text pairs; matching is on plural-folded tokens,
+    output keeps the replacement's own wording.
+    """
+
+    def __init__(self, pairs, version: str = ""):
+        self.version = version
+        self.pairs = [(a, r) for a, r in pairs]
+        self.rules = _rules_from_pairs(self.pairs)  # for BM25 query expansion
+        self.trie = {}  # stem -> {..., None: replacement words}
+        vocab = set()
+        for alias, replacement in self.pairs:
+            source = tuple(stem(w) for w in words(alias))
+            target_words = words(replacement)
+            target = tuple(stem(w) for w in target_words)
+            if not source or not target or source == target:
+                continue
+            node = self.trie
+            for token in source:
+                node = node.setdefault(token, {})
+            node[None] = target_words
+            vocab.update(source)
+            vocab.update(target)
+        self.rule_vocabulary = frozenset(vocab)
+
+    def __len__(self) -> int:
+        return len(self.pairs)
+
+    # ----- compound words -----
+
+    @staticmethod
+    def _split(word: str, vocab) -> list:
+        for i in range(3, len(word) - 2):
+            left, right = word[:i], word[i:]
+            if stem(left) in vocab and stem(right) in vocab:
+                return [left, right]
+        return [word]
+
+    def _fix_spacing(self, tokens: list, vocab) -> list:
+        out = []
+        for word in tokens:
+            root = stem(word)
+            if len(word) >= 6 and root not in vocab and root not in self.trie:
+                out.extend(self._split(word, vocab))
+            else:
+                out.append(word)
+        # "fly wheel" -> "flywheel" when only the joined form is a known word
+        joined = []
+        i = 0
+        while i < len(out):
+            if i + 1 < len(out):
+                a, b = out[i], out[i + 1]
+                if (stem(a + b) in vocab and a not in self.trie
+                        and (stem(a) not in vocab or stem(b) not in vocab)):
+                    joined.append(a + b)
+                    i += 2
+                    continue
+            joined.append(out[i])
+            i += 1
+        return joined
+
+    # ----- public -----
+
+    def normalize(self, name: str, vocabulary=frozenset()) -> tuple:
+        """
+        (normalized name, resolved). Resolved means every word left is a
+        known part word or came from a rule; unresolved names are the ones
+        worth asking the LLM about. A name of only generic words normalizes
+        to "".
+        """
+        vocab = _Vocabulary(self.rule_vocabulary, vocabulary)
+        tokens = self._fix_spacing(words(name), vocab)
+
+        out = []
+        resolved = True
+        i = 0
+        while i < len(tokens):
+            node, match, end = self.trie, None, i
+            j = i
+            while j < len(tokens) and stem(tokens[j]) in node:
+                node = node[stem(tokens[j])]
+                j += 1
+                if None in node:
+                    match, end = node[None], j
+            if match is not None:
+                out.extend(match)
+                i = end
+                continue
+            word = tokens[i]
+            root = stem(word)
+            if root not in GENERIC_WORDS:
+                out.append(word)
+                if root not in vocab and not any(c.isdigit() for c in word):
+                    resolved = False
+            i += 1
+        return " ".join(out), resolved
+
+    def normalize_all(self, names: list, vocabulary=frozenset()) -> tuple:
+        """([normalized or None if unresolved, ...], [unresolved name, ...])"""
+        result, unresolved = [], []
+        for name in names:
+            text, ok = self.normalize(name, vocabulary)
+            if ok:
+                result.append(text)
+            else:
+                result.append(None)
+                unresolved.append(name)
+        return result, unresolved
+
+
+def compile_alias_rules(text: str) -> dict:
+    """Compiled form stored in Redis: {"version", "pairs", "rejected"}."""
+    pairs = list(_iter_rule_lines(text))
+    rejected = [
+        line.strip() for line in (text or "").splitlines()
+        if line.strip() and not line.strip().startswith("#")
+        and not _RULE_SPLIT.search(line)
+    ]
+    return {
+        "version": hashlib.blake2b((text or "").encode(), digest_size=8).hexdigest(),
+        "pairs": pairs,
+        "rejected": rejected,
+    }
+
+
+def publish_alias_rules(text: str) -> dict:
+    """Compile at save time and publish to every worker. Returns the compiled summary."""
+    compiled = compile_alias_rules(text)
+    try:
+        redis_client.set(ALIAS_RULES_KEY, json.dumps(compiled))
+    except Exception as e:
+        print(f"⚠️ Alias rules publish failed (workers will compile from DB): {e}")
+    global _normalizer
+    _normalizer = AliasNormalizer(compiled["pairs"], compiled["version"])
+    return compiled
+
+
+def publish_active_alias_rules() -> dict:
+    """
+    Publish the rules of the active super_intent prompt (no rules when it is
+    switched off or deleted). Call after any change to that prompt.
+    """
+    from ..models import IntentPrompt
+
+    row = IntentPrompt.query.filter_by(intent_key="super_intent", is_active=True).first()
+    return publish_alias_rules(row.parts_alias_text if row else "")
+
+
+_normalizer: AliasNormalizer | None = None
+_last_checked = 0.0
+
+
+def get_alias_normalizer() -> AliasNormalizer:
+    """Current compiled rules: Redis first (rechecked every few seconds), then the DB."""
+    global _normalizer, _last_checked
+    now = time.monotonic()
+    if _normalizer is not None and now - _last_checked < _RECHECK_SECONDS:
+        return _normalizer
+    _last_checked = now
+
+    try:
+        raw = redis_client.get(ALIAS_RULES_KEY)
+    except Exception:
+        raw = None
+    if raw:
+        compiled = json.loads(raw)
+        if _normalizer is None or _normalizer.version != compiled["version"]:
+            _normalizer = AliasNormalizer(compiled["pairs"], compiled["version"])
+        return _normalizer
+
+    # Nothing published yet (first run after deploy): compile from the prompt
+    try:
+        publish_active_alias_rules()
+    except Exception:
+        return _normalizer or AliasNormalizer([])
+    return _normalizer
+
+
+def load_alias_rules() -> dict:
+    """Rules from the super_intent prompt; empty if unavailable."""
+    return get_alias_normalizer().rules
+
+
+def expand_query(text: str, rules: dict) -> list:
+    """
+    Tokenize a part-name query into BM25 positions (sets of alternatives),
+    applying the longest matching alias at each point. A one-word alias keeps
+    the original word as an alternative, since stock text may use either.
+    """
+    tokens = tokenize(text)
+    max_len = max((len(k) for k in rules), default=0)
+    positions = []
+    i = 0
+    while i < len(tokens):
+        for size in range(min(max_len, len(tokens) - i), 0, -1):
+            source = tuple(tokens[i:i + size])
+            target = rules.get(source)
+            if target:
+                if size == 1 and len(target) == 1:
+                    positions.append({source[0], target[0]})
+                else:
+                    positions.extend({t} for t in target)
+                i += size
+                break
+        else:
+            positions.append({tokens[i]})
+            i += 1
+    return positions
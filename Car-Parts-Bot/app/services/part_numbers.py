@@ -0,0 +1,30 @@
+"""
+Part number normalization helpers.
+
+Kept free of Flask/DB imports so models, migrations-time scripts and
+services can all share the exact same rules.
+"""
+
+import re
+
+_NON_ALNUM = re.compile(r'[^A-Z0-9]')
+
+
+def normalize_part_number(pn: str) -> str:
+    """Standard normalization for part numbers."""
+    return _NON_ALNUM.sub('', pn.upper()) if pn else ''
+
+_NON_ALNUM_OR_NL = re.compile(r'[^A-Z0-9\n]')
+
+
+def normalize_part_numbers(values) -> list:
+    """
+    Batch form of normalize_part_number for bulk imports: one upper() and
+    one regex pass over the joined batch instead of one per value.
+    """
+    values = [v or '' for v in values]
+    out = _NON_ALNUM_OR_NL.sub('', '\n'.join(values).upper()).split('\n')
+    if len(out) != len(values):
+        # A value contained a newline; fall back to the per-value rule
+        return [normalize_part_number(v) for v in values]
+    return out
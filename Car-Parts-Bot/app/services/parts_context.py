@@ -0,0 +1,103 @@
+"""
+Compact tabular encoding of parts_found for the super-intent prompt.
+
+parts_json() repeats every key on every row, and a matched tag brings up to
+STOCK_SIBLING_LIMIT near-identical siblings (same tag, usually the same
+name and brand). encode_parts() writes the same data as:
+
+    3 parts in 1 group. Each group: its shared fields, then a header row and one row per part ("-" = none).
+    [group 1] tag: Brake Pads Front F10 | brand: BMW | name: Brake pad set
+    part_number | price | qty
+    34116858652 | 450.0 | 3
+    ...
+
+- parts are grouped by tag, in first-seen order (exact matches first);
+- a row repeated exactly (the same stock row found for two requested
+  numbers) is listed once; rows that share a part number and brand but
+  differ in anything else (price, qty, ...) are all kept;
+- a field with one value across a whole group moves into the group line;
+- "|" and line breaks inside values are replaced, so every row splits
+  into exactly as many cells as its header.
+
+Field names are the parts_json keys, so the fixed rules that mention them
+(e.g. 'equivalent_of') still apply.
+"""
+
+from .token_budget import compact_parts, count_tokens
+
+# Column order; anything else follows alphabetically
+_COLUMNS = ("part_number", "name", "brand", "price", "qty", "equivalent_of", "relation",
+            "requested_part_number", "status", "message")
+_NONE = "-"
+
+
+def unique_parts(parts: list) -> list:
+    """compact_parts without exact repeats (first occurrence kept, order unchanged)."""
+    seen = set()
+    out = []
+    for part in compact_parts(parts):
+        key = tuple(sorted((k, _cell(v)) for k, v in part.items()))
+        if key in seen:
+            continue
+        seen.add(key)
+        out.append(part)
+    return out
+
+
+def _cell(value) -> str:
+    if value is None:
+        return _NONE
+    text = " ".join(str(value).split()).replace("|", "/")
+    return text or _NONE
+
+
+def _columns(rows: list) -> list:
+    keys = {k for row in rows for k in row}
+    return [k for k in _COLUMNS if k in keys] + sorted(keys - set(_COLUMNS))
+
+
+def _group(number: int, tag, rows: list) -> list:
+    columns = [k for k in _columns(rows) if k != "tag"]
+    shared = []
+    if len(rows) > 1:
+        shared = [k for k in columns if k != "part_number"
+                  and len({_cell(row.get(k)) for row in rows}) == 1]
+    header = [f"tag: {_cell(tag)}"] + [f"{k}: {_cell(rows[0].get(k))}" for k in shared]
+    columns = [k for k in columns if k not in shared]
+    lines = [f"[group {number}] " + " | ".join(header)]
+    if columns:
+        lines.append(" | ".join(columns))
+        lines += [" | ".join(_cell(row.get(k)) for k in columns) for row in rows]
+    return lines
+
+
+def _table(parts: list, omitted: list = ()) -> str:
+    groups = {}
+    for part in parts:
+        groups.setdefault(part.get("tag"), []).append(part)
+    lines = [f"{len(parts)} parts in {len(groups)} group{'s' if len(groups) != 1 else ''}. Each group: its shared "
+             f"fields, then a header row and one row per part (\"{_NONE}\" = none)."]
+    for number, (tag, rows) in enumerate(groups.items(), 1):
+        lines += _group(number, tag, rows)
+    if omitted:
+        numbers = [p.get("part_number") for p in omitted if p.get("part_number")]
+        lines.append(f"[not shown] {len(omitted)} more parts: {', '.join(map(str, numbers[:20])) or _NONE}")
+    return "\n".join(lines)
+
+
+def encode_parts(parts: list, max_tokens: int | None = None) -> str:
+    """
+    The table for the prompt. Over max_tokens, keeps the first parts (exact
+    matches come first) and lists the rest by part number only.
+    """
+    parts = unique_parts(parts)
+    if not parts:
+        return "None"
+    text = _table(parts)
+    if max_tokens is None or count_tokens(text) <= max_tokens:
+        return text
+    for keep in range(len(parts) - 1, -1, -1):
+        text = _table(parts[:keep], parts[keep:])
+        if count_tokens(text) <= max_tokens:
+            return text
+    return text
@@ -0,0 +1,198 @@
+"""
+Super-intent prompt layout, ordered for provider-side prefix caching.
+
+OpenAI caches the longest previously-seen prompt prefix (from 1024 tokens
+on), so everything that does not change between turns comes first and is
+byte-identical every time:
+
+    system #1  base prompt [+ whole reference, when retrieval is off]
+               + every fixed rule, each under an id + output format
+    system #2  this turn: retrieved reference chunks, language, VIN,
+               matched parts, missing numbers, ACTIVE RULES: ids
+    user       the message
+
+Rules that used to be appended only when they applied (with counts and
+numbers baked in) are always present in system #1 and switched on per
+turn by id; the values they need live in the turn context.
+
+Matched parts go in as the compact table of parts_context.encode_parts
+(PARTS_CONTEXT_FORMAT="table") or as JSON ("json").
+"""
+
+from flask import current_app
+
+from .parts_context import encode_parts, unique_parts
+from .prompt_cache import REFERENCE_HEADER
+from .token_budget import Section, fit_sections, parts_json
+
+FALLBACK_BASE_PROMPT = """
+                ROLE:
+                You are an advanced AI assistant for a WhatsApp-based Car Parts bot.
+                Your goal is to help users find car parts accurately and professionally.
+                BEHAVIOR:
+                - Act like a human sales agent.
+                - Use provided "Hard Business Data". DO NOT GUESS.
+                - Professional, concise tone.
+                """
+
+FIXED_RULES = """
+=== FIXED RULES ===
+The TURN CONTEXT at the end lists the ACTIVE RULES for this message. Apply every active rule and ignore the others.
+
+[REFERENCE] CRITICAL INSTRUCTION (OVERRIDE ALL PRIOR KNOWLEDGE):
+1. You are given a section called 'REFERENCE MATERIAL'.
+2. You MUST IGNORE your internal training data about car parts or warning lights.
+3. COMPARE the User's Input (visual description or text) with the descriptions in the 'REFERENCE MATERIAL'.
+4. If the User's description is about a warning light, use the reference material to determine the meaning.
+5. Do NOT say "it looks like X but usually means Y". Say EXACTLY what the Reference says it is.
+6. EXCEPTION: If the user is asking for a CAR PART (e.g. Brake Pads, Filter) AND there are item(s) in the 'Matched Parts (DB)' list provided in the Context, you MUST IGNORE the Reference Material and output the parts found.
+7. Only say "Not found in reference" if the user is asking a specific question that should be in the reference but isn't there, and NO parts were found in the DB.
+YOU MUST ANSWER ONLY USING THE REFERENCE MATERIAL for any questions about warning lights or symbols. If the answer is not in the material, say 'Information not found in reference'.
+
+[CATALOG_ERROR] CRITICAL: The catalog search FAILED. You MUST reply exactly: 'Failed to search catalog due to technical error.' (plus any helpful context). Do not say 'I couldn't find it', say 'Failed to Catalog'.
+
+[CATALOG_NOT_IN_STOCK] CRITICAL: Parts were found in the catalog but are NOT in the local database. You MUST reply: 'Found in Catalog but Not in Stock'. List the part numbers found but clearly state they are out of stock.
+
+[CATALOG_EMPTY] CRITICAL: The catalog search returned NO results. You MUST reply: 'Not in Catalog'. Do not offer to search again.
+
+[PARTS_FOUND] CRITICAL: The parts in 'Matched Parts (DB)' have been found in the database matching the user's request. You MUST present these parts (Product Name, Brand, Price, Availability). You SHOULD briefly acknowledge the user's specific issue (e.g. 'I see the door handle is broken') derived from the input before listing the parts.
+
+[EQUIVALENTS] CRITICAL: Some parts were matched through a supersession or cross-reference: their 'equivalent_of' field is the number the user asked for. For those, tell the user that number is replaced by (supersession) or equivalent to (cross_reference) the listed Part Number, and present them as available options.
+
+[DID_YOU_MEAN] CRITICAL: Some parts have a 'requested_part_number': the user's number was NOT found, and these are the closest numbers we stock (a likely typo or misread). Do NOT present them as the part asked for. For each one ask: 'Did you mean [Part Number] for [requested_part_number]?' and show its details. The user's number also stays under 'Missing Part Numbers'.
+
+[ALL_PARTS] CRITICAL: Several parts were found in the database. The user might have asked for a specific part number, BUT you MUST also show the other related parts (Siblings/Alternatives) found in the database. DO NOT FILTER the list. You are a salesman offering OPTIONS. You MUST output the details for ALL parts in 'Matched Parts (DB)'. List them all.
+
+[LANGUAGE] CRITICAL: The user is speaking the language code given as 'User Language'. You MUST reply ENTIRELY in that language, except for Technical Terms (Part Names/Numbers) which can remain in English. Do NOT mix languages unnecessarily.
+
+[PART_NUMBER_FOUND] CRITICAL: The user searched by PART NUMBER.
+1. You MUST start the response with: "Thank you for providing the part number . Here are the available options for this part:"
+2. You MUST format the output for found parts EXACTLY as follows for each item (Use a Numbered List):
+
+[Number]. *[Part Name]*
+   - Brand: [Insert Actual Brand Name]
+   - Price: [Insert Actual Price]
+   - Part Number: [Insert Actual Part Number]
+   - Availability: [Insert In Stock / Out of Stock]
+
+IMPORTANT: Replace the terms in brackets [] with the REAL data from the found parts context. Do NOT use the text "Brand Name" or "Price" literally.
+MANDATORY: You MUST include the 'Part Number' line for EVERY item.
+Do not summarize. Show this block for EVERY matching part found.
+3. FOR MISSING PARTS: for each number under 'Missing Part Numbers' you MUST add this exact line:
+'For part number [Missing Part Number], our team will contact you soon.'
+
+[PART_NUMBER_NONE] CRITICAL: The user searched by PART NUMBER, but NO MATCHING PARTS were found in the database.
+You MUST output the following message explicitly:
+"Thank you for providing the part number .
+
+For part number [Missing Part Numbers, comma separated], our team will contact you soon."
+
+Do NOT add any other table or placeholders. Just the above acknowledgement.
+
+OUTPUT FORMULA (JSON ONLY):
+{
+"machine_payload": {
+    "intent": "super_intent",
+    "action": "quote" | "ask_clarify" | "info_only" | "escalate",
+    "vin": "<the 'VIN' from the turn context, or empty>",
+    "confidence": 1.0
+},
+"whatsapp_text": "..."
+}
+Write machine_payload first, then whatsapp_text. In whatsapp_text separate paragraphs and list items with a blank line.
+"""
+
+
+def active_rules(context_data: dict, has_reference: bool, detected_lang: str) -> list:
+    """Ids of the FIXED_RULES that apply this turn (same decisions as before, in order)."""
+    parts = context_data.get("parts_found") or []
+    rules = ["REFERENCE"] if has_reference else []
+
+    # Priority: Error > Out of Stock > Empty
+    if any(p.get("status") == "error" for p in parts):
+        rules.append("CATALOG_ERROR")
+    elif any(p.get("status") == "out_of_stock" for p in parts):
+        rules.append("CATALOG_NOT_IN_STOCK")
+    elif any(p.get("status") == "empty" for p in parts) and not any(p.get("price") for p in parts):
+        rules.append("CATALOG_EMPTY")
+
+    if parts:
+        rules.append("PARTS_FOUND")
+    if any(p.get("equivalent_of") for p in parts):
+        rules.append("EQUIVALENTS")
+    if any(p.get("requested_part_number") for p in parts):
+        rules.append("DID_YOU_MEAN")
+    if len(parts) > 1:
+        rules.append("ALL_PARTS")
+    if detected_lang != "en":
+        rules.append("LANGUAGE")
+
+    extracted = context_data.get("extracted_entities") or {}
+    if extracted.get("part_numbers"):
+        rules.append("PART_NUMBER_FOUND" if parts else "PART_NUMBER_NONE")
+    return rules
+
+
+def _tabular() -> bool:
+    return current_app.config.get("PARTS_CONTEXT_FORMAT", "table") == "table"
+
+
+def render_parts(parts: list, max_tokens: int | None = None) -> str:
+    return encode_parts(parts, max_tokens) if _tabular() else parts_json(parts, max_tokens)
+
+
+def static_prefix(base_prompt: str) -> str:
+    """System message #1: identical across turns for the same prompt version."""
+    return base_prompt + "\n\n" + FIXED_RULES
+
+
+def turn_context(context_data: dict, detected_lang: str, rules: list,
+                 reference_text: str = "", parts_text: str | None = None) -> str:
+    """System message #2: everything that changes per message (the user text is the user message)."""
+    vin_info = context_data.get("vin_info")
+    parts = context_data.get("parts_found") or []
+    if parts_text is None:
+        parts_text = render_parts(parts)
+    lines = []
+    if reference_text:
+        lines.append(REFERENCE_HEADER.strip() + "\n" + reference_text + "\n")
+    lines += [
+        "=== TURN CONTEXT ===",
+        f"User Language: {detected_lang}",
+        "",
+        "Knowledge/State:",
+        f"- Decoded VIN: {vin_info or 'None'}",
+        f"- VIN: {(vin_info or {}).get('vin') or ''}",
+        f"- Matched Parts (DB) ({len(unique_parts(parts)) if _tabular() else len(parts)}): {parts_text}",
+        f"- Missing Part Numbers: {', '.join(context_data.get('missing_pns') or []) or 'None'}",
+        f"- Session Context: {context_data.get('session_summary', 'None')}",
+        "",
+        f"ACTIVE RULES: {', '.join(rules) or 'none'}",
+    ]
+    return "\n".join(lines)
+
+
+def build_super_intent_messages(base_prompt: str, user_text: str, context_data: dict,
+                                detected_lang: str, has_reference: bool,
+                                reference_text: str = "", token_budget: int | None = None) -> list:
+    """
+    Messages for run_super_intent. With token_budget, over-long prompts are
+    cut in this order: reference chunks, matched parts (siblings summarised),
+    then the user text; the static prefix is never touched.
+    """
+    rules = active_rules(context_data, has_reference, detected_lang)
+    parts = context_data.get("parts_found") or []
+    parts_text = render_parts(parts)
+    sections = fit_sections("super_intent", [
+        Section("static", static_prefix(base_prompt)),
+        Section("reference", reference_text, priority=0),
+        Section("parts", parts_text, priority=1, shrink=lambda _text, target: render_parts(parts, target)),
+        Section("user_text", user_text, priority=2),
+        Section("turn", turn_context(context_data, detected_lang, rules, "", "")),
+    ], token_budget)
+    static, reference, parts_section, user, _ = (s.text for s in sections)
+    return [
+        {"role": "system", "content": static},
+        {"role": "system", "content": turn_context(context_data, detected_lang, rules, reference, parts_section)},
+        {"role": "user", "content": user},
+    ]
@@ -0,0 +1,200 @@
+"""
+Per-process cache of active IntentPrompts.
+
+run_super_intent used to query intent_prompts on every message, pulling
+the (possibly megabyte-sized) reference_text each time. Active prompts are
+now loaded once per process, with the static part of the system prompt
+(prompt text + reference material + its instruction) assembled up front.
+
+Invalidation:
+- admin create / update / toggle / delete call invalidate_prompts(), which
+  bumps a version counter in Redis and publishes on PROMPT_CHANNEL;
+- a daemon thread per process listens and marks the cache stale;
+- as a safety net (missed message, listener down) the version counter is
+  compared at most every PROMPT_CACHE_CHECK_SECONDS.
+
+In the RQ worker the cache lives in the parent and is refreshed before
+each fork (worker.py), like the stock index.
+"""
+
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+from flask import current_app
+from sqlalchemy import select
+
+from ..extensions import db
+from ..models import IntentPrompt
+from ..redis_client import redis_client
+from .reference_extractor import chunk_reference_text
+from .reference_index import ReferenceIndex
+
+PROMPT_CHANNEL = "intent_prompts:invalidate"
+PROMPT_VERSION_KEY = "intent_prompts:version"
+
+REFERENCE_HEADER = "\n\n=== REFERENCE MATERIAL ===\n"
+REFERENCE_INSTRUCTION = (
+    "\n\nCRITICAL: You are provided with 'REFERENCE MATERIAL' above. YOU MUST ANSWER ONLY USING THIS "
+    "MATERIAL for any questions about warning lights or symbols. DO NOT use your internal training data. "
+    "If the answer is not in the material, say 'Information not found in reference'."
+)
+
+_COLUMNS = (IntentPrompt.intent_key, IntentPrompt.prompt_text, IntentPrompt.reference_text,
+            IntentPrompt.reference_chunks, IntentPrompt.parts_alias_text)
+
+
+@dataclass(frozen=True)
+class CachedPrompt:
+    intent_key: str
+    prompt_text: str
+    system_prompt: str   # prompt text + full reference material, ready to use
+    has_reference: bool
+    reference_length: int
+    parts_alias_text: str | None
+    reference: ReferenceIndex | None = None  # chunks for per-message retrieval
+
+
+def _assemble(row) -> CachedPrompt:
+    system_prompt = row.prompt_text or ""
+    if row.reference_text:
+        system_prompt += f"{REFERENCE_HEADER}{row.reference_text}\n"
+        system_prompt += REFERENCE_INSTRUCTION
+    reference = None
+    if row.reference_text:
+        try:
+            chunks = json.loads(row.reference_chunks) if row.reference_chunks else None
+        except ValueError:
+            chunks = None
+        # Uploaded before chunking existed: chunk now
+        reference = ReferenceIndex(chunks or chunk_reference_text(row.reference_text))
+    return CachedPrompt(
+        intent_key=row.intent_key,
+        prompt_text=row.prompt_text or "",
+        system_prompt=system_prompt,
+        has_reference=bool(row.reference_text),
+        reference_length=len(row.reference_text or ""),
+        parts_alias_text=row.parts_alias_text,
+        reference=reference,
+    )
+
+
+def _redis_version():
+    try:
+        return redis_client.get(PROMPT_VERSION_KEY)
+    except Exception:
+        return None
+
+
+class PromptCache:
+    def __init__(self):
+        self.prompts = {}
+        self.version = None
+        self.loaded_at = 0.0
+        self.last_checked = 0.0
+        self.stale = True
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        # Cleared and read first, so a change arriving during the load stays visible
+        self.stale = False
+        version = _redis_version()
+        # Plain rows, not entities: nothing megabyte-sized stays in the session
+        rows = db.session.execute(select(*_COLUMNS).where(IntentPrompt.is_active.is_(True))).all()
+        self.prompts = {row.intent_key: _assemble(row) for row in rows}
+        self.version = version
+        self.loaded_at = self.last_checked = time.monotonic()
+        print(f"🧠 Prompt cache loaded: {len(self.prompts)} active prompts")
+
+    def refresh(self) -> bool:
+        """Reload if invalidated, or if the version stamp moved. True if reloaded."""
+        now = time.monotonic()
+        if not self.stale:
+            interval = current_app.config.get("PROMPT_CACHE_CHECK_SECONDS", 30)
+            if now - self.last_checked < interval:
+                return False
+            self.last_checked = now
+            version = _redis_version()
+            max_age = current_app.config.get("PROMPT_CACHE_MAX_AGE_SECONDS", 900)
+            if version == self.version and (version is not None or now - self.loaded_at < max_age):
+                return False
+        with self._lock:
+            self.load()
+        return True
+
+    def get(self, intent_key: str) -> CachedPrompt | None:
+        self.refresh()
+        return self.prompts.get(intent_key)
+
+
+# ================= INVALIDATION =================
+
+def invalidate_prompts() -> None:
+    """Call after committing any IntentPrompt change. Never raises."""
+    if _cache is not None:
+        _cache.stale = True
+    try:
+        redis_client.incr(PROMPT_VERSION_KEY)
+        redis_client.publish(PROMPT_CHANNEL, b"1")
+    except Exception as e:
+        print(f"⚠️ Prompt invalidation broadcast failed (other processes catch up on their next check): {e}")
+
+
+def _listen() -> None:
+    while True:
+        try:
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(PROMPT_CHANNEL)
+            for message in pubsub.listen():
+                if message and message.get("type") == "message" and _cache is not None:
+                    _cache.stale = True
+        except Exception as e:
+            print(f"⚠️ Prompt invalidation listener error, reconnecting: {e}")
+            if _cache is not None:
+                _cache.stale = True  # may have missed a message
+            time.sleep(5)
+
+
+# ================= SINGLETON =================
+
+_cache: PromptCache | None = None
+_cache_pid = None
+_listener_pid = None
+
+
+def get_prompt_cache() -> PromptCache:
+    global _cache, _cache_pid, _listener_pid
+    if _cache is None:
+        _cache = PromptCache()
+        _cache_pid = os.getpid()
+    # A forked RQ work horse uses the parent's copy for one job; only the
+    # owning process listens.
+    if _cache_pid == os.getpid() and _listener_pid != _cache_pid:
+        _listener_pid = _cache_pid
+        threading.Thread(target=_listen, name="prompt-invalidation", daemon=True).start()
+    return _cache
+
+
+def get_intent_prompt(intent_key: str) -> CachedPrompt | None:
+    """Active prompt for intent_key from the process cache (None if missing/inactive)."""
+    try:
+        return get_prompt_cache().get(intent_key)
+    except Exception as e:
+        print(f"⚠️ Prompt cache unavailable, querying DB: {e}")
+        row = db.session.execute(
+            select(*_COLUMNS).where(IntentPrompt.intent_key == intent_key, IntentPrompt.is_active.is_(True))
+        ).first()
+        return _assemble(row) if row else None
+
+
+def refresh_prompt_cache() -> bool:
+    """Refresh hook for worker.py (runs in the parent before each fork)."""
+    if _cache is None:
+        return False
+    try:
+        return _cache.refresh()
+    except Exception as e:
+        print(f"⚠️ Prompt cache refresh failed (serving previous prompts): {e}")
+        return False
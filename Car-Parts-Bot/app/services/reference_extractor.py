@@ -1,6 +1,8 @@
 # app/services/reference_extractor.py
 
 import os
+import re
+
 import fitz  # PyMuPDF
 from docx import Document
 
@@ -71,3 +73,77 @@ def _extract_text_from_docx(path: str) -> str:
         raise ValueError("DOCX contains no readable text")
 
     return "\n".join(paragraphs)
+
+
+# ---------------- CHUNKING ---------------- #
+# Reference material is retrieved per message (reference_index.py) instead
+# of being pasted whole into every prompt. Chunks never cross a page or a
+# section heading, and stay under max_chars.
+
+_PAGE_MARKER_RE = re.compile(r"^\[Page (\d+)\]$")
+_NUMBERED_HEADING_RE = re.compile(r"^(?:\d+(?:\.\d+)*|[A-Z])[.)]?\s+\S")
+
+
+def _is_heading(line: str) -> bool:
+    if len(line) > 80 or line.endswith((".", ",", ";", ":")):
+        return False
+    letters = [c for c in line if c.isalpha()]
+    if len(letters) < 3:
+        return False
+    if line.isupper() or _NUMBERED_HEADING_RE.match(line):
+        return True
+    words = line.split()
+    return 1 <= len(words) <= 8 and all(w[0].isupper() for w in words if w[0].isalpha())
+
+
+def chunk_reference_text(text: str, max_chars: int = 1600) -> list:
+    """
+    Split extracted reference text into [{"page", "section", "text"}, ...].
+    Pages come from the "[Page N]" markers written by the PDF extractor;
+    sections from heading-like lines (short, no trailing punctuation,
+    numbered / upper / title case).
+    """
+    chunks = []
+    page = None
+    section = None
+    buf = []
+    size = 0
+
+    def flush():
+        nonlocal buf, size
+        body = "\n".join(buf).strip()
+        if body:
+            chunks.append({"page": page, "section": section, "text": body})
+        buf, size = [], 0
+
+    for raw in (text or "").splitlines():
+        line = raw.strip()
+        marker = _PAGE_MARKER_RE.match(line)
+        if marker:
+            flush()
+            page = int(marker.group(1))
+            continue
+        if not line:
+            if buf and buf[-1]:
+                buf.append("")
+            continue
+        if _is_heading(line):
+            flush()
+            section = line
+            continue
+
+        # Oversized paragraphs are cut at sentence ends, then hard-cut
+        while len(line) > max_chars:
+            cut = line.rfind(". ", 0, max_chars)
+            cut = cut + 1 if cut > max_chars // 2 else max_chars
+            flush()
+            buf, size = [line[:cut]], cut
+            flush()
+            line = line[cut:].strip()
+        if size + len(line) > max_chars:
+            flush()
+        buf.append(line)
+        size += len(line) + 1
+
+    flush()
+    return chunks
@@ -0,0 +1,64 @@
+"""
+Per-message retrieval over an intent's reference material.
+
+The reference document is chunked at upload time (reference_extractor.
+chunk_reference_text) and each chunk indexed with the same BM25 used for
+stock search. run_super_intent injects only the best chunks for the
+message, in document order, within a token budget, instead of the whole
+document on every turn.
+"""
+
+from .bm25 import BM25Index, tokenize
+
+
+def estimate_tokens(text: str) -> int:
+    """~4 characters per token for English / OCR text."""
+    return (len(text or "") + 3) // 4
+
+
+def render_chunk(chunk: dict) -> str:
+    label = " / ".join(filter(None, (
+        f"Page {chunk['page']}" if chunk.get("page") else None,
+        chunk.get("section"),
+    )))
+    return f"[{label}]\n{chunk['text']}" if label else chunk["text"]
+
+
+class ReferenceIndex:
+    def __init__(self, chunks: list):
+        self.chunks = chunks
+        self.bm25 = BM25Index()
+        for i, chunk in enumerate(chunks):
+            self.bm25.add(i, tokenize(f"{chunk.get('section') or ''} {chunk['text']}"))
+        self.total_tokens = sum(estimate_tokens(render_chunk(c)) for c in chunks)
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def select(self, query: str, top_k: int = 4, token_budget: int = 1500,
+               min_relative_score: float = 0.25) -> list:
+        """
+        Best chunks for `query`: at most top_k, within token_budget, and
+        scoring at least min_relative_score of the best hit. Returned in
+        document order.
+        """
+        positions = [{t} for t in dict.fromkeys(tokenize(query))]
+        hits = self.bm25.search(positions, k=top_k * 3)
+        if not hits:
+            return []
+        floor = hits[0][1] * min_relative_score
+
+        picked = []
+        used = 0
+        for chunk_id, score, _ in hits:
+            if score < floor or len(picked) >= top_k:
+                break
+            cost = estimate_tokens(render_chunk(self.chunks[chunk_id]))
+            if used + cost > token_budget:
+                continue
+            picked.append(chunk_id)
+            used += cost
+        return [self.chunks[i] for i in sorted(picked)]
+
+    def render(self, chunks: list) -> str:
+        return "\n\n".join(render_chunk(c) for c in chunks)
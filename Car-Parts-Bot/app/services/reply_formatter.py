@@ -0,0 +1,259 @@
+"""
+Deterministic WhatsApp house style for super-intent replies.
+
+Replaces the second gpt-4o "sales agent" formatting pass for replies built
+from our own data. Quotes get the items of their part list that name one
+of our part numbers re-rendered from the structured parts (numbered
+blocks, *bold* name and price); the model still picks which parts to
+list. Every reply gets the same clean-up the prompt asked the LLM for:
+WhatsApp bold instead of Markdown, at most MAX_EMOJIS emojis, and the
+website / sign-off only once.
+
+Free-form answers (info_only with no parts, e.g. warning-light
+explanations) can still go through the LLM formatter, see REPLY_FORMATTER.
+"""
+
+import re
+
+MAX_EMOJIS = 3
+WEBSITE = "www.carpartsdubai.com"
+
+_ACTION_EMOJI = {"quote": "✅", "ask_clarify": "🔎", "escalate": "⚠️"}
+
+_EMOJI_RE = re.compile(
+    r"(?:[\U0001F1E6-\U0001F1FF]{2}|[\U0001F300-\U0001FAFF\u2600-\u27BF\u2B05-\u2B07\u2B50\u2B55])"
+    r"[\uFE0F\u200D]*"
+)
+_NUMBERED_RE = re.compile(r"^\s*\d+[.)]\s+")
+_BULLET_RE = re.compile(r"^\s*(?:[-•*]\s+|\s{2,}\S)")
+_WORD_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9\-./]*")
+_HEADING_RE = re.compile(r"^[ \t]*#{1,6}[ \t]*(.+?)[ \t]*$", re.M)
+_MD_BOLD_RE = re.compile(r"\*\*(.+?)\*\*|__(.+?)__")
+# [ \t] rather than \s next to ^/$ so a match never swallows a blank line
+_TITLE_RE = re.compile(r"^([ \t]*\d+[.)][ \t]+)(?![^\n]*\*)([^\n]+?)[ \t]*$", re.M)
+_PRICE_RE = re.compile(r"(?im)^([ \t]*(?:[-•][ \t]*)?price[ \t]*:[ \t]*)(?!\*)(\S[^\n]*?)[ \t]*$")
+_LEAD_IN_RE = re.compile(r"(?i)\b(?:visit(?: us)?(?: at| on)?|website|online at)\s*$")
+_WEBSITE_RE = re.compile(r"(?:https?://)?" + re.escape(WEBSITE) + r"/?", re.I)
+
+
+def is_free_form(payload: dict | None, parts: list | None) -> bool:
+    """Replies with no data of ours behind them (the LLM formatter's niche)."""
+    action = (payload or {}).get("action")
+    return action not in _ACTION_EMOJI and not listable_parts(parts)
+
+
+def listable_parts(parts) -> list:
+    """Parts that are real matches (not catalog error / empty markers)."""
+    return [p for p in parts or () if p.get("part_number") and p.get("status") not in ("error", "empty")]
+
+
+# ================= PART BLOCKS =================
+
+def _price_text(price, currency: str) -> str:
+    if price in (None, ""):
+        return "On request"
+    try:
+        return f"{currency} {float(price):,.2f}"
+    except (TypeError, ValueError):
+        return str(price)
+
+
+def render_part_blocks(parts: list, currency: str = "AED", start: int = 1) -> str:
+    blocks = []
+    for i, p in enumerate(parts, start):
+        lines = [
+            f"{i}. *{(p.get('name') or p.get('part_number')).strip()}*",
+            f"   - Brand: {p.get('brand') or 'N/A'}",
+            f"   - Price: *{_price_text(p.get('price'), currency)}*",
+            f"   - Part Number: {p.get('part_number')}",
+            f"   - Availability: {'In Stock' if (p.get('qty') or 0) > 0 else 'Out of Stock'}",
+        ]
+        if p.get("equivalent_of"):
+            label = "Equivalent to" if p.get("relation") == "cross_reference" else "Replaces"
+            lines.append(f"   - {label}: {p['equivalent_of']}")
+        if p.get("requested_part_number"):
+            lines.append(f"   - Did you mean this for {p['requested_part_number']}?")
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks)
+
+
+def _number_key(value) -> str:
+    return re.sub(r"[^A-Z0-9]", "", str(value or "").upper())
+
+
+class PartList:
+    """
+    Re-renders the numbered items of the LLM's part list from our data.
+    An item (a numbered line and the bullet lines under it) is ours if it
+    names a listed part's number, or the number the user typed for a fuzzy
+    match; it is replaced by the blocks of the parts it names. Other
+    numbered lists ("1. send your VIN") and the prose around them are kept.
+    Numbering and the parts already shown carry over between calls, so a
+    streamed reply can be fed block by block.
+    """
+
+    def __init__(self, parts: list, currency: str = "AED"):
+        self.currency = currency
+        self.by_number = {}
+        for p in parts:
+            for number in {_number_key(p.get("part_number")), _number_key(p.get("requested_part_number"))}:
+                if number:
+                    self.by_number.setdefault(number, []).append(p)
+        self.shown = set()  # id() of parts already rendered
+        self.count = 0
+
+    def _named(self, item: str):
+        """Parts the item names, in order of mention; None if it names none of ours."""
+        named = None
+        for word in _WORD_RE.findall(item):
+            for p in self.by_number.get(_number_key(word), ()):
+                named = named if named is not None else []
+                if id(p) not in self.shown and p not in named:
+                    named.append(p)
+        return named
+
+    def replace(self, text: str) -> str:
+        lines = text.split("\n")
+        out = []
+        i = 0
+        while i < len(lines):
+            end = i
+            if _NUMBERED_RE.match(lines[i]):
+                while end + 1 < len(lines) and _BULLET_RE.match(lines[end + 1]):
+                    end += 1
+            item = lines[i:end + 1]
+            named = self._named("\n".join(item)) if _NUMBERED_RE.match(lines[i]) else None
+            if named is None:
+                out.extend(item)
+            elif named:  # an item repeating parts already shown is dropped
+                if out and out[-1].strip():
+                    out.append("")
+                out.append(render_part_blocks(named, self.currency, self.count + 1))
+                if end + 1 < len(lines) and lines[end + 1].strip():
+                    out.append("")
+                self.count += len(named)
+                self.shown.update(id(p) for p in named)
+            i = end + 1
+        return "\n".join(out)
+
+
+# ================= HOUSE STYLE =================
+
+def _whatsapp_markup(text: str) -> str:
+    text = _HEADING_RE.sub(lambda m: f"*{m.group(1)}*", text)
+    text = _MD_BOLD_RE.sub(lambda m: f"*{m.group(1) or m.group(2)}*", text)
+    text = _TITLE_RE.sub(lambda m: f"{m.group(1)}*{m.group(2)}*", text)
+    return _PRICE_RE.sub(lambda m: f"{m.group(1)}*{m.group(2)}*", text)
+
+
+def _limit_emojis(text: str, used: int = 0) -> tuple:
+    """Drop emojis past MAX_EMOJIS (counting `used` already spent). (text, used)"""
+    def keep(m):
+        nonlocal used
+        used += 1
+        return m.group(0) if used <= MAX_EMOJIS else ""
+
+    return _EMOJI_RE.sub(keep, text), used
+
+
+def _add_action_emoji(text: str, action: str | None) -> str:
+    """At the end of the reply: only then is it known the reply has no emoji of its own."""
+    if action not in _ACTION_EMOJI:
+        return text
+    return f"{text.rstrip()} {_ACTION_EMOJI[action]}"
+
+
+def _emoji_budget(text: str, action: str | None) -> str:
+    text, seen = _limit_emojis(text)
+    if seen == 0:
+        text = _add_action_emoji(text, action)
+    return re.sub(r"[ \t]+\n", "\n", text)
+
+
+def _dedupe_website(text: str, seen: bool = False) -> tuple:
+    """
+    Keep the first mention of the website; drop repeats (and their lead-in
+    lines). `seen`: already mentioned earlier. (text, seen)
+    """
+    out = []
+    for line in text.split("\n"):
+        if _WEBSITE_RE.search(line):
+            if seen:
+                line = _WEBSITE_RE.sub("", line).rstrip(" :.-|🌐")
+                if not line.strip() or _LEAD_IN_RE.search(line):
+                    continue
+            seen = True
+        out.append(line)
+    return "\n".join(out), seen
+
+
+def format_whatsapp_reply(text: str, payload: dict | None = None, parts: list | None = None,
+                          lang: str = "en", currency: str = "AED") -> str:
+    if not text or len(text) < 5:
+        return text
+    action = (payload or {}).get("action")
+
+    # Quotes: the parts the model listed, rendered from our data (English labels only)
+    listable = listable_parts(parts)
+    if action == "quote" and listable and lang == "en":
+        text = PartList(listable, currency).replace(text)
+
+    text = _whatsapp_markup(text)
+    text, _ = _dedupe_website(text)
+    text = _emoji_budget(text, action)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+# ================= STREAMING =================
+
+class StreamingReplyFormatter:
+    """
+    format_whatsapp_reply for a reply sent paragraph by paragraph as it
+    streams in: the emoji budget, website dedupe and part-list numbering
+    carry over from one block to the next.
+
+    The action is whatever the stream has shown so far (None until the
+    machine_payload is seen); with no action yet, listable parts are
+    assumed to mean a quote.
+
+    While the reply has no emoji, the latest block is held back: finish()
+    may still have to add the action emoji to it. The blocks returned by
+    format_block() and finish(), joined by blank lines, are exactly what
+    format_whatsapp_reply gives for the whole text.
+    """
+
+    def __init__(self, parts: list | None = None, lang: str = "en", currency: str = "AED"):
+        listable = listable_parts(parts) if lang == "en" else []
+        self.part_list = PartList(listable, currency) if listable else None
+        self.emojis = 0
+        self.website_seen = False
+        self.first = True
+        self.held = ""
+
+    def format_block(self, block: str, action: str | None = None) -> str:
+        """One paragraph in house style; returns the text to send now ("" for nothing yet)."""
+        if self.part_list and action in (None, "quote"):
+            block = self.part_list.replace(block)
+        block = _whatsapp_markup(block)
+        block, self.website_seen = _dedupe_website(block, self.website_seen)
+        block, self.emojis = _limit_emojis(block, self.emojis)
+        block = re.sub(r"\n{3,}", "\n\n", re.sub(r"[ \t]+\n", "\n", block)).rstrip().lstrip("\n")
+        if not block.strip():
+            return ""
+        if self.first:
+            block = block.lstrip()
+            self.first = False
+
+        if self.emojis == 0:
+            ready, self.held = self.held, block
+            return ready
+        ready, self.held = "\n\n".join(b for b in (self.held, block) if b), ""
+        return ready
+
+    def finish(self, action: str | None = None) -> str:
+        """The held-back block, with the action emoji if the reply had none."""
+        block, self.held = self.held, ""
+        if block and self.emojis == 0:
+            block = _add_action_emoji(block, action)
+            self.emojis += action in _ACTION_EMOJI
+        return block
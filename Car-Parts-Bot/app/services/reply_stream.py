@@ -0,0 +1,140 @@
+"""
+Incremental delivery of a streamed super-intent reply.
+
+gpt-4o answers with a JSON object; while it streams, JsonStringFieldReader
+decodes the "whatsapp_text" string as it arrives and ReplyStream hands
+every finished paragraph (or part block) to `deliver` straight away,
+house-styled by StreamingReplyFormatter (one block behind while the reply
+has no emoji yet, see there). The user sees the opening lines
+of a long multi-part quote while the rest is still being generated.
+"""
+
+import re
+import time
+
+from .metrics import record as record_metrics
+
+REPLY_STREAM_KEY = "metrics:reply_stream"
+
+_ACTION_RE = re.compile(r'"action"\s*:\s*"(\w+)"')
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class JsonStringFieldReader:
+    """
+    Decodes one top-level string field of a JSON object from a stream of
+    text deltas. feed() returns the newly decoded characters of the field.
+    """
+
+    def __init__(self, field: str):
+        self._key_re = re.compile(r'"' + re.escape(field) + r'"\s*:\s*"')
+        self.head = ""      # raw JSON before the field's value
+        self.started = False
+        self.done = False
+        self._escape = None  # partial escape sequence after a backslash
+        self._high = None    # pending high surrogate of a \u pair
+
+    def feed(self, delta: str) -> str:
+        if self.done or not delta:
+            return ""
+        if not self.started:
+            self.head += delta
+            m = self._key_re.search(self.head)
+            if not m:
+                return ""
+            self.started = True
+            delta, self.head = self.head[m.end():], self.head[:m.start()]
+        return self._decode(delta)
+
+    def _decode(self, delta: str) -> str:
+        out = []
+        for ch in delta:
+            if self._escape is not None:
+                self._escape += ch
+                if self._escape[0] != "u":
+                    out.append(_ESCAPES.get(self._escape, self._escape))
+                    self._escape = None
+                elif len(self._escape) == 5:
+                    out.append(self._codepoint(int(self._escape[1:], 16)))
+                    self._escape = None
+            elif ch == "\\":
+                self._escape = ""
+            elif ch == '"':
+                self.done = True
+                break
+            else:
+                out.append(ch)
+        return "".join(out)
+
+    def _codepoint(self, code: int) -> str:
+        if 0xD800 <= code < 0xDC00:
+            self._high = code
+            return ""
+        if 0xDC00 <= code < 0xE000 and self._high is not None:
+            code = 0x10000 + ((self._high - 0xD800) << 10) + (code - 0xDC00)
+        self._high = None
+        return chr(code)
+
+
+class ReplyStream:
+    """
+    Feed it the raw completion deltas; it delivers each paragraph of
+    whatsapp_text once the blank line after it arrives, then the remainder
+    on finish().
+    """
+
+    def __init__(self, deliver, formatter):
+        self.deliver = deliver
+        self.formatter = formatter
+        self.reader = JsonStringFieldReader("whatsapp_text")
+        self.sent = []
+        self._buffer = ""
+        self._t0 = time.perf_counter()
+        self._first_ms = None
+
+    @property
+    def started(self) -> bool:
+        return self.reader.started
+
+    @property
+    def action(self):
+        # Only known early if the model wrote machine_payload first
+        m = _ACTION_RE.search(self.reader.head)
+        return m.group(1) if m else None
+
+    def feed(self, delta: str) -> None:
+        self._buffer += self.reader.feed(delta)
+        while "\n\n" in self._buffer:
+            block, self._buffer = self._buffer.split("\n\n", 1)
+            self._send(block)
+
+    def _send(self, block: str, action: str | None = None) -> None:
+        if block.strip():
+            self._deliver(self.formatter.format_block(block, action or self.action))
+
+    def _deliver(self, text: str) -> None:
+        if not text:
+            return
+        if self._first_ms is None:
+            self._first_ms = (time.perf_counter() - self._t0) * 1000
+        self.sent.append(text)
+        self.deliver(text)
+
+    def finish(self, action: str | None = None, complete: bool = True) -> str:
+        """
+        Deliver what is left; returns the whole reply as sent. complete=False
+        (the reply broke off) drops the unfinished last paragraph.
+        """
+        block, self._buffer = self._buffer, ""
+        if complete:
+            self._send(block, action)
+        self._deliver(self.formatter.finish(action or self.action))
+        total_ms = (time.perf_counter() - self._t0) * 1000
+        if self.sent:
+            print(f"⏱️ [SuperIntent] Streamed {len(self.sent)} blocks: first after "
+                  f"{self._first_ms:.0f} ms, last after {total_ms:.0f} ms")
+            record_metrics(
+                REPLY_STREAM_KEY, replies=1, blocks=len(self.sent),
+                first_block_ms_total=round(self._first_ms, 1), last_block_ms_total=round(total_ms, 1),
+            )
+        return "\n\n".join(self.sent)
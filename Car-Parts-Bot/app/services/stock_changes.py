@@ -0,0 +1,103 @@
+"""
+Stock change feed (Redis stream) written by stock imports.
+
+Each entry carries one JSON `data` field:
+
+    {"unique_values": [...], "keys": [...], "tags": [...]}   rows changed
+    {"deleted_ids": [...], "keys": [...], "tags": [...]}     rows deleted
+    {"reload": true}                                         rebuild everything
+
+`keys` are the normalized lookup keys (part_number, brand_part_no,
+unique_value) and `tags` the tag values touched, old and new, so caches
+keyed on either can drop just those entries.
+Consumers remember the last entry id they applied and read forward.
+"""
+
+import json
+
+from flask import current_app
+
+from ..redis_client import redis_client
+
+
+def _stream() -> str:
+    return current_app.config.get("STOCK_CHANGE_STREAM", "stock:changes")
+
+
+def publish_stock_changes(unique_values=(), keys=(), tags=(), deleted_ids=(), reload: bool = False) -> bool:
+    """
+    Append one change entry. Never raises (consumers fall back to the stock
+    stamp); returns False if the entry could not be written.
+    """
+    if reload:
+        payload = {"reload": True}
+    elif unique_values or deleted_ids:
+        payload = {
+            "keys": sorted({k for k in keys if k}),
+            "tags": sorted({t for t in tags if t}),
+        }
+        if unique_values:
+            payload["unique_values"] = sorted(set(unique_values))
+        if deleted_ids:
+            payload["deleted_ids"] = sorted(set(deleted_ids))
+    else:
+        return True
+
+    try:
+        redis_client.xadd(
+            _stream(),
+            {"data": json.dumps(payload)},
+            maxlen=current_app.config.get("STOCK_CHANGE_STREAM_MAXLEN", 10000),
+            approximate=True,
+        )
+    except Exception as e:
+        print(f"⚠️ Stock change feed publish failed: {e}")
+        return False
+    return True
+
+
+def latest_stock_change_id() -> str:
+    """Id of the newest entry ("0-0" if the stream is empty)."""
+    entries = redis_client.xrevrange(_stream(), count=1)
+    if not entries:
+        return "0-0"
+    entry_id = entries[0][0]
+    return entry_id.decode() if isinstance(entry_id, bytes) else entry_id
+
+
+def _id_tuple(entry_id) -> tuple:
+    if isinstance(entry_id, bytes):
+        entry_id = entry_id.decode()
+    ms, _, seq = str(entry_id).partition("-")
+    return int(ms), int(seq or 0)
+
+
+def _trimmed_past(after_id: str) -> bool:
+    """True if entries after `after_id` were trimmed away (Redis 7+ reports this)."""
+    try:
+        deleted = redis_client.xinfo_stream(_stream()).get("max-deleted-entry-id")
+    except Exception:
+        return False
+    return deleted is not None and _id_tuple(deleted) > _id_tuple(after_id)
+
+
+def read_stock_changes(after_id: str, count: int = 500) -> tuple:
+    """
+    Entries newer than `after_id`. Returns (last_id, [payload, ...]);
+    last_id is unchanged when there is nothing new. If the stream was
+    trimmed past `after_id` the payloads are replaced by one reload entry.
+    """
+    result = redis_client.xread({_stream(): after_id}, count=count)
+    changes = []
+    last_id = after_id
+    for _, entries in result or ():
+        for entry_id, fields in entries:
+            last_id = entry_id.decode() if isinstance(entry_id, bytes) else entry_id
+            raw = fields.get(b"data") or fields.get("data")
+            try:
+                changes.append(json.loads(raw))
+            except (TypeError, ValueError):
+                continue
+    if changes and _trimmed_past(after_id):
+        return last_id, [{"reload": True}]
+    return last_id, changes
@@ -0,0 +1,379 @@
+"""
+Streaming bulk import of ERP stock exports (CSV / XLSX) into `stock`.
+
+Files are read row by row (csv module / openpyxl read-only mode), so
+memory stays flat regardless of file size. Rows are normalized a batch
+at a time and written with one multi-row upsert per batch keyed on a
+sha256 of the full `unique_value` (uq_stock_unique_value_hash). The
+in-process stock index is rebuilt once at the end, not per row.
+
+Delta mode (price/qty syncs) compares a per-row content hash against
+what is stored and writes only rows that actually changed, publishing
+each batch's affected unique values, part numbers and tags on the stock
+change feed so indexes and caches can update just those.
+
+prune=True treats the file as the complete stock list: rows whose
+unique_value is not in it are deleted afterwards and published as
+deleted ids. It keeps one hash per imported row in memory.
+"""
+
+import csv
+import hashlib
+import os
+import resource
+import sys
+import time
+
+from sqlalchemy import delete, func, select
+
+from ..extensions import db
+from ..models import Stock, stock_lookup_key, stock_unique_value_hash
+from .part_numbers import normalize_part_numbers
+from .stock_changes import publish_stock_changes
+
+BATCH_SIZE = 2000
+
+# Header spellings seen in ERP exports -> stock column
+_HEADER_ALIASES = {
+    "tag": "tag",
+    "group": "tag",
+    "brandpartno": "brand_part_no",
+    "brandpartnumber": "brand_part_no",
+    "itemdesc": "item_desc",
+    "description": "item_desc",
+    "itemdescription": "item_desc",
+    "price": "price",
+    "unitprice": "price",
+    "qty": "qty",
+    "quantity": "qty",
+    "stock": "qty",
+    "partnumber": "part_number",
+    "partno": "part_number",
+    "pn": "part_number",
+    "brand": "brand",
+    "make": "brand",
+    "uniquevalue": "unique_value",
+    "uniquekey": "unique_value",
+}
+
+_UPDATE_COLUMNS = ("tag", "brand_part_no", "item_desc", "price", "qty", "part_number", "brand",
+                   "part_number_norm", "brand_part_no_norm", "content_hash")
+# Imported content; a change in any of these counts as a row change
+_HASH_COLUMNS = ("part_number", "brand_part_no", "brand", "tag", "item_desc", "price", "qty")
+
+
+class StockImportError(ValueError):
+    pass
+
+
+# ================= READERS =================
+
+def _header_key(value) -> str:
+    return "".join(ch for ch in str(value or "").lower() if ch.isalnum())
+
+
+def _map_header(header) -> list:
+    columns = [_HEADER_ALIASES.get(_header_key(h)) for h in header]
+    if "unique_value" not in columns:
+        raise StockImportError("Import file needs a unique_value column")
+    if "part_number" not in columns:
+        raise StockImportError("Import file needs a part_number column")
+    return columns
+
+
+def _iter_csv(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        yield from csv.reader(f)
+
+
+def _iter_xlsx(path, sheet=None):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet] if sheet else wb.worksheets[0]
+        yield from ws.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def iter_sheet_rows(path: str, sheet: str | None = None):
+    """Raw rows (header first) of a .csv or .xlsx file, streamed from disk."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return _iter_csv(path)
+    if ext in (".xlsx", ".xlsm"):
+        return _iter_xlsx(path, sheet)
+    raise StockImportError(f"Unsupported file type {ext or '(none)'}; use .csv or .xlsx")
+
+
+def iter_mapped_records(rows, columns):
+    """{column: value} per data row; cells under a None column are dropped."""
+    for values in rows:
+        record = {}
+        for col, value in zip(columns, values):
+            if col is None:
+                continue
+            if isinstance(value, str):
+                value = value.strip()
+            record[col] = value if value != "" else None
+        if any(v is not None for v in record.values()):
+            yield record
+
+
+def iter_stock_records(path: str, sheet: str | None = None):
+    """Yield one {column: value} dict per data row, streaming from disk."""
+    rows = iter_sheet_rows(path, sheet)
+    header = next(rows, None)
+    if header is None:
+        return
+    yield from iter_mapped_records(rows, _map_header(header))
+
+
+# ================= BATCH PREP =================
+
+def _to_float(value):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    try:
+        return float(str(value).replace(",", ""))
+    except ValueError:
+        return None
+
+
+def _to_int(value):
+    value = _to_float(value)
+    return int(value) if value is not None else None
+
+
+def _to_str(value, limit=None):
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)  # Excel hands numeric part numbers back as floats
+    value = str(value)
+    return value[:limit] if limit else value
+
+
+def content_hash(row: dict) -> str:
+    text = "\x1f".join("" if row[c] is None else repr(row[c]) for c in _HASH_COLUMNS)
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+def prepare_batch(records) -> list:
+    """Coerce types and fill the normalized lookup keys for a batch of raw records."""
+    rows = []
+    for r in records:
+        unique_value = _to_str(r.get("unique_value"))
+        if not unique_value:
+            continue
+        rows.append({
+            "unique_value": unique_value,
+            "unique_value_hash": stock_unique_value_hash(unique_value),
+            "unique_value_norm": stock_lookup_key(unique_value),
+            "part_number": _to_str(r.get("part_number"), 255),
+            "brand_part_no": _to_str(r.get("brand_part_no"), 255),
+            "brand": _to_str(r.get("brand"), 255),
+            "tag": _to_str(r.get("tag"), 500),
+            "item_desc": _to_str(r.get("item_desc")),
+            "price": _to_float(r.get("price")),
+            "qty": _to_int(r.get("qty")),
+        })
+
+    norms = normalize_part_numbers([r["part_number"] for r in rows])
+    for row, norm in zip(rows, norms):
+        row["part_number_norm"] = norm or None
+        row["brand_part_no_norm"] = stock_lookup_key(row["brand_part_no"])
+        row["content_hash"] = content_hash(row)
+
+    # Last occurrence wins within a batch, same as across batches
+    return list({r["unique_value"]: r for r in rows}.values())
+
+
+# ================= WRITER =================
+
+def _upsert_statement(dialect: str):
+    table = Stock.__table__
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+
+        stmt = insert(table)
+        # updated_at moves by itself via ON UPDATE CURRENT_TIMESTAMP
+        return stmt.on_duplicate_key_update(
+            {c: stmt.inserted[c] for c in _UPDATE_COLUMNS}
+        )
+
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise StockImportError(f"Bulk upsert not supported on {dialect}")
+
+    stmt = insert(table)
+    update = {c: stmt.excluded[c] for c in _UPDATE_COLUMNS}
+    update["updated_at"] = func.now()
+    return stmt.on_conflict_do_update(index_elements=["unique_value_hash"], set_=update)
+
+
+def _lookup_keys(row) -> tuple:
+    return row["part_number_norm"], row["brand_part_no_norm"], row["unique_value_norm"]
+
+
+def _changed_rows(rows) -> tuple:
+    """
+    Drop rows whose stored content_hash already matches. Returns
+    (changed_rows, stored {unique_value: (lookup keys, tag)}) so the
+    change feed can name the old keys and tags as well as the new ones.
+    """
+    stored = {}
+    for uv, stored_hash, norm, brand_norm, tag in db.session.execute(
+        select(Stock.unique_value, Stock.content_hash, Stock.part_number_norm,
+               Stock.brand_part_no_norm, Stock.tag)
+        .where(Stock.unique_value_hash.in_([r["unique_value_hash"] for r in rows]))
+    ):
+        stored[uv] = (stored_hash, (norm, brand_norm), tag)
+
+    changed = [r for r in rows if stored.get(r["unique_value"], (None,))[0] != r["content_hash"]]
+    return changed, {uv: (keys, tag) for uv, (_, keys, tag) in stored.items()}
+
+
+def _prune_missing(seen: set, batch_size: int, publish: bool) -> int:
+    """
+    Delete rows whose unique_value_hash is not in `seen`, one primary-key
+    range at a time. Rows without a hash (no unique_value) are left alone.
+    Each deleted batch goes on the change feed with its old keys and tags.
+    """
+    deleted = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(Stock.id, Stock.unique_value_hash, Stock.part_number_norm,
+                   Stock.brand_part_no_norm, Stock.unique_value_norm, Stock.tag)
+            .where(Stock.id > last_id, Stock.unique_value_hash.isnot(None))
+            .order_by(Stock.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        gone = [r for r in rows if r.unique_value_hash not in seen]
+        if not gone:
+            continue
+        db.session.execute(delete(Stock).where(Stock.id.in_([r.id for r in gone])))
+        db.session.commit()
+        deleted += len(gone)
+
+        if publish:
+            publish = publish_stock_changes(
+                deleted_ids=[r.id for r in gone],
+                keys=[k for r in gone for k in (r.part_number_norm, r.brand_part_no_norm, r.unique_value_norm)],
+                tags=[r.tag for r in gone],
+            )
+    db.session.rollback()  # end the read transaction
+    return deleted
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def import_stock_file(path: str, sheet: str | None = None, batch_size: int = BATCH_SIZE,
+                      rebuild_index: bool = True, delta: bool = False, prune: bool = False) -> dict:
+    """
+    Stream a CSV/XLSX export into `stock`. Each batch is committed on its own,
+    so a failure part-way leaves the earlier batches applied (re-running the
+    same file is safe: it is an upsert).
+
+    delta=True writes only rows whose content hash changed and publishes
+    per-batch changes instead of asking consumers for a full reload.
+
+    prune=True then deletes the rows that were not in the file.
+    """
+    start = time.time()
+    rss_before = _peak_rss_mb()
+    stmt = _upsert_statement(db.engine.dialect.name)
+
+    read = written = unchanged = deleted = 0
+    batch = []
+    seen = set()  # unique_value hashes in the file, for prune
+    feed_ok = True  # stop publishing after the first failure; stamps still work
+
+    def flush():
+        nonlocal written, unchanged, feed_ok
+        rows = prepare_batch(batch)
+        batch.clear()
+        if not rows:
+            return
+        if prune:
+            seen.update(r["unique_value_hash"] for r in rows)
+
+        if delta:
+            prepared = len(rows)
+            rows, stored = _changed_rows(rows)
+            unchanged += prepared - len(rows)
+            if not rows:
+                db.session.rollback()  # end the read transaction
+                return
+
+        db.session.execute(stmt, rows)
+        db.session.commit()
+        written += len(rows)
+
+        if delta and feed_ok:
+            old = [stored[r["unique_value"]] for r in rows if r["unique_value"] in stored]
+            feed_ok = publish_stock_changes(
+                unique_values=[r["unique_value"] for r in rows],
+                keys=[k for r in rows for k in _lookup_keys(r)] + [k for keys, _ in old for k in keys],
+                tags=[r["tag"] for r in rows] + [tag for _, tag in old],
+            )
+
+    for record in iter_stock_records(path, sheet):
+        batch.append(record)
+        read += 1
+        if len(batch) >= batch_size:
+            flush()
+            if read % (batch_size * 25) == 0:
+                print(f"📥 Stock import: {read} rows read...")
+    flush()
+
+    if prune:
+        if not seen:
+            raise StockImportError("No rows with a unique_value in the file; refusing to prune the whole stock table")
+        deleted = _prune_missing(seen, batch_size, publish=delta and feed_ok)
+        print(f"🗑️ Stock import: {deleted} rows not in the file deleted")
+
+    if (written or deleted) and not delta:
+        publish_stock_changes(reload=True)
+
+    if rebuild_index:
+        from .stock_index import get_stock_index
+
+        index = get_stock_index()
+        if index is not None and delta:
+            index.refresh(force=True)
+        elif index is not None:
+            index.load()
+        # Other processes follow the change feed (or the stock stamp)
+
+    elapsed = time.time() - start
+    peak = _peak_rss_mb()
+    report = {
+        "file": os.path.basename(path),
+        "mode": "delta" if delta else "full",
+        "rows_read": read,
+        "rows_written": written,
+        "rows_unchanged": unchanged,
+        "rows_skipped": read - written - unchanged,
+        "rows_deleted": deleted,
+        "seconds": round(elapsed, 2),
+        "rows_per_second": round(read / elapsed) if elapsed else read,
+        "peak_memory_mb": round(peak, 1),
+        # Peak RSS growth during the import (process baseline excluded)
+        "import_memory_mb": round(peak - rss_before, 1),
+    }
+    print(f"✅ Stock import done: {report}")
+    return report
@@ -0,0 +1,309 @@
+"""
+In-process, read-only index over the `stock` table.
+
+Built once in the RQ worker parent before it forks work horses, so every
+job reads it copy-on-write instead of round-tripping to MySQL. The parent
+refreshes it between jobs: first from the stock change feed (delta
+syncs name exactly which rows changed), then, at most every
+STOCK_INDEX_REFRESH_SECONDS, from the stock version stamp
+(MAX(updated_at), MAX(id), COUNT(*)), which catches writers that do not
+publish to the feed.
+"""
+
+import heapq
+import sys
+import time
+from collections import namedtuple
+
+from flask import current_app
+from sqlalchemy import func, or_, select
+
+from ..extensions import db
+from ..models import Stock, stock_unique_value_hash
+from .fuzzy_part_matcher import PartNumberMatcher
+from .stock_changes import latest_stock_change_id, read_stock_changes
+from .stock_text_search import StockTextIndex
+
+# Compact row record: only what replies need, no ORM state attached
+StockRow = namedtuple("StockRow", "id part_number brand item_desc price qty tag")
+
+_LOAD_COLUMNS = (
+    Stock.id,
+    Stock.part_number,
+    Stock.brand,
+    Stock.item_desc,
+    Stock.price,
+    Stock.qty,
+    Stock.tag,
+    Stock.part_number_norm,
+    Stock.brand_part_no_norm,
+    Stock.unique_value_norm,
+)
+
+# Every normalized number a row can be found by; the index files rows under the same keys
+LOOKUP_KEY_COLUMNS = (Stock.part_number_norm, Stock.brand_part_no_norm, Stock.unique_value_norm)
+
+_intern = sys.intern
+
+
+def sibling_rank_key(row) -> tuple:
+    """In stock first, then cheapest, unpriced last (mirrors the SQL ranking)."""
+    return (
+        0 if (row.qty or 0) > 0 else 1,
+        row.price is None,
+        row.price or 0,
+    )
+
+
+def lookup_key_filter(cleaned_pns):
+    """SQL form of StockIndex.lookup: rows with any lookup key in cleaned_pns."""
+    cleaned_pns = list(cleaned_pns)
+    return or_(*(column.in_(cleaned_pns) for column in LOOKUP_KEY_COLUMNS))
+
+
+def stock_version() -> tuple:
+    """
+    Cheap stamp that changes whenever stock rows are written or deleted.
+    MAX() on indexed columns is an index dive; COUNT(*) catches deletes.
+    """
+    row = db.session.execute(
+        select(func.max(Stock.updated_at), func.max(Stock.id), func.count(Stock.id))
+    ).one()
+    return tuple(row)
+
+
+class StockIndex:
+    """Normalized part-number keys and tags mapped to compact StockRow records."""
+
+    def __init__(self):
+        self.rows = {}      # id -> StockRow
+        self.by_key = {}    # normalized part_number / brand_part_no / unique_value -> [ids]
+        self.by_tag = {}    # tag -> [ids]
+        self._keys = {}     # id -> keys the row is filed under (for incremental updates)
+        self.fuzzy = PartNumberMatcher()  # OCR/typo-tolerant view of by_key
+        self.text = StockTextIndex()      # BM25 over item_desc / brand / tag
+        self.version = None
+        self.last_checked = 0.0
+        self.feed_id = None  # last change-feed entry applied
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    # ================= LOOKUPS =================
+
+    def lookup(self, cleaned_pns) -> list:
+        """Rows whose normalized keys match any of the given normalized numbers."""
+        ids = {}
+        for key in cleaned_pns:
+            for row_id in self.by_key.get(key, ()):
+                ids[row_id] = None
+        return [self.rows[i] for i in ids]
+
+    def siblings(self, tags, limit: int | None = None) -> list:
+        """Rows filed under the given tags, best `limit` per tag when set."""
+        result = []
+        for tag in tags:
+            ids = self.by_tag.get(tag, ())
+            rows = (self.rows[i] for i in ids)
+            if limit is not None and len(ids) > limit:
+                result.extend(heapq.nsmallest(limit, rows, key=sibling_rank_key))
+            else:
+                result.extend(sorted(rows, key=sibling_rank_key))
+        return result
+
+    def search_text(self, name: str, rules: dict | None = None, k: int = 5, vehicle: str = "") -> list:
+        """BM25 part-name search. Returns [(StockRow, score, coverage)] best first."""
+        hits = self.text.search(name, rules, k=k, vehicle=vehicle)
+        return [(self.rows[row_id], score, coverage) for row_id, score, coverage in hits]
+
+    def search(self, cleaned_pns, sibling_limit: int | None = None) -> list:
+        """
+        Exact matches plus the top `sibling_limit` siblings of each matched tag
+        (same contract as search_parts_in_db). Matches are always kept.
+        """
+        matches = self.lookup(cleaned_pns)
+        tags = {r.tag for r in matches if r.tag}
+        if not tags:
+            return matches
+
+        merged = {r.id: r for r in matches}
+        for row in self.siblings(tags, sibling_limit):
+            merged.setdefault(row.id, row)
+        return list(merged.values())
+
+    # ================= MAINTENANCE =================
+
+    def _add(self, raw) -> None:
+        row_id = raw.id
+        if row_id in self.rows:
+            self._remove(row_id)
+
+        tag = _intern(raw.tag) if raw.tag else None
+        row = StockRow(
+            row_id,
+            raw.part_number,
+            _intern(raw.brand) if raw.brand else None,
+            raw.item_desc,
+            raw.price,
+            raw.qty,
+            tag,
+        )
+        keys = {raw.part_number_norm, raw.brand_part_no_norm, raw.unique_value_norm}
+        keys.discard(None)
+        keys = tuple(_intern(k) for k in keys)
+
+        self.rows[row_id] = row
+        self._keys[row_id] = keys
+        for key in keys:
+            self.by_key.setdefault(key, []).append(row_id)
+            self.fuzzy.add(key)
+        if tag:
+            self.by_tag.setdefault(tag, []).append(row_id)
+        self.text.add(row)
+
+    def _remove(self, row_id: int) -> None:
+        row = self.rows.pop(row_id, None)
+        if row is None:
+            return
+        self.text.remove(row_id)
+
+        for key in self._keys.pop(row_id, ()):
+            ids = self.by_key.get(key)
+            if ids:
+                ids.remove(row_id)
+                if not ids:
+                    del self.by_key[key]
+                    self.fuzzy.remove(key)
+        if row.tag:
+            ids = self.by_tag.get(row.tag)
+            if ids:
+                ids.remove(row_id)
+                if not ids:
+                    del self.by_tag[row.tag]
+
+    def apply_changes(self) -> bool:
+        """
+        Apply new change-feed entries. Returns True if the index changed.
+        Re-reads only the named rows and drops deleted ones; a reload entry,
+        or a feed trimmed past our position, falls back to a full build.
+        """
+        if self.feed_id is None:
+            return False
+        try:
+            last_id, changes = read_stock_changes(self.feed_id)
+        except Exception as e:
+            print(f"⚠️ Stock change feed unavailable: {e}")
+            return False
+        if not changes:
+            self.feed_id = last_id  # skips unreadable entries
+            return False
+
+        if any(c.get("reload") for c in changes):
+            self.load()
+            return True
+
+        deleted_ids = {row_id for c in changes for row_id in c.get("deleted_ids", ())}
+        for row_id in deleted_ids:
+            self._remove(row_id)
+
+        unique_values = sorted({uv for c in changes for uv in c.get("unique_values", ())})
+        touched = 0
+        for i in range(0, len(unique_values), 1000):
+            chunk = [stock_unique_value_hash(uv) for uv in unique_values[i:i + 1000]]
+            for raw in db.session.execute(
+                select(*_LOAD_COLUMNS).where(Stock.unique_value_hash.in_(chunk))
+            ):
+                self._add(raw)
+                touched += 1
+        self.feed_id = last_id
+        print(f"🔄 Stock index: {touched} rows updated, {len(deleted_ids)} removed from change feed")
+        return True
+
+    def load(self) -> None:
+        """Full (re)build, streamed from the DB in batches."""
+        start = time.time()
+        try:
+            # Taken before reading rows: anything published later is replayed
+            feed_id = latest_stock_change_id()
+        except Exception:
+            feed_id = None
+        version = stock_version()
+
+        self.rows, self.by_key, self.by_tag, self._keys = {}, {}, {}, {}
+        self.fuzzy = PartNumberMatcher(current_app.config.get("FUZZY_MATCH_MIN_LENGTH", 6))
+        self.text = StockTextIndex()
+        stmt = select(*_LOAD_COLUMNS).execution_options(yield_per=5000)
+        for raw in db.session.execute(stmt):
+            self._add(raw)
+
+        self.version = version
+        self.feed_id = feed_id
+        self.last_checked = time.monotonic()
+        print(f"📚 Stock index built: {len(self.rows)} rows, {len(self.by_key)} keys, "
+              f"{len(self.by_tag)} tags in {time.time() - start:.1f}s")
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Apply stock changes: the change feed on every call, the version stamp
+        at most every STOCK_INDEX_REFRESH_SECONDS unless forced.
+        Returns True if anything changed.
+        """
+        changed = self.apply_changes()
+
+        now = time.monotonic()
+        interval = current_app.config.get("STOCK_INDEX_REFRESH_SECONDS", 60)
+        if not force and now - self.last_checked < interval:
+            return changed
+        self.last_checked = now
+
+        version = stock_version()
+        if version == self.version:
+            return changed
+
+        since = self.version[0] if self.version else None
+        if since is None:
+            self.load()
+            return True
+
+        # >= so rows written in the same second as the old stamp are re-read
+        stmt = select(*_LOAD_COLUMNS).where(Stock.updated_at >= since)
+        touched = 0
+        for raw in db.session.execute(stmt):
+            self._add(raw)
+            touched += 1
+
+        if len(self.rows) != version[2]:
+            # Deletes leave no trace in updated_at; only a reload can see them
+            self.load()
+        else:
+            self.version = version
+            print(f"🔄 Stock index refreshed: {touched} rows updated")
+        return True
+
+
+# ================= SINGLETON =================
+
+_index: StockIndex | None = None
+
+
+def get_stock_index() -> StockIndex | None:
+    """The loaded index, or None when this process did not build one."""
+    return _index
+
+
+def build_stock_index() -> StockIndex:
+    global _index
+    index = StockIndex()
+    index.load()
+    _index = index
+    return index
+
+
+def refresh_stock_index(force: bool = False) -> bool:
+    if _index is None:
+        return False
+    try:
+        return _index.refresh(force=force)
+    except Exception as e:
+        print(f"⚠️ Stock index refresh failed (serving previous snapshot): {e}")
+        return False
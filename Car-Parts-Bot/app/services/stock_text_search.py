@@ -0,0 +1,46 @@
+"""
+BM25 full-text search over stock item_desc, brand and tag.
+
+Maintained by StockIndex alongside its part-number keys, so it is built
+once per worker and updated incrementally with every stock refresh.
+"""
+
+from .bm25 import BM25Index, tokenize
+from .part_aliases import expand_query
+
+
+def row_tokens(row) -> list:
+    return tokenize(" ".join(filter(None, (row.item_desc, row.brand, row.tag))))
+
+
+class StockTextIndex:
+    def __init__(self):
+        self.bm25 = BM25Index()
+        self._tokens = {}  # row id -> tokens (needed to un-index on update)
+
+    def __len__(self) -> int:
+        return len(self.bm25)
+
+    def add(self, row) -> None:
+        tokens = row_tokens(row)
+        if row.id in self._tokens:
+            self.remove(row.id)
+        self._tokens[row.id] = tuple(set(tokens))
+        self.bm25.add(row.id, tokens)
+
+    def remove(self, row_id: int) -> None:
+        tokens = self._tokens.pop(row_id, None)
+        if tokens is not None:
+            self.bm25.remove(row_id, tokens)
+
+    def search(self, name: str, rules: dict | None = None, k: int = 5, vehicle: str = "") -> list:
+        """
+        Rank stock rows for a part name. Returns [(row_id, score, coverage)],
+        where coverage is the idf-weighted share of query terms the row
+        matched (1.0 = every term found). `vehicle` (make and model) is
+        searched along with the name, so a row for another car can't reach
+        full coverage.
+        """
+        positions = expand_query(name, rules or {})
+        positions += [{t} for t in dict.fromkeys(tokenize(vehicle))]
+        return self.bm25.search(positions, k=k)
@@ -0,0 +1,280 @@
+"""
+OEM supersession / cross-reference graph.
+
+Catalogs often return a superseded number, or another maker's equivalent,
+for a part we stock under its current number. The part_supersessions
+table holds those edges (normalized); SupersessionIndex keeps them as an
+in-memory adjacency map so a requested number expands to its equivalents
+with a few dict lookups, walking at most SUPERSESSION_MAX_DEPTH edges.
+
+Supersession edges are followed old -> new only (a replacement fits where
+the old part did, not necessarily the other way round); cross references
+are followed both ways. Without a loaded index the same walk runs in SQL,
+one query per depth level.
+"""
+
+import time
+
+from flask import current_app
+from sqlalchemy import and_, func, or_, select
+
+from ..extensions import db
+from ..models import PartSupersession
+from .part_numbers import normalize_part_numbers
+from .stock_import import BATCH_SIZE, StockImportError, iter_mapped_records, iter_sheet_rows
+
+SUPERSESSION = "supersession"
+CROSS_REFERENCE = "cross_reference"
+
+_HEADER_ALIASES = {
+    "partnumber": "part_number",
+    "partno": "part_number",
+    "oldpartnumber": "part_number",
+    "old": "part_number",
+    "from": "part_number",
+    "equivalent": "equivalent",
+    "replacement": "equivalent",
+    "supersededby": "equivalent",
+    "newpartnumber": "equivalent",
+    "new": "equivalent",
+    "to": "equivalent",
+    "crossreference": "equivalent",
+    "relation": "relation",
+    "type": "relation",
+    "source": "source",
+}
+
+
+def _edge_relation(value) -> str:
+    text = str(value or "").lower()
+    return CROSS_REFERENCE if text.startswith(("cross", "xref", "equiv", "alt")) else SUPERSESSION
+
+
+# ================= INDEX =================
+
+class SupersessionIndex:
+    def __init__(self):
+        self.edges = {}  # norm -> ((neighbour norm, relation), ...)
+        self.version = None
+        self.last_checked = 0.0
+
+    def __len__(self) -> int:
+        return len(self.edges)
+
+    def _link(self, src: str, dst: str, relation: str) -> None:
+        current = self.edges.get(src, ())
+        if all(n != dst for n, _ in current):
+            self.edges[src] = current + ((dst, relation),)
+
+    def load(self) -> None:
+        start = time.time()
+        version = supersession_version()
+        self.edges = {}
+        stmt = select(
+            PartSupersession.part_number_norm,
+            PartSupersession.equivalent_norm,
+            PartSupersession.relation,
+        ).execution_options(yield_per=5000)
+        count = 0
+        for src, dst, relation in db.session.execute(stmt):
+            self._link(src, dst, relation)
+            if relation == CROSS_REFERENCE:
+                self._link(dst, src, relation)
+            count += 1
+        self.version = version
+        self.last_checked = time.monotonic()
+        print(f"🔗 Supersession index built: {count} edges, {len(self.edges)} numbers "
+              f"in {time.time() - start:.1f}s")
+
+    def refresh(self, force: bool = False) -> bool:
+        now = time.monotonic()
+        interval = current_app.config.get("STOCK_INDEX_REFRESH_SECONDS", 60)
+        if not force and now - self.last_checked < interval:
+            return False
+        self.last_checked = now
+        if supersession_version() == self.version:
+            return False
+        self.load()
+        return True
+
+    def equivalents(self, norms, max_depth: int = 3) -> dict:
+        """{equivalent norm: (requested norm, relation)} within max_depth edges."""
+        return _walk(norms, max_depth, lambda frontier: (
+            (src, dst, relation)
+            for src in frontier
+            for dst, relation in self.edges.get(src, ())
+        ))
+
+
+def _sql_neighbours(frontier):
+    stmt = select(
+        PartSupersession.part_number_norm,
+        PartSupersession.equivalent_norm,
+        PartSupersession.relation,
+    ).where(or_(
+        PartSupersession.part_number_norm.in_(frontier),
+        and_(PartSupersession.equivalent_norm.in_(frontier),
+             PartSupersession.relation == CROSS_REFERENCE),
+    ))
+    for src, dst, relation in db.session.execute(stmt):
+        if src in frontier:
+            yield src, dst, relation
+        if relation == CROSS_REFERENCE and dst in frontier:
+            yield dst, src, relation
+
+
+def _walk(norms, max_depth: int, neighbours) -> dict:
+    """
+    Bounded breadth-first walk. Each found number remembers which requested
+    number it came from, and is a cross reference if any edge on the way was.
+    """
+    origin = {n: (n, SUPERSESSION) for n in norms if n}
+    frontier = set(origin)
+    found = {}
+    for _ in range(max_depth):
+        if not frontier:
+            break
+        nxt = set()
+        # Sorted so SQL and in-memory walks attribute shared equivalents alike
+        for src, dst, relation in sorted(neighbours(frontier)):
+            if dst in origin or dst in found:
+                continue
+            root, path_relation = origin.get(src) or found[src]
+            found[dst] = (root, CROSS_REFERENCE if CROSS_REFERENCE in (relation, path_relation) else SUPERSESSION)
+            nxt.add(dst)
+        frontier = nxt
+    return found
+
+
+def supersession_version() -> tuple:
+    row = db.session.execute(
+        select(func.max(PartSupersession.id), func.count(PartSupersession.id))
+    ).one()
+    return tuple(row)
+
+
+def expand_part_numbers(norms) -> dict:
+    """
+    Equivalent numbers for a set of normalized part numbers:
+    {equivalent norm: (requested norm, relation)}. Never raises.
+    """
+    max_depth = current_app.config.get("SUPERSESSION_MAX_DEPTH", 3)
+    if max_depth <= 0 or not norms:
+        return {}
+    try:
+        if _index is not None:
+            return _index.equivalents(norms, max_depth)
+        return _walk(norms, max_depth, _sql_neighbours)
+    except Exception as e:
+        print(f"⚠️ Supersession lookup failed: {e}")
+        return {}
+
+
+# ================= SINGLETON =================
+
+_index: SupersessionIndex | None = None
+
+
+def get_supersession_index() -> SupersessionIndex | None:
+    return _index
+
+
+def build_supersession_index() -> SupersessionIndex:
+    global _index
+    index = SupersessionIndex()
+    index.load()
+    _index = index
+    return index
+
+
+def refresh_supersession_index(force: bool = False) -> bool:
+    if _index is None:
+        return False
+    try:
+        return _index.refresh(force=force)
+    except Exception as e:
+        print(f"⚠️ Supersession index refresh failed (serving previous snapshot): {e}")
+        return False
+
+
+# ================= BULK LOAD =================
+
+def _upsert_statement(dialect: str):
+    table = PartSupersession.__table__
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+
+        stmt = insert(table)
+        return stmt.on_duplicate_key_update(relation=stmt.inserted.relation, source=stmt.inserted.source)
+
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise StockImportError(f"Bulk upsert not supported on {dialect}")
+
+    stmt = insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=["part_number_norm", "equivalent_norm"],
+        set_={"relation": stmt.excluded.relation, "source": stmt.excluded.source},
+    )
+
+
+def import_supersession_file(path: str, sheet: str | None = None, source: str | None = None,
+                             batch_size: int = BATCH_SIZE) -> dict:
+    """
+    Stream a CSV/XLSX of (part_number, equivalent[, relation, source]) pairs
+    into part_supersessions. Re-loading the same file is safe (upsert).
+    """
+    start = time.time()
+    rows = iter_sheet_rows(path, sheet)
+    header = next(rows, None)
+    if header is None:
+        return {"rows_read": 0, "edges_written": 0}
+    columns = [_HEADER_ALIASES.get("".join(ch for ch in str(h or "").lower() if ch.isalnum()))
+               for h in header]
+    if "part_number" not in columns or "equivalent" not in columns:
+        raise StockImportError("Supersession file needs part_number and equivalent columns")
+
+    stmt = _upsert_statement(db.engine.dialect.name)
+    default_source = source or path.rsplit("/", 1)[-1][:100]
+    read = written = 0
+    batch = []
+
+    def flush():
+        nonlocal written
+        srcs = normalize_part_numbers([str(r.get("part_number") or "") for r in batch])
+        dsts = normalize_part_numbers([str(r.get("equivalent") or "") for r in batch])
+        edges = {}
+        for r, src, dst in zip(batch, srcs, dsts):
+            if src and dst and src != dst:
+                edges[(src, dst)] = {
+                    "part_number_norm": src,
+                    "equivalent_norm": dst,
+                    "relation": _edge_relation(r.get("relation")),
+                    "source": str(r.get("source") or default_source)[:100],
+                }
+        batch.clear()
+        if edges:
+            db.session.execute(stmt, list(edges.values()))
+            db.session.commit()
+            written += len(edges)
+
+    for record in iter_mapped_records(rows, columns):
+        batch.append(record)
+        read += 1
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+
+    if _index is not None:
+        _index.load()
+
+    report = {
+        "rows_read": read,
+        "edges_written": written,
+        "seconds": round(time.time() - start, 2),
+    }
+    print(f"✅ Supersession import done: {report}")
+    return report
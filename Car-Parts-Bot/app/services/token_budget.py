@@ -0,0 +1,215 @@
+"""
+Token accounting and per-call budgets for OpenAI chat calls.
+
+- count_tokens(): exact with tiktoken (o200k_base, the gpt-4o / 4o-mini
+  encoding) when it is installed, otherwise a ~4 chars/token estimate.
+- prompt_budget(call_type): max prompt tokens for a call type;
+  fit_sections() trims the lowest-priority prompt sections until the prompt
+  fits, fit_text() does the same for a single free-text input.
+- max_reply_tokens(call_type, ...): max_tokens sized from the expected
+  reply instead of a blanket 10000. super_intent grows with the number of
+  parts it has to list, up to the model's output limit;
+  retry_reply_tokens() is the larger budget for a reply that was cut off.
+
+Prompt budgets can be overridden per call type, e.g.
+TOKEN_BUDGETS="super_intent=8000,voice_clean=2000".
+"""
+
+import json
+from dataclasses import dataclass
+from typing import Callable
+
+from flask import current_app
+
+from .reference_index import estimate_tokens
+
+try:
+    import tiktoken
+except ImportError:  # optional: estimates are close enough for budgeting
+    tiktoken = None
+
+# Max prompt tokens per call type
+DEFAULT_BUDGETS = {
+    "super_intent": 16000,
+    "format": 8000,
+    "extract_codes": 4000,
+    "part_names": 3000,
+    "normalize": 2000,
+    "voice_clean": 4000,
+    "language": 300,  # a sample is plenty to detect a language
+}
+
+# Expected reply size: (base, per prompt-input token, per listed item, cap)
+REPLY_SIZES = {
+    # Every matched part gets its own block; the cap is gpt-4o's output limit
+    "super_intent": (500, 0, 120, 16384),
+    "format": (200, 1.5, 0, 4096),
+    "extract_codes": (200, 0.5, 0, 1500),
+    "part_names": (150, 0.5, 0, 1000),
+    "normalize": (100, 0, 30, 1000),
+    "voice_clean": (150, 2.5, 0, 3000),
+    "language": (10, 0, 0, 10),
+    "vision_ocr": (1000, 0, 0, 1500),
+}
+
+IMAGE_TOKENS = 765  # one high-detail 512px-tiled image, roughly
+_MESSAGE_OVERHEAD = 4
+_REPLY_PRIMING = 3
+_MARKER_TOKENS = 12  # the "[... N omitted ...]" line
+
+_encoding = None
+_encoding_failed = False
+
+
+def _tiktoken_encoding():
+    global _encoding, _encoding_failed
+    if _encoding is None and tiktoken is not None and not _encoding_failed:
+        try:
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as e:  # encoding file not cached and no network
+            _encoding_failed = True
+            print(f"⚠️ tiktoken unavailable, estimating tokens: {e}")
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    enc = _tiktoken_encoding()
+    return len(enc.encode(text, disallowed_special=())) if enc else estimate_tokens(text)
+
+
+def count_message_tokens(messages: list) -> int:
+    total = _REPLY_PRIMING
+    for message in messages:
+        content = message.get("content")
+        total += _MESSAGE_OVERHEAD
+        if isinstance(content, str):
+            total += count_tokens(content)
+        else:
+            for part in content or ():
+                total += count_tokens(part.get("text")) if part.get("type") == "text" else IMAGE_TOKENS
+    return total
+
+
+def _override(call_type: str, default: int) -> int:
+    for item in (current_app.config.get("TOKEN_BUDGETS") or "").split(","):
+        name, _, value = item.partition("=")
+        if name.strip() == call_type and value.strip().isdigit():
+            return int(value)
+    return default
+
+
+def prompt_budget(call_type: str) -> int | None:
+    if not current_app.config.get("TOKEN_BUDGET_ENABLED", True):
+        return None
+    default = DEFAULT_BUDGETS.get(call_type)
+    return _override(call_type, default) if default else None
+
+
+def max_reply_tokens(call_type: str, input_tokens: int = 0, items: int = 0) -> int:
+    base, per_input, per_item, cap = REPLY_SIZES[call_type]
+    return min(int(base + per_input * input_tokens + per_item * items), cap)
+
+
+def retry_reply_tokens(call_type: str, max_tokens: int) -> int | None:
+    """Budget for retrying a reply cut off at max_tokens (None: already at the cap)."""
+    cap = REPLY_SIZES[call_type][3]
+    return min(max_tokens * 2, cap) if max_tokens < cap else None
+
+
+# ================= TRIMMING =================
+
+def truncate_middle(text: str, max_tokens: int) -> str:
+    """Keep the head (2/3) and tail (1/3) of text within max_tokens."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    max_tokens -= _MARKER_TOKENS
+    if max_tokens <= 0:
+        return ""
+    enc = _tiktoken_encoding()
+    if enc:
+        tokens = enc.encode(text, disallowed_special=())
+        head, tail = (max_tokens * 2) // 3, max_tokens // 3
+        omitted = len(tokens) - head - tail
+        return (enc.decode(tokens[:head]) + f"\n[... {omitted} tokens omitted ...]\n"
+                + (enc.decode(tokens[-tail:]) if tail else ""))
+    chars = max_tokens * 4
+    head, tail = (chars * 2) // 3, chars // 3
+    return (text[:head] + f"\n[... {len(text) - head - tail} characters omitted ...]\n"
+            + (text[-tail:] if tail else ""))
+
+
+@dataclass
+class Section:
+    """One piece of a prompt. priority None: never trimmed; lower is trimmed first."""
+    name: str
+    text: str
+    priority: int | None = None
+    shrink: Callable[[str, int], str] | None = None  # (text, target tokens) -> shorter text
+
+
+def fit_sections(call_type: str, sections: list, budget: int | None) -> list:
+    """Trim sections (lowest priority first) until their total fits `budget`."""
+    counts = [count_tokens(s.text) for s in sections]
+    total = sum(counts)
+    if budget is None or total <= budget:
+        return sections
+
+    over = total - budget
+    trimmed = []
+    order = sorted((i for i, s in enumerate(sections) if s.priority is not None),
+                   key=lambda i: sections[i].priority)
+    for i in order:
+        if over <= 0:
+            break
+        section = sections[i]
+        if not counts[i]:
+            continue
+        target = max(counts[i] - over, 0)
+        section.text = (section.shrink or truncate_middle)(section.text, target)
+        now = count_tokens(section.text)
+        over -= counts[i] - now
+        trimmed.append(f"{section.name} {counts[i]}->{now}")
+    print(f"✂️ [TokenBudget] {call_type}: {total} prompt tokens > budget {budget}; trimmed "
+          f"{', '.join(trimmed) or 'nothing'}" + (f"; still {over} over (fixed sections)" if over > 0 else ""))
+    return sections
+
+
+def fit_text(call_type: str, text: str, fixed_tokens: int = 0) -> str:
+    """Trim a call's single free-text input so prompt + input fit the budget."""
+    budget = prompt_budget(call_type)
+    if budget is None or not text:
+        return text
+    return fit_sections(call_type, [Section("input", text, priority=0)], max(budget - fixed_tokens, 0))[0].text
+
+
+# ================= PARTS =================
+
+_PART_NOISE = {"debug_error"}
+
+
+def compact_parts(parts: list) -> list:
+    """Parts without empty / debug fields (what the prompt actually needs)."""
+    return [
+        {k: v for k, v in p.items() if v not in (None, "", [], {}) and k not in _PART_NOISE}
+        for p in parts or ()
+    ]
+
+
+def parts_json(parts: list, max_tokens: int | None = None) -> str:
+    """
+    JSON for the prompt. Over max_tokens, keeps the first parts (exact
+    matches come first) and summarises the rest by part number.
+    """
+    parts = compact_parts(parts)
+    text = json.dumps(parts, default=str)
+    if max_tokens is None or count_tokens(text) <= max_tokens:
+        return text
+    for keep in range(len(parts) - 1, -1, -1):
+        rest = [p.get("part_number") for p in parts[keep:] if p.get("part_number")]
+        summary = {"more_parts_not_shown": len(parts) - keep, "part_numbers": rest[:20]}
+        text = json.dumps(parts[:keep] + [summary], default=str)
+        if count_tokens(text) <= max_tokens:
+            return text
+    return text
@@ -15,7 +15,10 @@ from typing import Tuple, Dict, Any
 
 import requests
 from flask import current_app
-from openai import OpenAI
+
+from .llm_cache import cached_chat_completion
+from .openai_clients import get_openai_client
+from .token_budget import max_reply_tokens
 
 
 # --------------------------
@@ -97,15 +100,15 @@ def extract_text_from_image(img_bytes: bytes, content_type: str) -> str:
     """
     General OCR using GPT Vision. Returns the raw extracted text description.
     """
-    api_key = current_app.config.get("OPENAI_API_KEY")
-    client = OpenAI(api_key=api_key)
+    client = get_openai_client()
     model = current_app.config.get("OPENAI_VISION_MODEL") or "gpt-4o-mini"
     
     image_b64 = base64.b64encode(img_bytes).decode("utf-8")
     mime = content_type or "image/jpeg"
     
     try:
-        response = client.chat.completions.create(
+        response = cached_chat_completion(
+            client, "vision_ocr",
             model=model,
             messages=[
                 {"role": "system", "content": "You are an OCR assistant."},
@@ -117,7 +120,7 @@ def extract_text_from_image(img_bytes: bytes, content_type: str) -> str:
                     ]
                 }
             ],
-            max_tokens=1000
+            max_tokens=max_reply_tokens("vision_ocr")
         )
         return response.choices[0].message.content.strip()
     except Exception as e:
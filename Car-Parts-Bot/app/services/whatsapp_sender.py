@@ -1,5 +1,7 @@
 import requests
 import json
+import queue
+import threading
 from flask import current_app
 from app.redis_client import redis_client
 
@@ -43,3 +45,51 @@ def send_whatsapp_text(wa_id: str, text: str):
         except Exception as e:
             print(f"❌ [WhatsApp Exception]: {e}")
 
+
+
+# Sent after part of a streamed reply when the rest can't be delivered
+FOLLOW_UP_NOTICE = "Sorry, I couldn't finish that reply. Our team will follow up with you shortly."
+
+
+class WhatsAppStream:
+    """
+    Sends a reply in pieces as they are produced (see run_super_intent's
+    on_partial), in order and without blocking the producer: a background
+    thread posts them, and pieces that queue up while a post is in flight
+    go out together as one message. close() waits for the last one.
+    """
+
+    def __init__(self, wa_id: str):
+        self.wa_id = wa_id
+        self.sent_any = False
+        self.last = None
+        self._app = current_app._get_current_object()
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def __call__(self, text: str) -> None:
+        if not text:
+            return
+        self.sent_any = True
+        self.last = text
+        self._queue.put(text)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="whatsapp-stream", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        with self._app.app_context():
+            done = False
+            while not done:
+                pieces = [self._queue.get()]
+                while not self._queue.empty():
+                    pieces.append(self._queue.get_nowait())
+                done = pieces[-1] is None
+                text = "\n\n".join(p for p in pieces if p)
+                if text:
+                    send_whatsapp_text(self.wa_id, text)
+
+    def close(self, timeout: float = 30) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
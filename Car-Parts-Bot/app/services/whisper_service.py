@@ -1,25 +1,23 @@
-from openai import OpenAI
-from flask import current_app
-
-_client = None
+from .llm_cache import cached_chat_completion
+from .llm_deadlines import call_with_retries
+from .openai_clients import get_openai_client
+from .token_budget import count_tokens, fit_text, max_reply_tokens
 
 def _get_client():
-    global _client
-    if _client is None:
-        api_key = current_app.config.get("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY missing in config")
-        _client = OpenAI(api_key=api_key)
-    return _client
+    client = get_openai_client()
+    if client is None:
+        raise ValueError("OPENAI_API_KEY missing in config")
+    return client
 
 
 def transcribe_audio(audio_bytes: bytes):
     client = _get_client()
 
-    response = client.audio.transcriptions.create(
+    response = call_with_retries("transcribe", lambda timeout: client.with_options(
+        timeout=timeout, max_retries=0).audio.transcriptions.create(
         model="gpt-4o-mini-transcribe",
         file=("audio.ogg", audio_bytes, "audio/ogg")
-    )
+    ), hedge=False)
     print(response)
 
     text = response.text.strip()
@@ -37,16 +35,18 @@ def transcribe_audio(audio_bytes: bytes):
 def detect_language_with_gpt(text: str) -> str:
     client = _get_client()
 
-    resp = client.chat.completions.create(
+    resp = cached_chat_completion(
+        client, "language",
         model="gpt-4o-mini",
         messages=[
             {
                 "role": "system",
                 "content": "Detect the language of the user's text. Respond ONLY with ISO code (en, hi, gu, ta, etc.)."
             },
-            {"role": "user", "content": text}
+            {"role": "user", "content": fit_text("language", text)}
         ],
-        temperature=0
+        temperature=0,
+        max_tokens=max_reply_tokens("language"),
     )
 
     return resp.choices[0].message.content.strip()
@@ -68,13 +68,17 @@ def clean_voice_text(raw_text: str, user_lang: str):
         - If user_lang == "en", 'native' should be the same as 'english'.
         """
 
-    resp = client.chat.completions.create(
+    raw_text = fit_text("voice_clean", raw_text, fixed_tokens=count_tokens(system_prompt))
+    resp = cached_chat_completion(
+        client, "voice_clean",
         model="gpt-4o-mini",
         messages=[
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": raw_text}
         ],
-        temperature=0.2
+        temperature=0.2,
+        # English + native copies of the input
+        max_tokens=max_reply_tokens("voice_clean", count_tokens(raw_text)),
     )
 
     return resp.choices[0].message.content.strip()
@@ -57,13 +57,15 @@
 from .redis_client import redis_client
 from rq import Queue
 
-from .services.whatsapp_sender import send_whatsapp_text
+from .services.whatsapp_sender import FOLLOW_UP_NOTICE, WhatsAppStream, send_whatsapp_text
 from .services.message_processor import process_user_message
 from .services.media_service import download_whatsapp_media
 from .services.whisper_service import transcribe_audio, clean_voice_text
 from .services.document_service import extract_text_from_document
 from .services.media_utils import get_media_url
 from .services.vin_ocr import extract_text_from_image, download_media_blob
+from .services.openai_clients import prewarm_openai
+from .services.llm_deadlines import message_deadline
 
 import json
 
@@ -104,6 +106,13 @@ def _process_single_item(msg_type, content, extra_data=None):
         return ""
     return ""
 
+def _send_failure(user_id, stream, fail_msg):
+    """fail_msg, unless part of the reply already went out: then only the follow-up notice."""
+    if not stream.sent_any:
+        send_whatsapp_text(user_id, fail_msg)
+    elif stream.last != FOLLOW_UP_NOTICE:
+        send_whatsapp_text(user_id, FOLLOW_UP_NOTICE)
+
 def collect_and_process_batch(user_id):
     """
     Waits 6 seconds to collect all incoming messages, then processes them as one.
@@ -114,6 +123,8 @@ def collect_and_process_batch(user_id):
     
     with app.app_context():
         print(f"⏳ Collector started for {user_id}. Waiting 6s...")
+        # Fresh work horse, fresh pool: do the TLS handshakes while we wait
+        prewarm_openai()
         time.sleep(6)
         
         # 1. Drain the buffer
@@ -131,38 +142,45 @@ def collect_and_process_batch(user_id):
 
         print(f"📦 Batch Processing: {len(raw_items)} items for {user_id}")
         
-        unified_texts = []
-        
-        # 2. Process each item
-        for raw in raw_items:
+        # One deadline for every OpenAI call this batch makes (llm_deadlines)
+        with message_deadline():
+            unified_texts = []
+
+            # 2. Process each item
+            for raw in raw_items:
+                try:
+                    item = json.loads(raw)
+                    m_type = item.get("type")
+                    content = item.get("content")
+                    extra = item.get("extra")
+
+                    extracted_text = _process_single_item(m_type, content, extra)
+                    if extracted_text and extracted_text.strip():
+                        unified_texts.append(extracted_text)
+
+                except Exception as e:
+                    print(f"❌ Batch item error: {e}")
+
+            # 3. Aggregate
+            if not unified_texts:
+                final_text = "(Empty or unreadable message)"
+            else:
+                final_text = "\n\n".join(unified_texts)
+
+            print(f"📝 Unified Context: {final_text[:100]}...")
+
+            # 4. Run Core Pipeline
+            stream = WhatsAppStream(user_id)
             try:
-                item = json.loads(raw)
-                m_type = item.get("type")
-                content = item.get("content")
-                extra = item.get("extra")
-                
-                extracted_text = _process_single_item(m_type, content, extra)
-                if extracted_text and extracted_text.strip():
-                    unified_texts.append(extracted_text)
-                    
+                # Long replies start arriving while gpt-4o is still writing them
+                reply = process_user_message(user_id, final_text, on_partial=stream)
+                stream.close()
+                if reply:
+                    send_whatsapp_text(user_id, reply)
             except Exception as e:
-                print(f"❌ Batch item error: {e}")
-
-        # 3. Aggregate
-        if not unified_texts:
-            final_text = "(Empty or unreadable message)"
-        else:
-            final_text = "\n\n".join(unified_texts)
-            
-        print(f"📝 Unified Context: {final_text[:100]}...")
-
-        # 4. Run Core Pipeline
-        try:
-            reply = process_user_message(user_id, final_text)
-            send_whatsapp_text(user_id, reply)
-        except Exception as e:
-            print(f"❌ System error sending reply: {e}")
-            send_whatsapp_text(user_id, "System Error: Unable to process request.")
+                print(f"❌ System error sending reply: {e}")
+                stream.close()
+                _send_failure(user_id, stream, "System Error: Unable to process request.")
 
 
 def process_whatsapp_message(user_id, content, msg_type="text", extra_data=None):
@@ -175,14 +193,44 @@ def process_whatsapp_message(user_id, content, msg_type="text", extra_data=None)
     app = create_app()
 
     with app.app_context():
-        text = _process_single_item(msg_type, content, extra_data)
-        if not text.strip():
-            text = "(Empty message)"
-        
-        try:
-            reply = process_user_message(user_id, text)
-            send_whatsapp_text(user_id, reply)
-        except Exception as e:
-            print(f"❌ Task failed: {e}")
-            fail_msg = "Thank you for your message. I am unable to fetch your details accurately at the moment."
-            send_whatsapp_text(user_id, fail_msg)
\ No newline at end of file
+        prewarm_openai()
+        with message_deadline():
+            text = _process_single_item(msg_type, content, extra_data)
+            if not text.strip():
+                text = "(Empty message)"
+
+            stream = WhatsAppStream(user_id)
+            try:
+                reply = process_user_message(user_id, text, on_partial=stream)
+                stream.close()
+                if reply:
+                    send_whatsapp_text(user_id, reply)
+            except Exception as e:
+                print(f"❌ Task failed: {e}")
+                stream.close()
+                fail_msg = "Thank you for your message. I am unable to fetch your details accurately at the moment."
+                _send_failure(user_id, stream, fail_msg)
+
+# ===== STOCK IMPORT =====
+# Own queue, served by its own worker (python worker.py --queues imports)
+# so an hour-long import never holds up chat jobs
+import_queue = Queue("imports", connection=redis_client)
+
+
+def import_stock_job(path, sheet=None, delta=False, prune=False):
+    """Bulk stock import enqueued by the admin API; returns the import report."""
+    from app import create_app
+    from app.services.stock_import import import_stock_file
+
+    app = create_app()
+    with app.app_context():
+        # This runs in a forked work horse: the worker parent refreshes its own
+        # index from the new stock stamp before the next job, so skip it here.
+        return import_stock_file(
+            path,
+            sheet=sheet,
+            batch_size=app.config["STOCK_IMPORT_BATCH_SIZE"],
+            rebuild_index=False,
+            delta=delta,
+            prune=prune,
+        )
@@ -0,0 +1,31 @@
+"""add stock.content_hash for delta syncs
+
+Revision ID: a83e5d2c6b19
+Revises: f52c9b7e1d04
+Create Date: 2026-10-17 19:22:08.415390
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'a83e5d2c6b19'
+down_revision = 'f52c9b7e1d04'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # No backfill: NULL never matches, so the first delta sync writes each
+    # row once and fills the hash in as it goes.
+    if op.get_bind().dialect.name == "mysql":
+        op.execute(
+            "ALTER TABLE stock ADD COLUMN content_hash VARCHAR(32) NULL, "
+            "ALGORITHM=INPLACE, LOCK=NONE"
+        )
+    else:
+        op.add_column('stock', sa.Column('content_hash', sa.String(length=32), nullable=True))
+
+
+def downgrade():
+    op.drop_column('stock', 'content_hash')
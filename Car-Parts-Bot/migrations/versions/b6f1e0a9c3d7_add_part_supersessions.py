@@ -0,0 +1,36 @@
+"""add part_supersessions table
+
+Revision ID: b6f1e0a9c3d7
+Revises: a83e5d2c6b19
+Create Date: 2026-10-17 20:14:37.902615
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'b6f1e0a9c3d7'
+down_revision = 'a83e5d2c6b19'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'part_supersessions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('part_number_norm', sa.String(length=255), nullable=False),
+        sa.Column('equivalent_norm', sa.String(length=255), nullable=False),
+        sa.Column('relation', sa.String(length=20), server_default='supersession', nullable=False),
+        sa.Column('source', sa.String(length=100), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('part_number_norm', 'equivalent_norm', name='uq_part_supersession_pair'),
+    )
+    # Reverse lookups (cross references are walked both ways); forward
+    # lookups are served by the unique constraint's leading column
+    op.create_index('ix_part_supersessions_equivalent_norm', 'part_supersessions', ['equivalent_norm'])
+
+
+def downgrade():
+    op.drop_index('ix_part_supersessions_equivalent_norm', table_name='part_supersessions')
+    op.drop_table('part_supersessions')
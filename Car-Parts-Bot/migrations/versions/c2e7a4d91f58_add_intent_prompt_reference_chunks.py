@@ -0,0 +1,35 @@
+"""add intent_prompts.reference_chunks
+
+Revision ID: c2e7a4d91f58
+Revises: b6f1e0a9c3d7
+Create Date: 2026-10-17 22:41:19.533870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+# revision identifiers, used by Alembic.
+revision = 'c2e7a4d91f58'
+down_revision = 'b6f1e0a9c3d7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # No backfill: prompts uploaded before this are chunked from
+    # reference_text when the prompt cache loads them.
+    if op.get_bind().dialect.name == "mysql":
+        op.execute(
+            "ALTER TABLE intent_prompts ADD COLUMN reference_chunks MEDIUMTEXT NULL, "
+            "ALGORITHM=INPLACE, LOCK=NONE"
+        )
+    else:
+        op.add_column(
+            'intent_prompts',
+            sa.Column('reference_chunks', sa.Text().with_variant(mysql.MEDIUMTEXT(), "mysql"), nullable=True),
+        )
+
+
+def downgrade():
+    op.drop_column('intent_prompts', 'reference_chunks')
@@ -0,0 +1,75 @@
+"""add stock.part_number_norm
+
+Revision ID: c3d1e8a4f7b2
+Revises: fa29aa32d2a7
+Create Date: 2026-10-17 10:12:41.204518
+
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c3d1e8a4f7b2'
+down_revision = 'fa29aa32d2a7'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+# Same rule as app.services.part_numbers.normalize_part_number.
+# Copied on purpose: migrations must not change if app code does.
+_NON_ALNUM = re.compile(r'[^A-Z0-9]')
+
+
+def _normalize(pn):
+    if not pn:
+        return None
+    return _NON_ALNUM.sub('', pn.upper()) or None
+
+
+def upgrade():
+    bind = op.get_bind()
+    is_mysql = bind.dialect.name == "mysql"
+
+    # Nullable column at the end of the table -> INSTANT on MySQL 8
+    op.add_column(
+        'stock',
+        sa.Column('part_number_norm', sa.String(length=255), nullable=True),
+    )
+
+    # Backfill by primary-key ranges. Each batch commits on its own so row
+    # locks are held only for one small UPDATE at a time.
+    with op.get_context().autocommit_block():
+        last_id = 0
+        while True:
+            rows = bind.execute(
+                sa.text(
+                    "SELECT id, part_number FROM stock "
+                    "WHERE id > :last_id ORDER BY id LIMIT :limit"
+                ),
+                {"last_id": last_id, "limit": BATCH_SIZE},
+            ).fetchall()
+            if not rows:
+                break
+
+            bind.execute(
+                sa.text("UPDATE stock SET part_number_norm = :norm WHERE id = :id"),
+                [{"id": r[0], "norm": _normalize(r[1])} for r in rows],
+            )
+            last_id = rows[-1][0]
+
+    if is_mysql:
+        # Online index build: reads and writes keep flowing while it runs
+        op.execute(
+            "ALTER TABLE stock ADD INDEX ix_stock_part_number_norm (part_number_norm), "
+            "ALGORITHM=INPLACE, LOCK=NONE"
+        )
+    else:
+        op.create_index('ix_stock_part_number_norm', 'stock', ['part_number_norm'])
+
+
+def downgrade():
+    op.drop_index('ix_stock_part_number_norm', table_name='stock')
+    op.drop_column('stock', 'part_number_norm')
@@ -0,0 +1,42 @@
+"""add stock.updated_at version stamp
+
+Revision ID: d7a2f91c0e35
+Revises: c3d1e8a4f7b2
+Create Date: 2026-10-17 14:03:55.871342
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'd7a2f91c0e35'
+down_revision = 'c3d1e8a4f7b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name == "mysql":
+        # ON UPDATE keeps the stamp correct for writers that bypass the ORM
+        # (ERP syncs, manual SQL). Both statements run online.
+        op.execute(
+            "ALTER TABLE stock ADD COLUMN updated_at DATETIME NOT NULL "
+            "DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP, "
+            "ALGORITHM=INPLACE, LOCK=NONE"
+        )
+        op.execute(
+            "ALTER TABLE stock ADD INDEX ix_stock_updated_at (updated_at), "
+            "ALGORITHM=INPLACE, LOCK=NONE"
+        )
+    else:
+        op.add_column(
+            'stock',
+            sa.Column('updated_at', sa.DateTime(), nullable=False,
+                      server_default=sa.func.now()),
+        )
+        op.create_index('ix_stock_updated_at', 'stock', ['updated_at'])
+
+
+def downgrade():
+    op.drop_index('ix_stock_updated_at', table_name='stock')
+    op.drop_column('stock', 'updated_at')
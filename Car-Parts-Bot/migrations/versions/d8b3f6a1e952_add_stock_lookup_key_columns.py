@@ -0,0 +1,81 @@
+"""add stock.brand_part_no_norm and stock.unique_value_norm
+
+Revision ID: d8b3f6a1e952
+Revises: c2e7a4d91f58
+Create Date: 2026-10-18 09:14:27.615302
+
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'd8b3f6a1e952'
+down_revision = 'c2e7a4d91f58'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+MAX_KEY_LENGTH = 255
+
+# Same rule as app.models.stock_lookup_key.
+# Copied on purpose: migrations must not change if app code does.
+_NON_ALNUM = re.compile(r'[^A-Z0-9]')
+
+
+def _key(value):
+    if not value:
+        return None
+    norm = _NON_ALNUM.sub('', value.upper())
+    return norm if norm and len(norm) <= MAX_KEY_LENGTH else None
+
+
+def upgrade():
+    bind = op.get_bind()
+    is_mysql = bind.dialect.name == "mysql"
+
+    # Nullable columns at the end of the table -> INSTANT on MySQL 8
+    op.add_column('stock', sa.Column('brand_part_no_norm', sa.String(length=MAX_KEY_LENGTH), nullable=True))
+    op.add_column('stock', sa.Column('unique_value_norm', sa.String(length=MAX_KEY_LENGTH), nullable=True))
+
+    # Backfill by primary-key ranges, one small committed UPDATE at a time
+    with op.get_context().autocommit_block():
+        last_id = 0
+        while True:
+            rows = bind.execute(
+                sa.text(
+                    "SELECT id, brand_part_no, unique_value FROM stock "
+                    "WHERE id > :last_id ORDER BY id LIMIT :limit"
+                ),
+                {"last_id": last_id, "limit": BATCH_SIZE},
+            ).fetchall()
+            if not rows:
+                break
+
+            bind.execute(
+                sa.text(
+                    "UPDATE stock SET brand_part_no_norm = :brand_norm, "
+                    "unique_value_norm = :unique_norm WHERE id = :id"
+                ),
+                [{"id": r[0], "brand_norm": _key(r[1]), "unique_norm": _key(r[2])} for r in rows],
+            )
+            last_id = rows[-1][0]
+
+    if is_mysql:
+        # Online index builds: reads and writes keep flowing while they run
+        op.execute(
+            "ALTER TABLE stock ADD INDEX ix_stock_brand_part_no_norm (brand_part_no_norm), "
+            "ADD INDEX ix_stock_unique_value_norm (unique_value_norm), "
+            "ALGORITHM=INPLACE, LOCK=NONE"
+        )
+    else:
+        op.create_index('ix_stock_brand_part_no_norm', 'stock', ['brand_part_no_norm'])
+        op.create_index('ix_stock_unique_value_norm', 'stock', ['unique_value_norm'])
+
+
+def downgrade():
+    op.drop_index('ix_stock_unique_value_norm', table_name='stock')
+    op.drop_index('ix_stock_brand_part_no_norm', table_name='stock')
+    op.drop_column('stock', 'unique_value_norm')
+    op.drop_column('stock', 'brand_part_no_norm')
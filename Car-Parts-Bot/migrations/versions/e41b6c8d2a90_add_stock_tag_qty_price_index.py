@@ -0,0 +1,28 @@
+"""add composite (tag, qty, price) index on stock
+
+Revision ID: e41b6c8d2a90
+Revises: d7a2f91c0e35
+Create Date: 2026-10-17 16:40:12.550917
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'e41b6c8d2a90'
+down_revision = 'd7a2f91c0e35'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name == "mysql":
+        op.execute(
+            "ALTER TABLE stock ADD INDEX ix_stock_tag_qty_price (tag, qty, price), "
+            "ALGORITHM=INPLACE, LOCK=NONE"
+        )
+    else:
+        op.create_index('ix_stock_tag_qty_price', 'stock', ['tag', 'qty', 'price'])
+
+
+def downgrade():
+    op.drop_index('ix_stock_tag_qty_price', table_name='stock')
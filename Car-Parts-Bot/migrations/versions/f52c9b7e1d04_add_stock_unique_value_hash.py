@@ -0,0 +1,95 @@
+"""add stock.unique_value_hash with a unique index for bulk upserts
+
+Revision ID: f52c9b7e1d04
+Revises: e41b6c8d2a90
+Create Date: 2026-10-17 18:05:41.208374
+
+"""
+import hashlib
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'f52c9b7e1d04'
+down_revision = 'e41b6c8d2a90'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+MAX_REPORTED = 20
+
+
+# Same rule as app.models.stock_unique_value_hash.
+# Copied on purpose: migrations must not change if app code does.
+def _hash(value):
+    if value is None:
+        return None
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def upgrade():
+    bind = op.get_bind()
+    is_mysql = bind.dialect.name == "mysql"
+
+    # unique_value is TEXT: a prefix index would let two values sharing their
+    # first 255 characters collide, so the upsert key is a hash of the whole value
+    # (already there when re-running after a duplicate report; MySQL DDL isn't transactional)
+    if 'unique_value_hash' not in {c['name'] for c in sa.inspect(bind).get_columns('stock')}:
+        op.add_column('stock', sa.Column('unique_value_hash', sa.CHAR(length=64), nullable=True))
+
+    # Backfill by primary-key ranges, one small committed UPDATE at a time
+    with op.get_context().autocommit_block():
+        last_id = 0
+        while True:
+            rows = bind.execute(
+                sa.text(
+                    "SELECT id, unique_value FROM stock "
+                    "WHERE id > :last_id ORDER BY id LIMIT :limit"
+                ),
+                {"last_id": last_id, "limit": BATCH_SIZE},
+            ).fetchall()
+            if not rows:
+                break
+
+            bind.execute(
+                sa.text("UPDATE stock SET unique_value_hash = :hash WHERE id = :id"),
+                [{"id": r[0], "hash": _hash(r[1])} for r in rows],
+            )
+            last_id = rows[-1][0]
+
+    # Duplicates are for the stock team to resolve; nothing is deleted here.
+    # GROUP BY on the fixed-width hash is a sort, not a self-join on TEXT.
+    duplicates = bind.execute(sa.text(
+        "SELECT unique_value_hash, COUNT(*) AS n FROM stock "
+        "WHERE unique_value_hash IS NOT NULL "
+        "GROUP BY unique_value_hash HAVING COUNT(*) > 1 ORDER BY n DESC"
+    )).fetchall()
+    if duplicates:
+        reported = {}
+        for row_id, value_hash, value in bind.execute(
+            sa.text("SELECT id, unique_value_hash, unique_value FROM stock "
+                    "WHERE unique_value_hash IN :hashes ORDER BY id")
+            .bindparams(sa.bindparam("hashes", expanding=True)),
+            {"hashes": [d[0] for d in duplicates[:MAX_REPORTED]]},
+        ):
+            reported.setdefault(value_hash, (value, []))[1].append(row_id)
+        lines = [f"  {value[:80]!r}: {len(ids)} rows, ids {ids}" for value, ids in reported.values()]
+        more = f"\n  ... and {len(duplicates) - MAX_REPORTED} more" if len(duplicates) > MAX_REPORTED else ""
+        raise RuntimeError(
+            f"stock has {len(duplicates)} duplicated unique_value(s); remove or merge them, then re-run "
+            f"the upgrade (unique_value_hash is already filled in):\n" + "\n".join(lines) + more
+        )
+
+    if is_mysql:
+        op.execute(
+            "ALTER TABLE stock ADD UNIQUE INDEX uq_stock_unique_value_hash (unique_value_hash), "
+            "ALGORITHM=INPLACE, LOCK=NONE"
+        )
+    else:
+        op.create_index('uq_stock_unique_value_hash', 'stock', ['unique_value_hash'], unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_stock_unique_value_hash', table_name='stock')
+    op.drop_column('stock', 'unique_value_hash')
@@ -0,0 +1,87 @@
+"""
+Benchmark: local VIN / part-number pre-extractor (entity_extractor).
+
+Runs extract_entities_locally over a corpus of customer messages (one per
+line; a built-in sample if no file is given) and reports how many would
+skip the gpt-4o extraction call (confident), how many would skip the
+part-name calls as well (codes only), and the local cost per message.
+
+    python scripts/bench_entity_extractor.py --corpus messages.txt --llm-ms 1800
+
+--llm-ms is the average gpt-4o extraction latency to price the skips at
+(GET /api/admin/metrics reports the live figure as avg_llm_extraction_ms).
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+
+from app.services.entity_extractor import extract_entities_locally  # noqa: E402
+
+SAMPLE = [
+    "WBA8E9C50GK123456",
+    "WBA8E9C50GK123456 11427566327",
+    "price for 11 42 7 566 327 and 34116860912",
+    "A 000 180 26 09",
+    "A2058800140 9999 available?",
+    "15400-PLM-A02 qty 4",
+    "need oil filter for WDD2050421F123456",
+    "brake pads front for my 2016 bmw 320i",
+    "PN 7566327",
+    "hi",
+    "Hello, do you have the water pump 11517586925?",
+    "WBA8E9C50GK 123456",
+    "part 64119237555 and 64 11 9 237 555",
+    "chassis no JHMGE8H53DC012345",
+    "7566327",
+    "1HGCM82633A004352 bumper",
+    "thanks",
+    "N 910105 008000",
+    "can you send price of A2218800105 and headlight",
+    "X5 2019 rear wiper blade",
+]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--corpus", help="text file, one message per line")
+    ap.add_argument("--llm-ms", type=float, default=1800.0)
+    ap.add_argument("--repeat", type=int, default=200)
+    args = ap.parse_args()
+
+    if args.corpus:
+        with open(args.corpus, encoding="utf-8") as f:
+            messages = [line.strip() for line in f if line.strip()]
+    else:
+        messages = SAMPLE
+
+    results = [extract_entities_locally(m) for m in messages]
+    confident = sum(r.confident for r in results)
+    codes_only = sum(r.codes_only for r in results)
+
+    t = time.perf_counter()
+    for _ in range(args.repeat):
+        for m in messages:
+            extract_entities_locally(m)
+    per_msg_us = (time.perf_counter() - t) / (args.repeat * len(messages)) * 1e6
+
+    if not args.corpus:
+        for m, r in zip(messages, results):
+            flag = "codes" if r.codes_only else "skip" if r.confident else "llm"
+            print(f"  [{flag:5}] {m!r:52} vins={r.vin_list} pns={r.part_numbers} ?={r.unexplained}")
+
+    n = len(messages)
+    print(f"\nmessages: {n}")
+    print(f"gpt-4o extraction skipped: {confident} ({confident / n * 100:.1f}%)")
+    print(f"part-name calls skipped:   {codes_only} ({codes_only / n * 100:.1f}%)")
+    print(f"local extraction: {per_msg_us:.1f} µs / message")
+    print(f"est. latency saved: {confident * args.llm_ms / n:.0f} ms / message "
+          f"(at {args.llm_ms:.0f} ms per gpt-4o extraction call)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark: OCR/typo-tolerant part-number matching at stock scale.
+
+Builds a PartNumberMatcher over N synthetic normalized part numbers, then
+queries with OCR-style corruptions (O/0, I/1, S/5, B/8 swaps plus one
+dropped or extra character) and reports recall and latency percentiles.
+
+    python scripts/bench_fuzzy_match.py --parts 1000000 --queries 5000
+"""
+
+import argparse
+import os
+import random
+import string
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.services.fuzzy_part_matcher import PartNumberMatcher  # noqa: E402
+
+OCR_SWAPS = {"0": "O", "1": "I", "5": "S", "8": "B", "O": "0", "I": "1", "S": "5", "B": "8"}
+
+
+def _random_part_number(rng: random.Random) -> str:
+    style = rng.random()
+    if style < 0.5:   # BMW / Mini / Rolls-Royce: 11 digits
+        return "".join(rng.choices(string.digits, k=11))
+    if style < 0.8:   # Mercedes: A + 10 digits
+        return "A" + "".join(rng.choices(string.digits, k=10))
+    # Honda: 5 digits + 3 alnum + 3 alnum
+    return ("".join(rng.choices(string.digits, k=5))
+            + "".join(rng.choices(string.ascii_uppercase + string.digits, k=6)))
+
+
+def corrupt(pn: str, rng: random.Random) -> str:
+    chars = list(pn)
+    swappable = [i for i, c in enumerate(chars) if c in OCR_SWAPS]
+    for i in rng.sample(swappable, min(len(swappable), rng.randint(1, 2))):
+        chars[i] = OCR_SWAPS[chars[i]]
+    if rng.random() < 0.5:
+        del chars[rng.randrange(len(chars))]
+    else:
+        chars.insert(rng.randrange(len(chars) + 1), rng.choice(string.digits))
+    return "".join(chars)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--parts", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    parts = [_random_part_number(rng) for _ in range(args.parts)]
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    matcher = PartNumberMatcher()
+    for pn in parts:
+        matcher.add(pn)
+    build_s = time.perf_counter() - t0
+    heap_mb = tracemalloc.get_traced_memory()[0] / 1e6
+    tracemalloc.stop()
+    print(f"Built matcher over {args.parts:,} parts in {build_s:.1f}s, {heap_mb:.0f} MB")
+
+    samples = rng.sample(parts, args.queries)
+    timings, hits = [], 0
+    for pn in samples:
+        query = corrupt(pn, rng)
+        t = time.perf_counter()
+        candidates = matcher.match(query)
+        timings.append((time.perf_counter() - t) * 1000)
+        if candidates and pn in {c for c, _ in candidates}:
+            hits += 1
+
+    timings.sort()
+    pct = lambda p: timings[min(len(timings) - 1, int(len(timings) * p))]
+    print(f"Recall@3: {hits / len(samples):.1%}")
+    print(f"Latency ms  p50={pct(0.50):.3f}  p95={pct(0.95):.3f}  p99={pct(0.99):.3f}  max={timings[-1]:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark: prompt tokens of the super-intent "Matched Parts (DB)" context,
+JSON (parts_json) vs. the compact table (parts_context.encode_parts).
+
+    python scripts/bench_parts_context.py --tags 1 3 6 --siblings 10
+
+Builds sibling sets shaped like search_parts_in_db results: per matched tag
+the exact match plus its siblings (same long tag, mostly the same name and
+brand), with some rows repeated across tags as they are when two requested
+numbers share siblings. Token counts use tiktoken when installed.
+"""
+
+import argparse
+import os
+import random
+import sys
+
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.services.parts_context import encode_parts  # noqa: E402
+from app.services.token_budget import count_tokens, parts_json, tiktoken  # noqa: E402
+
+TAGS = [
+    ("BRAKE PAD SET FRONT - BMW 5 SERIES F10 F11 520D 530D 535I 2010-2017", "Brake pad set, disc brake"),
+    ("ENGINE OIL FILTER ELEMENT - MERCEDES-BENZ W205 C200 C300 M274 M264", "Oil filter element"),
+    ("SPARK PLUG HIGH POWER - BMW N20 N55 B48 B58 ENGINES", "Spark plug"),
+    ("CONTROL ARM LOWER FRONT LEFT - ROLLS ROYCE GHOST WRAITH DAWN", "Wishbone, lower left"),
+    ("WATER PUMP ELECTRIC - MINI COOPER S R56 R60 N18", "Water pump, electric"),
+    ("AIR FILTER CABIN MICROFILTER - HONDA ACCORD CR-V 2013-2018", "Cabin air filter"),
+]
+BRANDS = ["BMW", "Mercedes-Benz", "Bosch", "Mann-Filter", "Brembo", "TRW", "NGK", "Lemforder"]
+
+
+def _part_number(rng: random.Random) -> str:
+    return "".join(rng.choices("0123456789", k=11))
+
+
+def build_parts(tags: int, siblings: int, rng: random.Random) -> list:
+    parts = []
+    for tag, name in TAGS[:tags]:
+        brand = rng.choice(BRANDS)
+        for i in range(siblings):
+            parts.append({
+                "part_number": _part_number(rng),
+                "brand": brand if rng.random() < 0.8 else rng.choice(BRANDS),
+                "name": name if rng.random() < 0.9 else f"{name} (kit)",
+                "price": round(rng.uniform(40, 2500), 2) if rng.random() < 0.9 else None,
+                "qty": rng.choice([0, 0, 1, 2, 5, 12]),
+                "tag": tag,
+            })
+        # Second requested number on the same tag: its siblings come back again
+        parts.extend(dict(p) for p in parts[-siblings:][: siblings // 3])
+    return parts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tags", type=int, nargs="+", default=[1, 2, 4, 6])
+    parser.add_argument("--siblings", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"Token counts via {'tiktoken o200k_base' if tiktoken else 'the ~4 chars/token estimate'}")
+    print(f"{'tags':>4} {'rows':>5} {'json':>7} {'table':>7} {'saved':>7}")
+    for tags in args.tags:
+        parts = build_parts(tags, args.siblings, random.Random(args.seed))
+        json_tokens = count_tokens(parts_json(parts))
+        table_tokens = count_tokens(encode_parts(parts))
+        print(f"{tags:>4} {len(parts):>5} {json_tokens:>7} {table_tokens:>7} "
+              f"{(1 - table_tokens / json_tokens) * 100:>6.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark: whole reference document vs. retrieved chunks in the super-intent prompt.
+
+Chunks a reference file the way the admin upload does, then for each query
+reports the reference tokens that go into the system prompt before (whole
+document) and after (top-k chunks under the budget), plus retrieval time.
+Without --file a synthetic 120-page warning-light manual is used.
+
+    python scripts/bench_reference_retrieval.py --file manual.pdf
+    python scripts/bench_reference_retrieval.py --live   # also time real gpt-4o calls
+
+--live needs OPENAI_API_KEY and sends each query twice (full / retrieved)
+to report end-to-end latency; token counts come from the API usage field.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+
+from app.services.reference_extractor import chunk_reference_text, extract_text_from_file  # noqa: E402
+from app.services.reference_index import ReferenceIndex, estimate_tokens  # noqa: E402
+
+QUERIES = [
+    "red oil can symbol on my dashboard what does it mean",
+    "yellow engine light came on",
+    "battery warning light flashing while driving",
+    "need brake pads for bmw 320i",
+    "tyre pressure warning after changing wheels",
+    "coolant temperature light red",
+    "price for oil filter 11427566327",
+    "abs light and traction control light both on",
+]
+
+_LIGHTS = [
+    ("Oil Pressure Warning", "red oil can", "low engine oil pressure. Stop the engine and check the oil level"),
+    ("Check Engine Light", "yellow engine outline", "an emission or engine management fault was detected"),
+    ("Battery Charge Warning", "red battery symbol", "the alternator is not charging the battery"),
+    ("Brake System Warning", "red circle with exclamation mark", "low brake fluid or the parking brake is on"),
+    ("Tyre Pressure Monitor", "yellow horseshoe with exclamation mark", "one or more tyres are under-inflated"),
+    ("Coolant Temperature", "red thermometer in waves", "the engine is overheating; stop safely"),
+    ("ABS Warning", "yellow ABS in a circle", "the anti-lock braking system is disabled"),
+    ("Traction Control", "yellow car with skid lines", "traction control is active or has a fault"),
+]
+
+
+def synthetic_manual(pages: int = 120) -> str:
+    rnd = random.Random(3)
+    filler = ("Refer to the vehicle handbook and consult an authorised workshop. Driving with this "
+              "indicator illuminated may cause further damage to the vehicle and void the warranty. ")
+    out = []
+    for page in range(1, pages + 1):
+        title, symbol, meaning = _LIGHTS[page % len(_LIGHTS)]
+        body = [f"{title.upper()}", f"The {symbol} indicates {meaning}."]
+        body += [filler * rnd.randint(2, 5) for _ in range(3)]
+        out.append(f"[Page {page}]\n" + "\n\n".join(body))
+    return "\n\n".join(out)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--file", help="reference file (.pdf/.txt/.docx)")
+    ap.add_argument("--top-k", type=int, default=4)
+    ap.add_argument("--budget", type=int, default=1500)
+    ap.add_argument("--chunk-chars", type=int, default=1600)
+    ap.add_argument("--live", action="store_true")
+    args = ap.parse_args()
+
+    text = extract_text_from_file(args.file) if args.file else synthetic_manual()
+    t = time.perf_counter()
+    chunks = chunk_reference_text(text, max_chars=args.chunk_chars)
+    index = ReferenceIndex(chunks)
+    build_ms = (time.perf_counter() - t) * 1000
+    full_tokens = estimate_tokens(text)
+    print(f"reference: {len(text):,} chars, ~{full_tokens:,} tokens, {len(chunks)} chunks "
+          f"(chunk + index {build_ms:.0f} ms)\n")
+
+    rows = []
+    for q in QUERIES:
+        t = time.perf_counter()
+        picked = index.select(q, top_k=args.top_k, token_budget=args.budget)
+        select_ms = (time.perf_counter() - t) * 1000
+        tokens = estimate_tokens(index.render(picked))
+        rows.append((q, len(picked), tokens, select_ms))
+        where = ", ".join(f"p{c.get('page')}" for c in picked) or "-"
+        print(f"  {q[:52]:52} {len(picked)} chunks ~{tokens:5} tokens  {select_ms:5.2f} ms  [{where}]")
+
+    avg_tokens = statistics.mean(r[2] for r in rows)
+    print(f"\nreference tokens / message: ~{full_tokens:,} -> ~{avg_tokens:,.0f} "
+          f"({(1 - avg_tokens / full_tokens) * 100:.1f}% less); "
+          f"retrieval {statistics.mean(r[3] for r in rows):.2f} ms avg")
+
+    if args.live:
+        from openai import OpenAI
+
+        client = OpenAI()
+        for label, build in (
+            ("full", lambda q: text),
+            ("retrieved", lambda q: index.render(index.select(q, top_k=args.top_k, token_budget=args.budget))),
+        ):
+            latencies, prompt_tokens = [], []
+            for q in QUERIES:
+                t = time.perf_counter()
+                r = client.chat.completions.create(
+                    model="gpt-4o",
+                    messages=[
+                        {"role": "system", "content": "Answer from the reference only.\n=== REFERENCE MATERIAL ===\n" + build(q)},
+                        {"role": "user", "content": q},
+                    ],
+                    max_tokens=200,
+                )
+                latencies.append(time.perf_counter() - t)
+                prompt_tokens.append(r.usage.prompt_tokens)
+            print(f"live {label:9}: {statistics.mean(prompt_tokens):8,.0f} prompt tokens, "
+                  f"{statistics.median(latencies):.2f} s median latency")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Benchmark: streaming bulk stock import vs. per-row ORM upserts.
+
+Generates a synthetic ERP export, imports it twice with
+import_stock_file (insert pass, then an all-update pass), runs a delta
+sync of a copy where --delta-fraction of the rows changed price/qty, and
+times the old query-then-add ORM loop on a sample of the same rows.
+
+    python scripts/bench_stock_import.py --rows 300000 --format csv
+    python scripts/bench_stock_import.py --rows 100000 --format xlsx
+
+Uses an on-disk SQLite file by default; pass --url mysql+pymysql://...
+to run it against a scratch MySQL database (tables are created if missing).
+"""
+
+import argparse
+import csv
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+
+HEADER = ["Unique Value", "Part Number", "Brand Part No", "Brand", "Tag",
+          "Item Desc", "Price", "Qty"]
+BRANDS = ["BMW", "MANN", "BOSCH", "MAHLE", "TOYOTA", "NISSAN", "FEBI"]
+WORDS = ["OIL", "FILTER", "BRAKE", "PAD", "DISC", "FRONT", "REAR", "LAMP",
+         "HOOD", "BUMPER", "SENSOR", "PUMP", "BELT", "MOUNT", "KIT"]
+
+
+def synthetic_rows(n, seed, change_fraction=0.0):
+    rnd = random.Random(seed)
+    changes = random.Random(seed + 1)
+    for i in range(n):
+        pn = "".join(rnd.choices(string.digits, k=5)) + "-" + "".join(rnd.choices(string.digits, k=6))
+        brand = rnd.choice(BRANDS)
+        row = [
+            f"{brand}-{i}",
+            pn,
+            f"{brand} {pn}",
+            brand,
+            " ".join(rnd.sample(WORDS, 2)),
+            " ".join(rnd.sample(WORDS, 4)),
+            round(rnd.uniform(5, 900), 2),
+            rnd.randint(0, 20),
+        ]
+        if change_fraction and changes.random() < change_fraction:
+            row[6] = round(row[6] * 1.05, 2)
+            row[7] += 1
+        yield row
+
+
+def write_file(path, fmt, n, seed, change_fraction=0.0):
+    if fmt == "csv":
+        with open(path, "w", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(HEADER)
+            w.writerows(synthetic_rows(n, seed, change_fraction))
+    else:
+        from openpyxl import Workbook
+
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Stock")
+        ws.append(HEADER)
+        for row in synthetic_rows(n, seed, change_fraction):
+            ws.append(row)
+        wb.save(path)
+
+
+def orm_baseline(records):
+    """The ad-hoc approach: look each row up, then add or update through the ORM."""
+    from app.extensions import db
+    from app.models import Stock
+
+    for r in records:
+        stock = Stock.query.filter_by(unique_value=r["unique_value"]).first()
+        if stock is None:
+            stock = Stock(unique_value=r["unique_value"])
+            db.session.add(stock)
+        for k, v in r.items():
+            setattr(stock, k, v)
+    db.session.commit()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=300000)
+    ap.add_argument("--format", choices=["csv", "xlsx"], default="csv")
+    ap.add_argument("--batch-size", type=int, default=2000)
+    ap.add_argument("--delta-fraction", type=float, default=0.05)
+    ap.add_argument("--orm-sample", type=int, default=5000)
+    ap.add_argument("--url", default=None)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="stock_import_bench_")
+    os.environ["DATABASE_URL"] = args.url or f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+
+    from app import create_app
+    from app.config import AppConfig
+    from app.extensions import db
+    from app.services.stock_import import import_stock_file, iter_stock_records, prepare_batch
+
+    class BenchConfig(AppConfig):
+        SQLALCHEMY_ENGINE_OPTIONS = {} if not args.url else AppConfig.SQLALCHEMY_ENGINE_OPTIONS
+
+    path = os.path.join(tmp, f"stock.{args.format}")
+    t = time.time()
+    write_file(path, args.format, args.rows, seed=1)
+    print(f"generated {args.rows} rows ({os.path.getsize(path) / 1e6:.1f} MB) in {time.time() - t:.1f}s")
+
+    app = create_app(BenchConfig())
+    with app.app_context():
+        db.create_all()
+
+        first = import_stock_file(path, batch_size=args.batch_size)
+        second = import_stock_file(path, batch_size=args.batch_size)
+        for label, r in (("insert pass", first), ("update pass", second)):
+            print(f"{label} : {r['rows_per_second']:>8} rows/s  "
+                  f"peak {r['peak_memory_mb']} MB (+{r['import_memory_mb']} MB)")
+
+        if args.delta_fraction:
+            delta_path = os.path.join(tmp, f"stock_delta.{args.format}")
+            write_file(delta_path, args.format, args.rows, seed=1, change_fraction=args.delta_fraction)
+            r = import_stock_file(delta_path, batch_size=args.batch_size, delta=True)
+            print(f"delta sync  : {r['rows_per_second']:>8} rows/s  "
+                  f"{r['rows_written']} written, {r['rows_unchanged']} unchanged")
+
+        if args.orm_sample:
+            sample = []
+            for rec in iter_stock_records(path):
+                sample.append(rec)
+                if len(sample) >= args.orm_sample:
+                    break
+            sample = prepare_batch(sample)
+            t = time.time()
+            orm_baseline(sample)
+            rate = len(sample) / (time.time() - t)
+            print(f"ORM per-row : {rate:>8.0f} rows/s  (sample of {len(sample)}, "
+                  f"~{args.rows / rate / 60:.1f} min for the whole file)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmark: part-number lookup on a large synthetic `stock` table.
+
+Compares the old UPPER()/REPLACE() expression filter (full scan) against
+the stored, indexed `part_number_norm` column.
+
+    python scripts/bench_stock_lookup.py --rows 300000 --lookups 200
+
+Uses an on-disk SQLite file by default so it runs anywhere; pass
+--url mysql+pymysql://... to run it against a scratch MySQL database.
+"""
+
+import argparse
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+
+import sqlalchemy as sa
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.services.part_numbers import normalize_part_number  # noqa: E402
+
+# Same symbol list the old search_parts_in_db stripped in SQL
+LEGACY_STRIP = ['-', ' ', '+', '%', '$', '_', '/', '.', ',', ':', ';', '#', '@', '!', '*',
+                '(', ')', '?', '&', '=', '<', '>', '~', '`', '|', '^', '"', "'",
+                '~', '´', '“', '”', '‘', '’', '–', '—', '•', '…', '{', '}', '[', ']']
+
+metadata = sa.MetaData()
+stock = sa.Table(
+    "stock", metadata,
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("tag", sa.String(500)),
+    sa.Column("brand_part_no", sa.String(255)),
+    sa.Column("item_desc", sa.Text),
+    sa.Column("price", sa.Float),
+    sa.Column("qty", sa.Integer),
+    sa.Column("part_number", sa.String(255)),
+    sa.Column("brand", sa.String(255)),
+    sa.Column("unique_value", sa.Text),
+    sa.Column("part_number_norm", sa.String(255), index=True),
+)
+
+
+def _random_part_number(rng: random.Random) -> str:
+    # Mix of BMW-style spaced numbers, dashed and plain codes
+    digits = "".join(rng.choices(string.digits, k=11))
+    style = rng.random()
+    if style < 0.4:
+        return f"{digits[:2]} {digits[2:4]} {digits[4]} {digits[5:8]} {digits[8:]}"
+    if style < 0.7:
+        return f"A{digits[:3]}-{digits[3:6]}-{digits[6:8]}-{digits[8:10]}"
+    return digits
+
+
+def populate(engine, rows: int, seed: int) -> list:
+    rng = random.Random(seed)
+    part_numbers = []
+    batch = []
+    with engine.begin() as conn:
+        for i in range(rows):
+            pn = _random_part_number(rng)
+            part_numbers.append(pn)
+            batch.append({
+                "tag": f"TAG-{rng.randint(0, rows // 20)}",
+                "brand_part_no": pn,
+                "item_desc": "Synthetic part",
+                "price": round(rng.uniform(5, 900), 2),
+                "qty": rng.randint(0, 20),
+                "part_number": pn,
+                "brand": rng.choice(["BMW", "MERCEDES", "MINI", "HONDA"]),
+                "unique_value": f"U{i}",
+                "part_number_norm": normalize_part_number(pn),
+            })
+            if len(batch) >= 10000:
+                conn.execute(stock.insert(), batch)
+                batch = []
+        if batch:
+            conn.execute(stock.insert(), batch)
+    return part_numbers
+
+
+def legacy_lookup(conn, cleaned: set):
+    # SQLite's parser overflows on ~40 nested REPLACE() calls; strip only the
+    # symbols the synthetic data uses. Still a full scan, just a cheaper one.
+    strip = LEGACY_STRIP if conn.dialect.name != "sqlite" else ['-', ' ']
+    col = sa.func.upper(stock.c.part_number)
+    for ch in strip:
+        col = sa.func.replace(col, ch, '')
+    return conn.execute(sa.select(stock.c.id).where(col.in_(cleaned))).fetchall()
+
+
+def indexed_lookup(conn, cleaned: set):
+    return conn.execute(
+        sa.select(stock.c.id).where(stock.c.part_number_norm.in_(cleaned))
+    ).fetchall()
+
+
+def run(fn, conn, samples: list) -> float:
+    start = time.perf_counter()
+    for pn in samples:
+        assert fn(conn, {normalize_part_number(pn)})
+    return (time.perf_counter() - start) / len(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=300_000)
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--legacy-lookups", type=int, default=10,
+                        help="full scans are slow; fewer samples are enough")
+    parser.add_argument("--url", default=None)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    url = args.url or f"sqlite:///{tempfile.mkdtemp()}/bench_stock.db"
+    engine = sa.create_engine(url)
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+
+    t0 = time.perf_counter()
+    part_numbers = populate(engine, args.rows, args.seed)
+    print(f"Populated {args.rows:,} rows in {time.perf_counter() - t0:.1f}s ({engine.dialect.name})")
+
+    rng = random.Random(args.seed + 1)
+    with engine.connect() as conn:
+        legacy_ms = run(legacy_lookup, conn, rng.sample(part_numbers, args.legacy_lookups))
+        indexed_ms = run(indexed_lookup, conn, rng.sample(part_numbers, args.lookups))
+
+    print(f"Before (UPPER/REPLACE scan): {legacy_ms:9.3f} ms / lookup")
+    print(f"After  (part_number_norm):   {indexed_ms:9.3f} ms / lookup")
+    print(f"Speed-up: {legacy_ms / indexed_ms:,.0f}x")
+
+
+if __name__ == "__main__":
+    main()
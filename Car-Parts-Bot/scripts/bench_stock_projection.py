@@ -0,0 +1,116 @@
+"""
+Benchmark: full ORM Stock entities vs. Core column projection in stock search.
+
+Both sides filter on the indexed part_number_norm column, so the
+difference is only what gets materialized:
+
+  before  db.session.query(Stock) -> ORM entities (all columns, incl. the
+          unique_value TEXT) with instance state, registered in the session
+          identity map, then copied into reply dicts
+  after   select(<7 columns>) -> Row tuples -> reply dicts
+          (what _search_stock_sql / search_parts_in_db do now)
+
+Reports peak bytes allocated per lookup (tracemalloc) and time per 1,000
+matched rows.
+
+    python scripts/bench_stock_projection.py --rows 100000 --lookups 300 --per-lookup 40
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=100000)
+    ap.add_argument("--lookups", type=int, default=300)
+    ap.add_argument("--per-lookup", type=int, default=40, help="matched rows per lookup")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="stock_projection_bench_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+
+    from sqlalchemy import insert, select
+
+    from app import create_app
+    from app.config import AppConfig
+    from app.extensions import db
+    from app.models import Stock
+    from app.services.message_processor import _part_to_dict
+
+    class BenchConfig(AppConfig):
+        SQLALCHEMY_ENGINE_OPTIONS = {}
+
+    app = create_app(BenchConfig())
+    rnd = random.Random(7)
+
+    with app.app_context():
+        db.create_all()
+        # Groups of `per-lookup` rows share one normalized number
+        rows = [{
+            "part_number": f"PN-{i // args.per_lookup:07d}",
+            "part_number_norm": f"PN{i // args.per_lookup:07d}",
+            "brand": "BRAND",
+            "item_desc": "SOME PART DESCRIPTION " * 3,
+            "price": float(i % 500),
+            "qty": i % 7,
+            "tag": "TAG " * 40,
+            "brand_part_no": f"B{i}",
+            "unique_value": "U" * 400 + str(i),
+        } for i in range(args.rows)]
+        for start in range(0, len(rows), 5000):
+            db.session.execute(insert(Stock), rows[start:start + 5000])
+        db.session.commit()
+        del rows
+
+        groups = args.rows // args.per_lookup
+        keys = [f"PN{rnd.randrange(groups):07d}" for _ in range(args.lookups)]
+
+        def before(key):
+            parts = db.session.query(Stock).filter(Stock.part_number_norm.in_([key])).all()
+            return [_part_to_dict(p) for p in parts]
+
+        columns = (Stock.id, Stock.part_number, Stock.brand, Stock.item_desc,
+                   Stock.price, Stock.qty, Stock.tag)
+
+        def after(key):
+            parts = db.session.execute(select(*columns).where(Stock.part_number_norm.in_([key]))).all()
+            return [_part_to_dict(p) for p in parts]
+
+        for label, fn in (("before (ORM entities)", before), ("after  (Core projection)", after)):
+            db.session.remove()
+            fn(keys[0])  # warm statement caches
+
+            matched = 0
+            t = time.perf_counter()
+            for key in keys:
+                matched += len(fn(key))
+            elapsed = time.perf_counter() - t
+
+            # Peak bytes allocated while one lookup (query + reply dicts) is live
+            tracemalloc.start()
+            peaks = []
+            for key in keys[:100]:
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+                result = fn(key)
+                peaks.append(tracemalloc.get_traced_memory()[1] - base)
+                del result
+            tracemalloc.stop()
+
+            print(f"{label}: {elapsed / matched * 1000 * 1000:7.2f} ms / 1k matched rows, "
+                  f"{sum(peaks) / len(peaks) / 1024:6.1f} KiB allocated / lookup "
+                  f"({args.per_lookup} rows)")
+            db.session.remove()
+
+
+if __name__ == "__main__":
+    main()
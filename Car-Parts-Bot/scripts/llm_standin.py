@@ -0,0 +1,372 @@
+"""
+Local OpenAI-compatible stand-in for benchmarks and load tests.
+
+Serves the endpoints the bot uses (chat/completions, streamed or not,
+audio/transcriptions and models) so process_user_message can be profiled
+under realistic LLM timing without paying for, or waiting on, OpenAI.
+
+    # 1. record real answers once (replays anything already recorded)
+    OPENAI_API_KEY=sk-... python scripts/llm_standin.py --mode record
+
+    # 2. replay them with gpt-4o-like timing and some failures
+    python scripts/llm_standin.py --latency chat=lognormal:900,0.5 \\
+        --latency audio=lognormal:1500,0.3 --tokens-per-second 80 \\
+        --error-rate 0.02 --error-codes 429,500,503
+
+    # 3. point the bot (web, worker) at it
+    LLM_BASE_URL=http://127.0.0.1:8089/v1
+
+Recordings are keyed by a hash of the request (endpoint + body, ignoring
+stream options), one JSON file each under --recordings. A streamed request
+replays the recorded completion as SSE chunks. Replay misses get a
+placeholder answer (--on-miss synth) or a 404 (--on-miss error).
+
+Latency specs: fixed:MS, uniform:LO,HI, normal:MEAN,SD, lognormal:MEDIAN,SIGMA,
+recorded (the upstream time, when the recording has one) or none. A spec is
+the time to the first token; --tokens-per-second adds generation time.
+Prefix a spec with an endpoint or model ("chat=...", "gpt-4o-mini=200") to
+apply it to that endpoint / model only.
+
+GET /standin/stats returns hit / miss / injected-error counters.
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import uuid
+
+import requests
+from flask import Flask, Response, jsonify, request
+from werkzeug.serving import WSGIRequestHandler
+
+SYNTH_TEXT = "Stand-in reply."
+SYNTH_JSON = {"machine_payload": {"action": "info_only"}, "whatsapp_text": SYNTH_TEXT}
+
+ERRORS = {
+    429: ("rate_limit_exceeded", "requests", "Rate limit reached (stand-in)."),
+    500: ("server_error", "server_error", "The server had an error processing your request (stand-in)."),
+    502: ("server_error", "server_error", "Bad gateway (stand-in)."),
+    503: ("server_error", "server_error", "The engine is currently overloaded (stand-in)."),
+}
+
+_TOKEN_RE = re.compile(r"\s*\S{1,4}|\s+")
+
+
+# ================= SPECS =================
+
+def parse_latency(spec: str):
+    """A sampler rng -> ms (None for "recorded")."""
+    name, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v.strip()]
+    if name in ("none", "0"):
+        return lambda rng: 0.0
+    if name == "recorded":
+        return None
+    if name == "fixed":
+        return lambda rng: values[0]
+    if name == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if name == "normal":
+        return lambda rng: max(rng.gauss(values[0], values[1]), 0.0)
+    if name == "lognormal":
+        mu = math.log(values[0])
+        return lambda rng: rng.lognormvariate(mu, values[1])
+    raise argparse.ArgumentTypeError(f"unknown latency spec: {spec}")
+
+
+def scoped(items: list, default) -> dict:
+    """["chat=spec", "spec"] -> {"chat": spec, "*": spec}."""
+    out = {"*": default}
+    for item in items or ():
+        key, sep, value = item.partition("=")
+        out[key if sep else "*"] = value if sep else item
+    return out
+
+
+def lookup(table: dict, *keys: str):
+    """Most specific match: a model name, then an endpoint prefix, then "*"."""
+    for key in keys:
+        for name, value in table.items():
+            if name != "*" and key and key.startswith(name):
+                return value
+    return table["*"]
+
+
+# ================= RECORDINGS =================
+
+def request_hash(endpoint: str, body: dict, file_bytes: bytes | None = None) -> str:
+    body = {k: v for k, v in body.items() if k not in ("stream", "stream_options")}
+    digest = hashlib.sha256(endpoint.encode())
+    digest.update(json.dumps(body, sort_keys=True, default=str).encode())
+    if file_bytes is not None:
+        digest.update(hashlib.sha256(file_bytes).digest())
+    return digest.hexdigest()[:32]
+
+
+class Recordings:
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.json")
+
+    def get(self, key: str):
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, entry: dict) -> None:
+        tmp = self._path(key) + f".{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self._path(key))
+
+
+# ================= RESPONSES =================
+
+def estimate_tokens(text: str) -> int:
+    return max(len(text) // 4, 1) if text else 0
+
+
+def synth_chat(body: dict) -> dict:
+    json_mode = (body.get("response_format") or {}).get("type") == "json_object"
+    content = json.dumps(SYNTH_JSON) if json_mode else SYNTH_TEXT
+    prompt = estimate_tokens(json.dumps(body.get("messages"), default=str))
+    completion = estimate_tokens(content)
+    return {
+        "id": f"chatcmpl-standin-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model"),
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": prompt, "completion_tokens": completion,
+                  "total_tokens": prompt + completion, "prompt_tokens_details": {"cached_tokens": 0}},
+    }
+
+
+def sse_chunks(completion: dict, include_usage: bool):
+    base = {"id": completion["id"], "object": "chat.completion.chunk",
+            "created": completion["created"], "model": completion["model"]}
+    choice = completion["choices"][0]
+    yield {**base, "choices": [{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}]}
+    for piece in _TOKEN_RE.findall(choice["message"].get("content") or ""):
+        yield {**base, "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+    yield {**base, "choices": [{"index": 0, "delta": {}, "finish_reason": choice.get("finish_reason") or "stop"}]}
+    if include_usage:
+        yield {**base, "choices": [], "usage": completion.get("usage")}
+
+
+def error_response(status: int, headers: dict) -> Response:
+    code, kind, message = ERRORS.get(status, ("server_error", "server_error", "Injected error (stand-in)."))
+    if status == 429:
+        headers["retry-after-ms"] = "500"
+    body = {"error": {"message": message, "type": kind, "param": None, "code": code}}
+    return Response(json.dumps(body), status=status, headers=headers, mimetype="application/json")
+
+
+# ================= SERVER =================
+
+def create_app(args) -> Flask:
+    app = Flask("llm_standin")
+    recordings = Recordings(args.recordings)
+    latencies = {k: parse_latency(v) for k, v in scoped(args.latency, "none").items()}
+    rates = {k: float(v) for k, v in scoped(args.tokens_per_second, "0").items()}
+    rng = random.Random(args.seed)
+    rng_lock = threading.Lock()
+    stats_lock = threading.Lock()
+    stats = {}
+
+    def count(endpoint: str, outcome: str) -> None:
+        with stats_lock:
+            stats[outcome] = stats.get(outcome, 0) + 1
+            stats[f"{outcome}:{endpoint}"] = stats.get(f"{outcome}:{endpoint}", 0) + 1
+
+    def sample(endpoint: str, model: str | None, recorded_ms: float | None):
+        sampler = lookup(latencies, model, endpoint)
+        if sampler is None:  # "recorded"
+            return recorded_ms or 0.0
+        with rng_lock:
+            return sampler(rng)
+
+    def roll_fault():
+        with rng_lock:
+            if rng.random() < args.stall_rate:
+                return "stall"
+            if rng.random() < args.error_rate:
+                return rng.choice(args.error_codes)
+        return None
+
+    def upstream(endpoint: str, **kwargs) -> tuple:
+        t0 = time.perf_counter()
+        r = requests.post(
+            f"{args.upstream.rstrip('/')}/{endpoint}",
+            headers={"Authorization": f"Bearer {os.environ['OPENAI_API_KEY']}"},
+            timeout=300, **kwargs,
+        )
+        r.raise_for_status()
+        return r.json(), round((time.perf_counter() - t0) * 1000, 1)
+
+    def resolve(endpoint: str, key: str, record, synth) -> tuple:
+        """
+        (response body, recorded upstream ms, fresh) - body None on a miss.
+        fresh: just recorded, the caller already waited for upstream.
+        """
+        entry = recordings.get(key)
+        if entry is not None:
+            count(endpoint, "hits")
+            return entry["response"], entry.get("upstream_ms"), False
+        if args.mode == "record":
+            body, elapsed_ms = record()
+            recordings.put(key, {"endpoint": endpoint, "upstream_ms": elapsed_ms, "response": body,
+                                 "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S")})
+            count(endpoint, "recorded")
+            return body, elapsed_ms, True
+        count(endpoint, "misses")
+        return (synth() if args.on_miss == "synth" else None), None, False
+
+    @app.before_request
+    def inject_faults():
+        if request.path.startswith("/standin"):
+            return None
+        fault = roll_fault()
+        endpoint = request.path.removeprefix("/v1/")
+        if fault == "stall":
+            count(endpoint, "stalls")
+            time.sleep(args.stall_seconds)
+        elif fault is not None:
+            count(endpoint, "errors")
+            print(f"💥 [StandIn] {endpoint}: injected {fault}")
+            return error_response(fault, {"x-request-id": f"req_standin_{uuid.uuid4().hex[:12]}"})
+        return None
+
+    @app.get("/v1/models")
+    def models():
+        return jsonify({"object": "list", "data": [
+            {"id": m, "object": "model", "created": 0, "owned_by": "stand-in"}
+            for m in ("gpt-4o", "gpt-4o-mini", "gpt-4o-mini-transcribe")
+        ]})
+
+    @app.post("/v1/chat/completions")
+    def chat_completions():
+        t0 = time.perf_counter()
+        body = request.get_json(force=True)
+        endpoint = "chat/completions"
+        key = request_hash(endpoint, body)
+        forward = {k: v for k, v in body.items() if k not in ("stream", "stream_options")}
+        completion, recorded_ms, fresh = resolve(
+            endpoint, key, lambda: upstream(endpoint, json=forward), lambda: synth_chat(body)
+        )
+        headers = {"x-request-id": f"req_standin_{key[:12]}"}
+        if completion is None:
+            return Response(json.dumps({"error": {"message": f"No recording for {key}", "type": "not_found",
+                                                  "param": None, "code": None}}),
+                            status=404, headers=headers, mimetype="application/json")
+
+        model = body.get("model")
+        content = completion["choices"][0]["message"].get("content") or ""
+        tps = lookup(rates, model, endpoint)
+        per_token = 1 / tps if tps > 0 else 0.0
+        generation_ms = len(_TOKEN_RE.findall(content)) * per_token * 1000
+        if fresh:
+            first_ms, generation_ms, per_token = 0.0, 0.0, 0.0
+        else:
+            first_ms = sample(endpoint, model, recorded_ms)
+        if recorded_ms is not None and not fresh and lookup(latencies, model, endpoint) is None:
+            first_ms = max(first_ms - generation_ms, first_ms * 0.1)  # recorded time includes generation
+        print(f"🎭 [StandIn] {endpoint} {model} {key[:8]} first token {first_ms:.0f} ms, "
+              f"+{generation_ms:.0f} ms generation")
+
+        if not body.get("stream"):
+            time.sleep((first_ms + generation_ms) / 1000)
+            headers["openai-processing-ms"] = str(int((time.perf_counter() - t0) * 1000))
+            return Response(json.dumps(completion), headers=headers, mimetype="application/json")
+
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+
+        def events():
+            time.sleep(first_ms / 1000)
+            for i, chunk in enumerate(sse_chunks(completion, include_usage)):
+                if i > 1 and chunk["choices"] and chunk["choices"][0]["delta"].get("content"):
+                    time.sleep(per_token)
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        headers["openai-processing-ms"] = str(int(first_ms))
+        return Response(events(), headers=headers, mimetype="text/event-stream")
+
+    @app.post("/v1/audio/transcriptions")
+    def audio_transcriptions():
+        t0 = time.perf_counter()
+        upload = request.files.get("file")
+        audio = upload.read() if upload else b""
+        form = request.form.to_dict()
+        endpoint = "audio/transcriptions"
+        key = request_hash(endpoint, form, audio)
+        result, recorded_ms, fresh = resolve(
+            endpoint, key,
+            lambda: upstream(endpoint, data=form, files={"file": (upload.filename, audio, upload.mimetype)}),
+            lambda: {"text": SYNTH_TEXT},
+        )
+        headers = {"x-request-id": f"req_standin_{key[:12]}"}
+        if result is None:
+            return Response(json.dumps({"error": {"message": f"No recording for {key}", "type": "not_found",
+                                                  "param": None, "code": None}}),
+                            status=404, headers=headers, mimetype="application/json")
+        delay_ms = 0.0 if fresh else sample(endpoint, form.get("model"), recorded_ms)
+        print(f"🎭 [StandIn] {endpoint} {form.get('model')} {key[:8]} {delay_ms:.0f} ms")
+        time.sleep(delay_ms / 1000)
+        headers["openai-processing-ms"] = str(int((time.perf_counter() - t0) * 1000))
+        return Response(json.dumps(result), headers=headers, mimetype="application/json")
+
+    @app.get("/standin/stats")
+    def standin_stats():
+        with stats_lock:
+            return jsonify(dict(stats))
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--mode", choices=("replay", "record"), default="replay",
+                        help="record: forward misses to --upstream and save them")
+    parser.add_argument("--recordings", default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                             "llm_recordings"))
+    parser.add_argument("--upstream", default="https://api.openai.com/v1")
+    parser.add_argument("--on-miss", choices=("synth", "error"), default="synth")
+    parser.add_argument("--latency", action="append", metavar="[SCOPE=]SPEC",
+                        help="time to first token; repeatable (default: none)")
+    parser.add_argument("--tokens-per-second", action="append", metavar="[SCOPE=]RATE",
+                        help="generation speed after the first token; 0 = instant (default)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-codes", type=lambda s: [int(c) for c in s.split(",")], default=[429, 500, 503])
+    parser.add_argument("--stall-rate", type=float, default=0.0,
+                        help="fraction of requests that hang for --stall-seconds first (timeout testing)")
+    parser.add_argument("--stall-seconds", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    if args.mode == "record" and not os.environ.get("OPENAI_API_KEY"):
+        parser.error("--mode record needs OPENAI_API_KEY")
+    for item in args.latency or ():
+        parse_latency(item.partition("=")[2] or item)  # fail fast on a bad spec
+
+    # HTTP/1.1 so the bot's pooled keep-alive connections behave as they do against OpenAI
+    WSGIRequestHandler.protocol_version = "HTTP/1.1"
+    print(f"🎭 LLM stand-in ({args.mode}) on http://{args.host}:{args.port}/v1, recordings in {args.recordings}")
+    create_app(args).run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# app.redis_client builds its (lazy) client at import time
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
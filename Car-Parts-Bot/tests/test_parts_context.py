@@ -0,0 +1,140 @@
+"""
+parts_context.encode_parts: the compact parts table in the super-intent prompt.
+
+The prompt tests build one super_intent turn with the JSON parts context
+and once with the table. The table must decode back to the same parts
+the JSON prompt carries, and the table prompt must match the golden copy
+in tests/fixtures/super_intent_turn_table.txt. These tests check the
+prompt only, not what the model replies to it. After an intended prompt
+change, regenerate the golden file with:
+
+    UPDATE_GOLDEN=1 python -m pytest tests/test_parts_context.py
+"""
+
+import json
+import os
+
+import pytest
+from flask import Flask
+
+from app.services.parts_context import _NONE, encode_parts
+from app.services.prompt_builder import FALLBACK_BASE_PROMPT, build_super_intent_messages
+from app.services.token_budget import compact_parts, count_tokens, parts_json, tiktoken
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GOLDEN_PROMPT = os.path.join(ROOT, "tests", "fixtures", "super_intent_turn_table.txt")
+
+# Every part field a fixed rule or the reply formatter reads
+REPLY_FIELDS = ("part_number", "name", "brand", "price", "qty", "tag",
+                "equivalent_of", "relation", "requested_part_number", "status")
+
+PARTS = [
+    {"part_number": "34116858652", "brand": "BMW", "name": "Brake pad set, front", "price": 450.0,
+     "qty": 3, "tag": "BRAKE PAD SET FRONT - BMW 5 SERIES F10"},
+    {"part_number": "34116858653", "brand": "BMW", "name": "Brake pad set, front", "price": 395.5,
+     "qty": 0, "tag": "BRAKE PAD SET FRONT - BMW 5 SERIES F10"},
+    # Same number and brand, another price and quantity (e.g. a second warehouse)
+    {"part_number": "34116858653", "brand": "BMW", "name": "Brake pad set, front", "price": 410.0,
+     "qty": 6, "tag": "BRAKE PAD SET FRONT - BMW 5 SERIES F10"},
+    {"part_number": "P06074", "brand": "Brembo", "name": "Brake pad set | disc brake", "price": None,
+     "qty": 2, "tag": "BRAKE PAD SET FRONT - BMW 5 SERIES F10",
+     "equivalent_of": "34116850568", "relation": "cross_reference"},
+    {"part_number": "11427953129", "brand": "Mann-Filter", "name": "Oil filter\nelement", "price": 38.0,
+     "qty": 12, "tag": "ENGINE OIL FILTER - BMW N47", "requested_part_number": "1142795312O"},
+    {"part_number": "51217202143", "brand": "OEM/Catalog", "name": "Door handle", "price": None, "qty": 0,
+     "tag": "Catalog Match (Not in Stock)", "status": "out_of_stock"},
+]
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    with app.app_context():
+        yield app
+
+
+def decode_table(text: str) -> list:
+    """encode_parts output back to one {field: cell text} dict per row."""
+    rows, shared, columns = [], {}, None
+    for line in text.splitlines()[1:]:
+        if line.startswith("[group "):
+            shared = dict(cell.partition(": ")[::2] for cell in line.split("] ", 1)[1].split(" | "))
+            columns = None
+        elif columns is None:
+            columns = line.split(" | ")
+        else:
+            cells = line.split(" | ")
+            assert len(cells) == len(columns), line
+            rows.append({**shared, **dict(zip(columns, cells))})
+    return [{k: v for k, v in row.items() if v != _NONE} for row in rows]
+
+
+def _cells(part: dict) -> dict:
+    return {k: " ".join(str(v).split()).replace("|", "/") for k, v in part.items() if k in REPLY_FIELDS}
+
+
+def test_encode_parts_keeps_every_reply_field():
+    rows = decode_table(encode_parts(PARTS))
+    assert rows == [_cells(p) for p in compact_parts(PARTS)]
+
+
+def test_rows_differing_in_price_or_qty_are_kept():
+    rows = decode_table(encode_parts(PARTS))
+    assert sorted((r["price"], r["qty"]) for r in rows if r["part_number"] == "34116858653") == \
+        [("395.5", "0"), ("410.0", "6")]
+
+
+def test_exact_repeats_are_listed_once():
+    rows = decode_table(encode_parts(PARTS + [dict(PARTS[0]), dict(PARTS[4])]))
+    assert len(rows) == len(PARTS)
+
+
+def test_over_budget_lists_the_rest_by_number():
+    text = encode_parts(PARTS, max_tokens=count_tokens(encode_parts(PARTS[:2])) + 10)
+    assert text.splitlines()[-1].startswith("[not shown]")
+    assert "51217202143" in text.splitlines()[-1]
+
+
+def test_table_saves_tokens():
+    if tiktoken is None:
+        pytest.skip("tiktoken not installed")
+    parts = [dict(PARTS[0], part_number=f"3411685{i:04d}", price=400.0 + i, qty=i % 4) for i in range(30)]
+    json_tokens, table_tokens = count_tokens(parts_json(parts)), count_tokens(encode_parts(parts))
+    assert table_tokens < json_tokens * 0.5
+
+
+# ================= PROMPT =================
+
+def _turn_context(app, parts_format: str) -> str:
+    app.config["PARTS_CONTEXT_FORMAT"] = parts_format
+    context = {
+        "vin_info": None,
+        "parts_found": PARTS,
+        "missing_pns": ["1142795312O"],
+        "session_summary": "User ID: test. Stored VIN: None",
+        "extracted_entities": {"part_numbers": ["34116858652", "1142795312O"]},
+    }
+    messages = build_super_intent_messages(FALLBACK_BASE_PROMPT, "Need 34116858652 and 1142795312O",
+                                           context, "en", False)
+    return messages[1]["content"]
+
+
+def _parts_section(turn: str) -> str:
+    """The text after "- Matched Parts (DB) (n): " up to the next context line."""
+    section = turn.split("- Matched Parts (DB) (", 1)[1].split("): ", 1)[1]
+    return section.split("\n- Missing Part Numbers:", 1)[0]
+
+
+def test_table_prompt_decodes_to_the_json_prompt_parts(app):
+    from_json = json.loads(_parts_section(_turn_context(app, "json")))
+    from_table = decode_table(_parts_section(_turn_context(app, "table")))
+    assert from_table == [_cells(p) for p in from_json]
+
+
+def test_table_prompt_matches_golden(app):
+    turn = _turn_context(app, "table")
+    if os.environ.get("UPDATE_GOLDEN") == "1":
+        with open(GOLDEN_PROMPT, "w", encoding="utf-8") as f:
+            f.write(turn)
+    with open(GOLDEN_PROMPT, encoding="utf-8") as f:
+        assert turn == f.read(), "table prompt changed; check it, then re-run with UPDATE_GOLDEN=1"
@@ -0,0 +1,90 @@
+"""
+reply_formatter: the local WhatsApp house style for super-intent replies.
+"""
+
+import json
+
+from app.services.reply_formatter import StreamingReplyFormatter, format_whatsapp_reply
+from app.services.reply_stream import ReplyStream
+
+PARTS = [
+    {"part_number": "34116858652", "brand": "BMW", "name": "Brake pad set, front", "price": 450.0, "qty": 3},
+    {"part_number": "34116858653", "brand": "BMW", "name": "Brake pad set, front", "price": 395.5, "qty": 0},
+    # A sibling from the same tag that the model chose not to offer
+    {"part_number": "34116858654", "brand": "BMW", "name": "Brake pad set, rear", "price": 310.0, "qty": 4},
+    {"part_number": "11427953129", "brand": "Mann-Filter", "name": "Oil filter element", "price": 38.0,
+     "qty": 12, "requested_part_number": "1142795312O"},
+]
+
+QUOTE = {"action": "quote"}
+
+
+def _numbers(reply: str) -> list:
+    return [line.split(": ", 1)[1] for line in reply.splitlines() if line.startswith("   - Part Number: ")]
+
+
+def test_quote_renders_only_the_parts_the_model_listed():
+    text = ("Here is what we have:\n\n"
+            "1. Brake pad set 34116858652 - AED 450\n"
+            "2. Oil filter for 1142795312O\n\n"
+            "Would you like to order?")
+    reply = format_whatsapp_reply(text, QUOTE, PARTS)
+    assert _numbers(reply) == ["34116858652", "11427953129"]
+    assert "   - Did you mean this for 1142795312O?" in reply
+    assert reply.endswith("Would you like to order? ✅")
+
+
+def test_other_numbered_lists_are_kept():
+    text = ("Found it:\n"
+            "1. Brake pad set\n"
+            "   - Part Number: 34116858653\n\n"
+            "To order:\n"
+            "1. Send your VIN\n"
+            "2. Confirm the delivery address")
+    reply = format_whatsapp_reply(text, QUOTE, PARTS)
+    assert _numbers(reply) == ["34116858653"]
+    assert "To order:\n1. *Send your VIN*\n2. *Confirm the delivery address*" in reply
+
+
+def test_repeated_part_is_listed_once():
+    text = "Options:\n1. 34116858652\n2. 34116858652 again\n3. 34116858653"
+    reply = format_whatsapp_reply(text, QUOTE, PARTS)
+    assert _numbers(reply) == ["34116858652", "34116858653"]
+    assert "2. *Brake pad set, front*" in reply
+
+
+# ================= STREAMING =================
+
+STREAMED_TEXTS = [
+    # No emoji in the opening paragraph, more than the budget later on
+    "Good news, we have these in stock:\n\n"
+    "1. Brake pad set 34116858652\n   - Price: AED 450\n\n"
+    "2. Oil filter for 1142795312O\n\n"
+    "Delivery takes 1-2 days 🚚 and fitting is available 🔧\n\n"
+    "Visit www.carpartsdubai.com 🌐 to order 🛒 or reply here.\n\n"
+    "Thanks! www.carpartsdubai.com",
+    # No emoji at all: the action emoji goes on the last line
+    "**Brake pads**\n\n1. 34116858653\n\nTo order:\n1. Send your VIN\n2. Confirm the address",
+    # Emoji up front
+    "✅ Found it!\n\n1. 34116858652 🔥\n\nAnything else? 🙂 😀",
+]
+
+
+def _streamed(text: str, chunk: int, payload_first: bool) -> str:
+    sent = []
+    stream = ReplyStream(sent.append, StreamingReplyFormatter(PARTS))
+    fields = [("machine_payload", QUOTE), ("whatsapp_text", text)]
+    raw = json.dumps(dict(fields if payload_first else fields[::-1]))
+    for i in range(0, len(raw), chunk):
+        stream.feed(raw[i:i + chunk])
+    assert stream.finish("quote") == "\n\n".join(sent)
+    return "\n\n".join(sent)
+
+
+def test_streamed_reply_equals_formatted_reply(monkeypatch):
+    monkeypatch.setattr("app.services.reply_stream.record_metrics", lambda *a, **k: None)
+    for text in STREAMED_TEXTS:
+        expected = format_whatsapp_reply(text, QUOTE, PARTS)
+        for chunk in (1, 3, 7, 64, 10000):
+            for payload_first in (True, False):
+                assert _streamed(text, chunk, payload_first) == expected, (text, chunk, payload_first)
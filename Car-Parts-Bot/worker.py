@@ -1,23 +1,82 @@
+"""
+RQ worker.
+
+    python worker.py                    # chat: the "whatsapp" queue
+    python worker.py --queues imports   # stock imports, run as a separate process
+
+Imports can hold a work horse for up to STOCK_IMPORT_JOB_TIMEOUT (an hour),
+so they get their own worker: a chat worker never sits behind one.
+"""
+import argparse
 import os
 os.environ['no_proxy'] = '*'
 os.environ['NO_PROXY'] = '*'
+import gc
 import multiprocessing
 multiprocessing.set_start_method("spawn", force=True)
 
 from rq import Worker, Queue
 from app import create_app
+from app.extensions import db
 from app.redis_client import redis_client as redis_rq
+from app.services.prompt_cache import get_prompt_cache, refresh_prompt_cache
+from app.services.stock_index import build_stock_index, refresh_stock_index
+from app.services.supersessions import build_supersession_index, refresh_supersession_index
 
 # Create Flask app so that tasks can use current_app
 app = create_app()
 
+
+class IndexedWorker(Worker):
+    """
+    Refreshes in-process indexes in the parent right before each fork,
+    so every work horse starts from a current snapshot and never has to
+    rebuild (its own changes would die with it anyway).
+    """
+
+    def execute_job(self, job, queue):
+        changed = refresh_stock_index()
+        changed = refresh_supersession_index() or changed
+        changed = refresh_prompt_cache() or changed
+        if changed:
+            gc.freeze()
+        db.session.remove()  # don't carry a checked-out connection into the fork
+        return super().execute_job(job, queue)
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RQ worker for the car parts bot.")
+    parser.add_argument("--queues", nargs="+", default=["whatsapp"],
+                        help="queues to serve, in priority order (default: whatsapp)")
+    queue_names = parser.parse_args().queues
+
     with app.app_context():
-        queue_names = ["whatsapp"]
+        # Chat jobs read the in-process indexes; an imports-only worker doesn't need them
+        if "whatsapp" in queue_names and app.config.get("STOCK_INDEX_ENABLED"):
+            try:
+                build_stock_index()
+            except Exception as e:
+                print(f"⚠️ Stock index build failed, falling back to DB lookups: {e}")
+            try:
+                build_supersession_index()
+            except Exception as e:
+                print(f"⚠️ Supersession index build failed, falling back to DB lookups: {e}")
+
+        if "whatsapp" in queue_names:
+            try:
+                get_prompt_cache().refresh()
+            except Exception as e:
+                print(f"⚠️ Prompt cache load failed, jobs will query the DB: {e}")
+
+        db.session.remove()
+        # Move everything built so far into the permanent generation: the
+        # collector then never writes to those pages, so forks share them.
+        gc.freeze()
 
-        worker = Worker(
+        worker = IndexedWorker(
             [Queue(name, connection=redis_rq) for name in queue_names],
             connection=redis_rq
         )
 
+        print(f"👷 Worker serving queues: {', '.join(queue_names)}")
         worker.work(with_scheduler=True)